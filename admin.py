@@ -0,0 +1,275 @@
+import streamlit as st
+from datetime import datetime
+from zoneinfo import ZoneInfo
+import hmac
+import json
+import os
+import sqlite3
+import time
+import pandas as pd
+from aggregates import load_snapshot
+from charts import ChartCache, chart_key, figure_bytes, radar_figure
+from cube import MIN_CELL, CultureCube
+from export import export, journal_chunks
+from assets import html_block, static_url, style_block
+from survey_schema import bundled_version, load_survey, survey_path
+
+# ——————————————————
+# Admin dashboard: streamlit run admin.py
+# Reads the local response journal and its aggregates (aggregates.py), never the
+# Google Sheet. Every query goes through st.cache_data with a TTL, shared by all
+# viewers of the process, so a page render is a cache hit except once per TTL.
+# ——————————————————
+st.set_page_config(page_title="CVF Survey – Admin", layout="wide")
+st.markdown(style_block("""
+.header{display:flex;align-items:center;background:#0E2841;padding:10px 20px;border-radius:8px;margin-bottom:25px}
+.header img{height:60px;margin-right:15px}
+.header h1{color:#fff;font-size:28px;margin:0}
+"""), unsafe_allow_html=True)
+
+DATA_DIR = os.getenv("CVF_DATA_DIR", ".cvf_data")
+JOURNAL_PATH = os.path.join(DATA_DIR, "app_responses.sqlite3")
+CACHE_TTL = float(os.getenv("CVF_ADMIN_TTL", "30"))
+TIMEZONE = ZoneInfo("Europe/Athens")
+survey = load_survey(survey_path("cvf_v2.yaml"))
+chart_cache = ChartCache(os.path.join(DATA_DIR, "charts"))
+
+def admin_password():
+    try:
+        password = st.secrets.get("ADMIN_PASSWORD")
+    except Exception:  # no secrets.toml
+        password = None
+    return password or os.getenv("CVF_ADMIN_PASSWORD")
+
+def load_headcounts():
+    # optional {"Division": {"Innovation": 120, ...}, "Level": {...}} for response rates
+    path = os.getenv("CVF_HEADCOUNTS")
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+# ——————————————————
+# Cached query layer
+# ——————————————————
+def _connect_readonly(path):
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def query_snapshot(journal_path, version, _survey):
+    return load_snapshot(journal_path, _survey), time.time()
+
+# every Division x Level x Gender x Tenure x Generation cross-tab (cube.py), so each filter is a slice of it;
+# a resource, not data: the cube is read-only and too large to copy out of the cache on every rerun
+@st.cache_resource(ttl=CACHE_TTL, show_spinner=False)
+def query_cube(journal_path, version, _survey):
+    snapshot, fetched_at = query_snapshot(journal_path, version, _survey)
+    return CultureCube.from_snapshot(snapshot), fetched_at, snapshot.last_id
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def query_activity(journal_path, bucket_seconds):
+    conn = _connect_readonly(journal_path)
+    try:
+        buckets = conn.execute(
+            "SELECT CAST(created_at / ? AS INTEGER) * ?, COUNT(*) FROM responses GROUP BY 1 ORDER BY 1",
+            (bucket_seconds, bucket_seconds),
+        ).fetchall()
+        unsent = conn.execute("SELECT COUNT(*) FROM responses WHERE sent_at IS NULL").fetchone()[0]
+        last = conn.execute("SELECT MAX(created_at) FROM responses").fetchone()[0]
+    finally:
+        conn.close()
+    activity = pd.DataFrame(buckets, columns=["time", "Υποβολές"])
+    activity["time"] = pd.to_datetime(activity["time"], unit="s", utc=True).dt.tz_convert(TIMEZONE)
+    activity["Σύνολο"] = activity["Υποβολές"].cumsum()
+    return activity, unsent, last
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def query_excluded(journal_path, version):
+    # responses the quality scan (quality.py) took out of the aggregates
+    conn = _connect_readonly(journal_path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM aggregate_excluded WHERE version = ?", (version,)).fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0  # aggregates written before exclusions existed
+    finally:
+        conn.close()
+
+# a fixed Vega-Lite spec: st.bar_chart/line_chart rebuild and validate an Altair chart on every run
+ACTIVITY_SPEC = {
+    "layer": [
+        {"mark": {"type": "bar", "color": "#004d99"},
+         "encoding": {"x": {"field": "time", "type": "temporal", "title": None},
+                      "y": {"field": "Υποβολές", "type": "quantitative"}}},
+        {"mark": {"type": "line", "color": "#E97132", "strokeWidth": 2},
+         "encoding": {"x": {"field": "time", "type": "temporal"},
+                      "y": {"field": "Σύνολο", "type": "quantitative"}}},
+    ],
+    "resolve": {"scale": {"y": "independent"}},
+}
+
+def radar_png(title, series, data_version):
+    """PNG of a CVF radar chart, from the shared chart cache; series is a list of (label, quadrant values)."""
+    params = {"title": title, "series": [[label, [float(v) for v in values]] for label, values in series]}
+    key = chart_key("radar", data_version, "png", params)
+    return chart_cache.fetch(key, "png", lambda: figure_bytes(radar_figure(title, series)))
+
+def groups(*columns, where=None):
+    return query_cube(JOURNAL_PATH, survey.version, survey)[0].stats(*columns, where=where)
+
+def shown_counts(stats):
+    # exact counts only of groups whose results are shown: a withheld group's count would give it away too
+    return [f"< {MIN_CELL}" if hidden and n < MIN_CELL else "απόκρυψη" if hidden else f"{n:,}"
+            for n, hidden in zip(stats.counts.tolist(), stats.suppressed.tolist())]
+
+def invalidate():
+    query_snapshot.clear()
+    query_cube.clear()
+    query_activity.clear()
+    query_excluded.clear()
+
+# ——————————————————
+# Header & access
+# ——————————————————
+st.markdown(html_block(f"""
+<div class="header">
+  <img src="{static_url("Alumil_Culture_Insight_Bright.png")}" alt="Company Logo">
+  <h1>{survey.title} – Παρακολούθηση</h1>
+</div>
+"""), unsafe_allow_html=True)
+
+# fail closed: without a password the dashboard only opens when CVF_ADMIN_OPEN=1 asks for it, and never exports
+password = admin_password()
+if not password and os.getenv("CVF_ADMIN_OPEN") != "1":
+    st.error("Δεν έχει οριστεί κωδικός διαχειριστή. Ορίστε ADMIN_PASSWORD στο secrets.toml "
+             "(ή CVF_ADMIN_PASSWORD) για να ανοίξει ο πίνακας.")
+    st.stop()
+if password and not st.session_state.get("admin_ok"):
+    entered = st.text_input("Κωδικός διαχειριστή", type="password")
+    if not hmac.compare_digest(entered.encode("utf-8"), password.encode("utf-8")):
+        st.stop()
+    st.session_state["admin_ok"] = True
+
+if not os.path.exists(JOURNAL_PATH):
+    st.info("Δεν υπάρχουν ακόμη απαντήσεις σε αυτόν τον server.")
+    st.stop()
+
+st.sidebar.title("⚙️ Ρυθμίσεις")
+bucket = st.sidebar.radio("Διάστημα χρονοσειράς", ["Ώρα", "Ημέρα"], index=1, horizontal=True)
+if st.sidebar.button("🔄 Ανανέωση τώρα", use_container_width=True):
+    invalidate()
+
+try:
+    cube, fetched_at, last_id = query_cube(JOURNAL_PATH, survey.version, survey)
+    overall = cube.stats()
+    activity, unsent, last_submission = query_activity(JOURNAL_PATH, 3600 if bucket == "Ώρα" else 86400)
+except sqlite3.OperationalError as e:
+    st.error(f"Δεν ήταν δυνατή η ανάγνωση των συγκεντρωτικών ({e}). "
+             f"Εκτελέστε: python aggregates.py rebuild {JOURNAL_PATH}")
+    st.stop()
+
+st.sidebar.caption(
+    f"Δεδομένα της {datetime.fromtimestamp(fetched_at, TIMEZONE):%H:%M:%S}, "
+    f"ανανεώνονται κάθε {CACHE_TTL:.0f} δευτ."
+)
+
+# ——————————————————
+# Export (streamed from the journal in chunks into a file, then offered for download)
+# ——————————————————
+EXPORT_MIME = {"parquet": "application/vnd.apache.parquet", "csv.gz": "application/gzip", "csv": "text/csv"}
+
+st.sidebar.markdown("---")
+st.sidebar.subheader("⬇️ Εξαγωγή απαντήσεων")
+if not password:
+    # raw responses leave only behind a password, even when the dashboard itself is open
+    st.sidebar.caption("Η εξαγωγή απαιτεί κωδικό διαχειριστή (ADMIN_PASSWORD).")
+else:
+    layout = st.sidebar.radio("Διάταξη", ["long", "wide"], horizontal=True,
+                              help="long: μία γραμμή ανά ερωτώμενο × διάσταση × quadrant. "
+                                   "wide: μία γραμμή ανά ερωτώμενο, όπως στο Google Sheet.")
+    export_format = st.sidebar.selectbox("Αρχείο", list(EXPORT_MIME))
+    export_path = os.path.join(DATA_DIR, "exports", f"cvf_responses_{layout}.{export_format}")
+    if st.sidebar.button("Προετοιμασία αρχείου", use_container_width=True):
+        os.makedirs(os.path.dirname(export_path), exist_ok=True)
+        progress = st.sidebar.progress(0.0)
+        expected = max(int(overall.counts[0]), 1)
+        chunks = journal_chunks(JOURNAL_PATH, survey, legacy_version=bundled_version("cvf_v2.yaml"))
+        export(chunks, export_path, layout, on_chunk=lambda done: progress.progress(min(done / expected, 1.0)))
+        progress.empty()
+        st.session_state["export_ready"] = export_path
+    if st.session_state.get("export_ready") == export_path and os.path.exists(export_path):
+        with open(export_path, "rb") as f:
+            st.sidebar.download_button(f"Λήψη {os.path.basename(export_path)}", f,
+                                       file_name=os.path.basename(export_path),
+                                       mime=EXPORT_MIME[export_format], use_container_width=True)
+        st.sidebar.caption(f"{os.path.getsize(export_path) / 2**20:.1f} MB")
+
+# ——————————————————
+# Submissions
+# ——————————————————
+total = int(overall.counts[0])
+col1, col2, col3 = st.columns(3)
+excluded = query_excluded(JOURNAL_PATH, survey.version)
+col1.metric("Απαντήσεις", f"{total:,}",
+            help=f"Χωρίς {excluded:,} απαντήσεις που εξαίρεσε ο έλεγχος ποιότητας (quality.py)." if excluded else None)
+col2.metric("Εκκρεμούν για Google Sheets", f"{unsent:,}")
+col3.metric(
+    "Τελευταία υποβολή",
+    datetime.fromtimestamp(last_submission, TIMEZONE).strftime("%d/%m %H:%M") if last_submission else "–",
+)
+
+st.subheader("📈 Υποβολές στο χρόνο")
+if len(activity):
+    st.vega_lite_chart(activity, ACTIVITY_SPEC, use_container_width=True)
+
+# ——————————————————
+# Response rates
+# ——————————————————
+st.subheader("👥 Συμμετοχή ανά Division / Level")
+headcounts = load_headcounts()
+rate_cols = st.columns(2)
+for slot, column in zip(rate_cols, ("Division", "Level")):
+    stats = groups(column)
+    rates = pd.DataFrame({"Απαντήσεις": shown_counts(stats)}, index=pd.Index(stats.labels, name=column))
+    counts = pd.Series(stats.counts, index=rates.index).where(~stats.suppressed)
+    if column in headcounts:
+        rates["Προσωπικό"] = [headcounts[column].get(label) for label in stats.labels]
+        rates["Ποσοστό %"] = (100 * counts / rates["Προσωπικό"]).round(1)
+    else:
+        rates["Μερίδιο %"] = (100 * counts / max(total, 1)).round(1)
+    slot.dataframe(rates, use_container_width=True)
+
+# ——————————————————
+# Culture profiles
+# ——————————————————
+st.subheader("🧭 Προφίλ κουλτούρας (CVF)")
+breakdown = st.selectbox("Ανάλυση ανά", [d.column for d in survey.demographics])
+with st.expander("🔎 Φίλτρα"):
+    filter_cols = st.columns(len(survey.demographics))
+    where = {}
+    for slot, demo in zip(filter_cols, survey.demographics):
+        picked = slot.multiselect(demo.label, list(cube.categories[cube.columns.index(demo.column)]),
+                                  key=f"filter_{demo.column}")
+        if picked:
+            where[demo.column] = picked
+stats = groups(breakdown, where=where)
+present = [label for label, n, hidden in zip(stats.labels, stats.counts, stats.suppressed) if n > 0 and not hidden]
+chosen = st.multiselect("Ομάδες", present, default=present[:3])
+
+series = [("Σύνολο", tuple(overall.profile[0].round(1)))]
+if where:
+    selection = groups(where=where)
+    if selection.counts[0] and not selection.suppressed[0]:
+        series.append(("Φίλτρο", tuple(selection.profile[0].round(1))))
+series += [(label, tuple(stats.profile[stats.labels.index(label)].round(1))) for label in chosen]
+radar_col, table_col = st.columns([2, 3])
+if total and not overall.suppressed[0]:
+    # the journal's newest aggregated row identifies the data the profiles were read from
+    radar_col.image(radar_png(breakdown, series, f"journal:{survey.version}:{last_id}"))
+frame = stats.to_frame().round(1)
+frame.loc[stats.suppressed, "dominant"] = "απόκρυψη"
+frame["n"] = shown_counts(stats)
+table_col.dataframe(frame[stats.counts > 0], use_container_width=True)
+if stats.suppressed.any():
+    table_col.caption(f"Για την ανωνυμία των συμμετεχόντων δεν εμφανίζονται αποτελέσματα ομάδων "
+                      f"με λιγότερες από {MIN_CELL} απαντήσεις (CVF_MIN_GROUP), ούτε ομάδων που ένα φίλτρο "
+                      f"θα άφηνε να προκύψουν από διαφορά.")
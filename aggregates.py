@@ -0,0 +1,324 @@
+"""
+Incrementally maintained response aggregates, stored next to the journal.
+
+For every demographic cell (one combination of Division, Level, Gender, ...
+answers) the journal database keeps the respondent count, how many
+respondents each quadrant dominates, and per element x option the sum and
+sum of squares of the points given. ``ResponseJournal`` updates them in the
+same transaction that commits a row, so they never drift from the log, and
+group means, standard deviations and CVF profiles are read from a few
+thousand cells instead of rescanning every response.
+
+Responses can be taken out of the aggregates again (quality.py excludes
+straight-lined and duplicated submissions): ``exclude`` subtracts them
+and records their ids, which replays and rebuilds then skip.
+
+    python aggregates.py show .cvf_data/app_responses.sqlite3 --by Division
+    python aggregates.py rebuild .cvf_data/app_responses.sqlite3
+"""
+import argparse
+import json
+import os
+import sqlite3
+from dataclasses import dataclass
+
+import numpy as np
+
+from cvf_analysis import canonical_order, combine_codes, stats_from_sums
+from journal import ResponseJournal, of_version
+from survey_schema import QUADRANTS, load_survey, survey_path
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS aggregate_cells (
+    version   TEXT NOT NULL,
+    cell      TEXT NOT NULL,
+    n         INTEGER NOT NULL,
+    clan      INTEGER NOT NULL,
+    adhocracy INTEGER NOT NULL,
+    market    INTEGER NOT NULL,
+    hierarchy INTEGER NOT NULL,
+    PRIMARY KEY (version, cell)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS aggregate_sums (
+    version  TEXT NOT NULL,
+    cell     TEXT NOT NULL,
+    slot     INTEGER NOT NULL,
+    total    INTEGER NOT NULL,
+    total_sq INTEGER NOT NULL,
+    PRIMARY KEY (version, cell, slot)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS aggregate_state (
+    version TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS aggregate_excluded (
+    version TEXT NOT NULL,
+    id      INTEGER NOT NULL,
+    PRIMARY KEY (version, id)
+) WITHOUT ROWID;
+"""
+# cell: JSON list of the demographic answers in survey order (null = unanswered)
+# slot: index into survey.slider_keys; the dominant-quadrant counts are in canonical QUADRANTS order
+
+DOMINANT_COLUMNS = tuple(q.lower() for q in QUADRANTS)
+
+
+class ResponseAggregates:
+    """Aggregate maintenance for one survey definition; pass to ResponseJournal(aggregates=...).
+
+    Only journal rows of survey's version are counted; untagged rows are taken
+    to be of legacy_version (default: survey's own).
+    """
+
+    def __init__(self, survey, legacy_version=None):
+        self.survey = survey
+        self.version = survey.version
+        self.legacy_version = legacy_version or survey.version
+        self._demo_index = [survey.columns.index(d.column) for d in survey.demographics]
+        self._first_slot = len(survey.columns) - len(survey.slider_keys)
+        # option position within an element -> canonical quadrant index
+        self._canonical = [survey.quadrants.index(q) for q in QUADRANTS]
+
+    # ——————————————————
+    # Writing (inside the journal's transaction)
+    # ——————————————————
+    def attach(self, conn):
+        """Create the tables and fold in any journal rows newer than the aggregates."""
+        conn.executescript(SCHEMA)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._replay(conn, self._last_id(conn))
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    def add(self, conn, row_id, values):
+        """Count one freshly journaled row; the caller commits."""
+        cells = {}
+        self._accumulate(cells, values)
+        self._merge(conn, cells, row_id)
+
+    def exclude(self, conn, rows):
+        """Take journaled rows, (id, values) pairs, out of the aggregates; the caller commits.
+
+        Returns how many were counted before; rows already excluded are skipped.
+        """
+        return self._set_excluded(conn, rows, True)
+
+    def include(self, conn, rows):
+        """Count excluded rows again; the caller commits."""
+        return self._set_excluded(conn, rows, False)
+
+    def excluded_ids(self, conn):
+        return {row_id for (row_id,) in conn.execute(
+            "SELECT id FROM aggregate_excluded WHERE version = ?", (self.version,)
+        )}
+
+    def rebuild(self, conn):
+        """Drop this survey's aggregates and recompute them from the whole journal (exclusions are kept)."""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table in ("aggregate_cells", "aggregate_sums", "aggregate_state"):
+                conn.execute(f"DELETE FROM {table} WHERE version = ?", (self.version,))
+            replayed = self._replay(conn, 0)
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        return replayed
+
+    def _last_id(self, conn):
+        row = conn.execute("SELECT last_id FROM aggregate_state WHERE version = ?", (self.version,)).fetchone()
+        return row[0] if row else 0
+
+    def _set_excluded(self, conn, rows, excluded):
+        last_id = self._last_id(conn)
+        cells, changed = {}, 0
+        for row_id, values in rows:
+            if excluded:
+                cur = conn.execute("INSERT OR IGNORE INTO aggregate_excluded (version, id) VALUES (?, ?)",
+                                   (self.version, row_id))
+            else:
+                cur = conn.execute("DELETE FROM aggregate_excluded WHERE version = ? AND id = ?", (self.version, row_id))
+            # rows newer than last_id are not counted yet; the replay that counts them checks the exclusions
+            if cur.rowcount and row_id <= last_id:
+                changed += self._accumulate(cells, values)
+        if excluded:
+            for entry in cells.values():
+                entry[0] = -entry[0]
+                for array in entry[1:]:
+                    np.negative(array, out=array)
+        self._merge(conn, cells, 0)
+        return changed
+
+    def _replay(self, conn, after_id, chunk_size=5000):
+        replayed = 0
+        excluded = self.excluded_ids(conn)
+        while True:
+            chunk = conn.execute(
+                "SELECT id, survey_version, payload FROM responses WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, chunk_size),
+            ).fetchall()
+            if not chunk:
+                return replayed
+            cells = {}
+            for row_id, row_version, payload in chunk:
+                if row_id not in excluded and of_version(row_version, self.version, self.legacy_version):
+                    replayed += self._accumulate(cells, json.loads(payload))
+            after_id = chunk[-1][0]
+            self._merge(conn, cells, after_id)
+
+    def _accumulate(self, cells, values):
+        values = list(values)
+        if len(values) != len(self.survey.columns):
+            return 0  # a malformed row
+        cell = json.dumps([values[i] or None for i in self._demo_index], ensure_ascii=False)
+        points = np.array([int(float(v or 0)) for v in values[self._first_slot:]], dtype=np.int64)
+        totals = points.reshape(-1, 4).sum(axis=0)[self._canonical]
+        entry = cells.get(cell)
+        if entry is None:
+            entry = cells[cell] = [0, np.zeros(4, np.int64), np.zeros_like(points), np.zeros_like(points)]
+        entry[0] += 1
+        entry[1][totals.argmax()] += 1
+        entry[2] += points
+        entry[3] += points * points
+        return 1
+
+    def _merge(self, conn, cells, last_id):
+        conn.executemany(
+            f"""INSERT INTO aggregate_cells (version, cell, n, {", ".join(DOMINANT_COLUMNS)})
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (version, cell) DO UPDATE SET n = n + excluded.n,
+                {", ".join(f"{c} = {c} + excluded.{c}" for c in DOMINANT_COLUMNS)}""",
+            [(self.version, cell, n, *dominant.tolist()) for cell, (n, dominant, _, _) in cells.items()],
+        )
+        conn.executemany(
+            """INSERT INTO aggregate_sums (version, cell, slot, total, total_sq) VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT (version, cell, slot) DO UPDATE SET
+               total = total + excluded.total, total_sq = total_sq + excluded.total_sq""",
+            [
+                (self.version, cell, slot, total, total_sq)
+                for cell, (_, _, sums, sumsq) in cells.items()
+                for slot, (total, total_sq) in enumerate(zip(sums.tolist(), sumsq.tolist()))
+            ],
+        )
+        conn.execute(
+            """INSERT INTO aggregate_state (version, last_id) VALUES (?, ?)
+               ON CONFLICT (version) DO UPDATE SET last_id = max(last_id, excluded.last_id)""",
+            (self.version, last_id),
+        )
+
+    # ——————————————————
+    # Reading
+    # ——————————————————
+    def snapshot(self, conn):
+        cells = conn.execute(
+            f"SELECT cell, n, {', '.join(DOMINANT_COLUMNS)} FROM aggregate_cells WHERE version = ? ORDER BY cell",
+            (self.version,),
+        ).fetchall()
+        n_slots = len(self.survey.slider_keys)
+        # every cell is merged with all of its slots at once, so the sorted rows form a dense block
+        totals = np.array(conn.execute(
+            "SELECT total, total_sq FROM aggregate_sums WHERE version = ? ORDER BY cell, slot", (self.version,)
+        ).fetchall(), dtype=np.int64).reshape(len(cells), n_slots, 2)
+        sums, sumsq = totals[..., 0], totals[..., 1]
+        # slots are in survey option order; store them in canonical quadrant order like cvf_analysis
+        n_elements = len(self.survey.elements)
+        reorder = lambda a: canonical_order(a.reshape(len(cells), n_elements, 4), self.survey.quadrants)
+        return AggregateSnapshot(
+            survey=self.survey,
+            cells=[tuple(json.loads(cell)) for cell, *_ in cells],
+            counts=np.array([row[1] for row in cells], dtype=np.int64),
+            dominant=np.array([row[2:] for row in cells], dtype=np.int64).reshape(len(cells), 4),
+            sums=reorder(sums).reshape(len(cells), -1),
+            sumsq=reorder(sumsq).reshape(len(cells), -1),
+            last_id=self._last_id(conn),
+        )
+
+
+@dataclass
+class AggregateSnapshot:
+    survey: object
+    cells: list             # one tuple of demographic answers per cell, survey order
+    counts: np.ndarray      # (C,)
+    dominant: np.ndarray    # (C, 4) respondents per dominant quadrant
+    sums: np.ndarray        # (C, elements * 4), canonical quadrant order
+    sumsq: np.ndarray       # (C, elements * 4)
+    last_id: int            # newest journal row included
+
+    def group_stats(self, *columns):
+        """GroupStats for a breakdown by demographic columns, rolled up from the cells."""
+        positions = {d.column: i for i, d in enumerate(self.survey.demographics)}
+        coded = []
+        for col in columns:
+            answers = [cell[positions[col]] for cell in self.cells]
+            categories = list(self.survey.demographics[positions[col]].options)
+            # keep answers the current definition no longer offers, like response_store does
+            categories += sorted({a for a in answers if a is not None and a not in categories})
+            lookup = {c: i for i, c in enumerate(categories)}
+            coded.append((np.array([lookup.get(a, -1) for a in answers], dtype=np.int64), categories))
+        codes, labels = combine_codes(coded, len(self.cells))
+
+        keep = codes >= 0
+        n_groups = len(labels)
+
+        def rollup(values):
+            # one weighted bincount over (group, column) pairs; float64 weights are exact at these magnitudes
+            values = values[keep].reshape(int(keep.sum()), -1)
+            k = values.shape[1]
+            index = (codes[keep][:, None] * k + np.arange(k)).ravel()
+            totals = np.bincount(index, weights=values.ravel(), minlength=n_groups * k)
+            return totals.round().astype(np.int64).reshape(n_groups, k)
+
+        counts = rollup(self.counts)[:, 0]
+        sums = rollup(self.sums)
+        sumsq = rollup(self.sumsq)
+        dominant = rollup(self.dominant)
+        return stats_from_sums(columns, labels, counts, sums, sumsq, dominant, len(self.survey.elements))
+
+
+def load_snapshot(journal_path, survey):
+    """Read the aggregates of a journal database without opening it for writing."""
+    conn = sqlite3.connect(f"file:{journal_path}?mode=ro", uri=True)
+    try:
+        # one read transaction so cells and sums come from the same commit
+        conn.execute("BEGIN")
+        return ResponseAggregates(survey).snapshot(conn)
+    finally:
+        conn.close()
+
+
+def main():
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--survey", default=survey_path("cvf_v2.yaml"), help="survey definition of the journal")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("rebuild", help="recompute the aggregates from every journaled row")
+    p.add_argument("journal")
+    p = sub.add_parser("show", help="print group profiles read from the aggregates")
+    p.add_argument("journal")
+    p.add_argument("--by", nargs="*", default=[], help="demographic columns to break down by")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.journal):
+        parser.error(f"no journal at {args.journal}")
+    survey = load_survey(args.survey)
+    if args.command == "rebuild":
+        ResponseJournal(args.journal)  # adds the survey_version column to journals written before it
+        conn = sqlite3.connect(args.journal, timeout=30)
+        conn.executescript(SCHEMA)
+        replayed = ResponseAggregates(survey).rebuild(conn)
+        conn.close()
+        print(f"rebuilt {survey.version} aggregates of {args.journal} from {replayed} responses")
+        return
+
+    stats = load_snapshot(args.journal, survey).group_stats(*args.by)
+    pd.set_option("display.width", 160)
+    print(stats.to_frame()[lambda f: f["n"] > 0].round(1).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Browser-side 100-point allocator for one survey element (components/allocator).
+
+The four sliders of an element and their running total live in the browser:
+a slider is clamped to the points the other three leave, and the total and
+its error are drawn without asking the server. The section's values come back
+as one component value when its total reaches 100, or leaves 100 again, so a
+completed survey costs about one rerun per element instead of one per slider
+nudge. An incomplete section stays in the browser's localStorage under the
+form's draft key (its resume token) and costs no rerun: a reload restores it
+from there, and the next commit of any section carries it along, so the draft
+of the session (drafts.py) keeps half-filled sections as well.
+
+Committed values are copied into the element's option state keys by the
+on_change callback, so build_row(), the totals check and the reset after a
+submit keep working on the same session-state keys as with st.slider.
+"""
+import os
+from functools import partial
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+
+COMPONENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "allocator")
+
+_component = components.declare_component("cvf_allocator", path=COMPONENT_DIR)
+
+
+def allocator_key(element):
+    return f"_alloc_{element.name}"
+
+
+def _write(state_keys, points):
+    for key, value in zip(state_keys, points):
+        st.session_state[key] = int(value)
+
+
+def _commit(element, on_change=None):
+    value = st.session_state.get(allocator_key(element)) or {}
+    _write(element.state_keys, value.get("values", ()))
+    # the other sections' incomplete values, kept in the browser until now
+    sections = st.session_state.get("_alloc_sections", {})
+    for name, points in (value.get("drafts") or {}).items():
+        if name != element.name and name in sections:
+            _write(sections[name], points)
+    if on_change is not None:
+        on_change()
+
+
+def allocator(element, messages, step=5, total=100, quiet=False, on_change=None, draft_key=None):
+    """Render element's allocator from the option state keys; a commit reruns the script once.
+
+    messages: {"valid": ..., "invalid": ...} texts of the total line, with
+    {current} and {total} placeholders. quiet hides an incomplete total until
+    the first change (right after a submit). on_change runs after a commit has
+    been written to the option state keys. draft_key scopes the incomplete
+    values kept in the browser; without one they are not kept.
+    """
+    st.session_state.setdefault("_alloc_sections", {})[element.name] = element.state_keys
+    _component(
+        section=element.name,
+        draft_key=draft_key,
+        labels=[option.text for option in element.options],
+        value=[int(st.session_state.get(key, 0)) for key in element.state_keys],
+        messages=messages,
+        step=step,
+        total=total,
+        quiet=quiet,
+        key=allocator_key(element),
+        default=None,
+        on_change=partial(_commit, element, on_change),
+    )
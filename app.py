@@ -1,16 +1,22 @@
 import streamlit as st
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime
 import streamlit.components.v1 as components
 from zoneinfo import ZoneInfo
+import os
+import uuid
+from assets import html_block, static_url, style_block
+from drafts import DRAFT_COOKIE, DraftStore, cookie_script, is_resume_token, new_resume_token
+from metrics import start_rerun, timed
+from startup import warm_up
+from survey_schema import bundled_version, load_survey, survey_path
+
+rerun = start_rerun()  # timing of this script run (metrics.py)
 
 # ——————————————————
 # Page configuration & CSS
 # ——————————————————
 st.set_page_config(page_title="CVF Survey", layout="wide")
-st.markdown("""
-<style>
+st.markdown(style_block("""
 .header{display:flex;align-items:center;background:#0E2841;padding:10px 20px;border-radius:8px;margin-bottom:25px}
 .header img{height:60px;margin-right:15px}
 .header h1{color:#fff;font-size:28px;margin:0}
@@ -20,202 +26,128 @@ st.markdown("""
 .small{font-size:.92rem;line-height:1.35rem}
 .cvf-label{display:block;min-height:150px;max-height:150px;overflow:auto;padding-right:4px}      /* ίσο ύψος card text */
 .cvf-label-example{display:block;min-height:150px;max-height:150px;overflow:auto;padding-right:4px}
-</style>
-""", unsafe_allow_html=True)
+"""), unsafe_allow_html=True)
 
 # ——————————————————
 # Google Sheets helper
 # ——————————————————
-@st.cache_resource
+@st.cache_resource(show_spinner=False)  # also called from the warm-up thread
 def connect_gsheets():
-    scope = [
-        "https://spreadsheets.google.com/feeds",
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive.file",
-        "https://www.googleapis.com/auth/drive",
-    ]
-    creds_dict = st.secrets["GOOGLE_CREDENTIALS"]
-    creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-    client = gspread.authorize(creds)
-    SPREADSHEET_ID = "1MxlsC3f3pvBhdkYYQj5B7Q-ShqPK7ZLOFtE1d2VNKJ0"
-    return client.open_by_key(SPREADSHEET_ID).sheet1
-
-# ——————————————————
-# Sections with proposals (no Clan/Adhocracy/Market/Hierarchy shown)
-# ——————————————————
-elements = {
-    "Κύρια Χαρακτηριστικά": {
-        "opt1": "Στην Εταιρία  νιώθω οικεία. Είμαστε σαν μια μεγάλη οικογένεια. Οι άνθρωποι μοιράζονται πολλά μεταξύ τους.",
-        "opt2": "Η Εταιρία είναι δυναμική και πρωτοπόρα εταιρία. Οι άνθρωποι παίρνουν ρίσκα και δοκιμάζουν νέα πράγματα.",
-        "opt3": "Η Εταιρία νοιάζεται πολύ για τα αποτελέσματα. Σημασία έχει να γίνει η δουλειά σωστά και γρήγορα. Οι άνθρωποι είναι ανταγωνιστικοί και θέλουν να πετυχαίνουν.",
-        "opt4": "Η Εταιρία έχει αυστηρούς κανόνες και διαδικασίες. Οι επίσημες διαδικασίες καθορίζουν γενικά τις ενέργειες των ανθρώπων.",
-    },
-    "Ηγεσία Οργανισμού": {
-        "opt1": "Η διοίκηση ή οι συνάδελφοι σε θέσεις ευθύνης καθοδηγούν, διευκολύνουν ή ενθαρρύνουν τους άλλους.",
-        "opt2": "Η διοίκηση ή οι συνάδελφοι σε θέσεις ευθύνης αποτελούν παράδειγμα επιχειρηματικότητας, καινοτομίας ή ανάληψης ρίσκου.",
-        "opt3": "Η διοίκηση ή οι συνάδελφοι σε θέσεις ευθύνης είναι αυστηροί, αποφασιστικοί και επικεντρωμένοι στα αποτελέσματα.",
-        "opt4": "Η διοίκηση ή οι συνάδελφοι σε θέσεις ευθύνης οργανώνουν καλά τη δουλειά και φροντίζουν να γίνονται όλα με τάξη και αποτελεσματικότητα.",
-    },
-    "Διαχείριση Προσωπικού": {
-        "opt1": "Το στυλ διοίκησης βασίζεται στη συνεργασία, τη συναίνεση και τη συμμετοχή όλων.",
-        "opt2": "Το στυλ διοίκησης δίνει ελευθερία στους ανθρώπους να δοκιμάζουν νέα πράγματα, να ξεχωρίζουν και να παίρνουν ρίσκα.",
-        "opt3": "Το στυλ διοίκησης είναι απαιτητικό, με έμφαση στον ανταγωνισμό και την επίτευξη στόχων.",
-        "opt4": "Το στυλ διοίκησης δίνει έμφαση στη σταθερότητα στις εργασιακές και προσωπικές σχέσεις και την προβλεψιμότητα.",
-    },
-    "Συνοχή Οργανισμού": {
-        "opt1": "Αυτό που κρατά την Εταιρία ενωμένη είναι η αφοσίωση και η εμπιστοσύνη μεταξύ των ανθρώπων. Η αφοσίωση στην εταιρεία είναι υψηλή.",
-        "opt2": "Αυτό που κρατά την Εταιρία ενωμένη είναι η αφοσίωση για προσέλκυση νέων ιδεών και ανάπτυξη. Στοχεύουμε να είμαστε μπροστά από τους άλλους.",
-        "opt3": "Αυτό που κρατά την Εταιρία ενωμένη είναι η επιτυχία και η επίτευξη στόχων.",
-        "opt4": "Αυτό που κρατά την Εταιρία ενωμένη είναι οι κανόνες και οι διαδικασίες, ώστε όλα να λειτουργούν ομαλά.",
-    },
-    "Στρατηγικές Προτεραιότητες": {
-        "opt1": "Η Εταιρία δίνει έμφαση στην ανάπτυξη των ανθρώπων. Υπάρχει εμπιστοσύνη, ανοιχτή επικοινωνία και συνεργασία.",
-        "opt2": "Η Εταιρία δίνει έμφαση στην απόκτηση νέων πόρων και τη δημιουργία νέων προκλήσεων. Η δοκιμή νέων πραγμάτων και η αναζήτηση ευκαιριών εκτιμώνται ιδιαίτερα.",
-        "opt3": "Η Εταιρία δίνει έμφαση στις ανταγωνιστικές ενέργειες και τα επιτεύγματα. Η επίτευξη των φιλόδοξων στόχων και η επικράτηση στην αγορά είναι πρωταρχικής σημασίας.",
-        "opt4": "Η Εταιρία δίνει έμφαση στη μονιμότητα και τη σταθερότητα. Η αποτελεσματικότητα, ο έλεγχος και η ομαλή λειτουργία είναι σημαντικά.",
-    },
-    "Κριτήρια Επιτυχίας": {
-        "opt1": "Η Εταιρία ορίζει την επιτυχία με βάση την ανάπτυξη και το ενδιαφέρον για τους ανθρώπους της, την ομαδική εργασία και την αφοσίωση των εργαζομένων της.",
-        "opt2": "Η Εταιρία ορίζει την επιτυχία με βάση το να κατέχει τα πιο μοναδικά ή νέα προϊόντα της αγοράς. Είναι ηγέτης και καινοτομεί στον τομέα των προϊόντων.",
-        "opt3": "Η Εταιρία ορίζει την επιτυχία με βάση το μερίδιο που κατέχει στην αγορά και την υπεροχή έναντι του ανταγωνισμού. Η ανταγωνιστική της θέση στην αγορά είναι ύψιστης σημασίας.",
-        "opt4": "Η Εταιρία ορίζει την επιτυχία με βάση την αποτελεσματικότητα. Η αξιόπιστη παράδοση, ο καλός προγραμματισμός και η χαμηλού κόστους παραγωγή είναι κρίσιμης σημασίας.",
-    },
-}
-
-# ——————————————————
-# Narrative texts shown inside each example expander
-# ——————————————————
-example_texts = {
-    "Κύρια Χαρακτηριστικά": """
-**Κατανόηση Κατανομής:**  
-
-Δείτε ένα παράδειγμα για το πως να μοιράσετε τους 100 πόντους που έχετε στη διάθεσή σας.
-
-Στόχος είναι οι πόντοι που θα δώσετε σε κάθε πρόταση να περιγράφουν την πραγματικότητα που βιώνετε **σήμερα** στον οργανισμό.
-
-**Πως πρέπει να σκεφτείτε:**  
-Σε αυτήν την πρώτη ενότητα θα πρέπει να σκεφτούμε τα κύρια χαρακτηριστικά της εταιρείας.  
-
-**Παράδειγμα:** Ένας εργαζόμενος μπορεί να αισθάνεται ότι η εταιρεία δίνει μεγαλύτερη έμφαση στους στόχους και τον ανταγωνισμό, αλλά ταυτόχρονα έχει αυστηρούς κανόνες. Επίσης, μπορεί να αισθάνεται ότι η συνεργασία και η καινοτομία είναι λιγότερο σημαντικές για την καθημερινή λειτουργία της επιχείρησης.
-
-**Κατανομή:** 45 πόντοι στην 3η πρόταση, 35 στην 4η, 10 στην 1η και 10 στη 2η. *(Σύνολο: 100).*  
-
-**  **
-""",
-    "Ηγεσία Οργανισμού": """
-**Κατανόηση Κατανομής:**  
-Δείτε ένα παράδειγμα για το πως να μοιράσετε τους 100 πόντους που έχετε στη διάθεσή σας.
-
-Στόχος είναι οι πόντοι που θα δώσετε σε κάθε πρόταση να περιγράφουν την πραγματικότητα που βιώνετε **σήμερα** στον οργανισμό.
-
-**Πως πρέπει να σκεφτείτε:**  
-Σε αυτήν την πρώτη ενότητα θα πρέπει να σκεφτούμε τα χαρακτηριστικά της ηγεσίας στην εταιρεία.
-
-**Παράδειγμα:** Ο διευθυντής μου κρατάει πολύ φιλική στάση απέναντι στο προσωπικό. Μας υποστηρίζει και ενδιαφέρεται για εμάς, ταυτόχρονα καταφέρνει να συντονίσει καλά την ομάδα μας. Δεν είναι καθόλου απαιτητικός με τους στόχους, αλλά τον ενδιαφέρει πολύ να φέρνουμε νέες ιδέες για το τμήμα και τη λειτουργία του.
-
-**Κατανομή:** 40 πόντοι στην 1η πρόταση, 35 στην 4η, 0 στην 3η και 25 στη 2η. *(Σύνολο: 100).*
-""",
-    "Διαχείριση Προσωπικού": """
-**Κατανόηση Κατανομής:**  
-Δείτε ένα παράδειγμα για το πως να μοιράσετε τους 100 πόντους που έχετε στη διάθεσή σας.
-
-Στόχος είναι οι πόντοι που θα δώσετε σε κάθε πρόταση να περιγράφουν την πραγματικότητα που βιώνετε **σήμερα** στον οργανισμό.
-
-**Πως πρέπει να σκεφτείτε:**  
-Σε αυτήν την ενότητα θα πρέπει να σκεφτούμε πως γίνεται η διαχείριση του προσωπικού και τι είναι αυτό που παρακινεί τους εργαζομένους.
-
-**Παράδειγμα:** Στην ομάδα μου, δίνεται έμφαση στην ομαδική δουλειά και τη συμμετοχή στις αποφάσεις. Παράλληλα, υπάρχουν σαφή όρια και διαδικασίες που πρέπει να τηρούμε.
-
-**Κατανομή:** 50 πόντοι στην 1η πρόταση, 30 στην 4η, 0 στην 3η και 20 στη 2η. *(Σύνολο: 100).*
-""",
-    "Συνοχή Οργανισμού": """
-**Κατανόηση Κατανομής:**  
-Δείτε ένα παράδειγμα για το πως να μοιράσετε τους 100 πόντους που έχετε στη διάθεσή σας.
-
-Στόχος είναι οι πόντοι που θα δώσετε σε κάθε πρόταση να περιγράφουν την πραγματικότητα που βιώνετε **σήμερα** στον οργανισμό.
-
-**Πως πρέπει να σκεφτείτε:**  
-Σε αυτήν την ενότητα θα πρέπει να σκεφτούμε τις σχέσεις εντός του οργανισμού.
-
-**Παράδειγμα:** Αυτό που μας ενώνει είναι η σταθερότητα και η εμπιστοσύνη. Επίσης, σε ένα δεύτερο επίπεδο, μας ενώνει ο κοινός στόχος να είμαστε οι κορυφαίοι στην αγορά.
-
-**Κατανομή:** 60 πόντοι στην 4η πρόταση, 20 στην 3η, 15 στην 1η και 5 στη 2η. *(Σύνολο: 100).*
-""",
-    "Στρατηγικές Προτεραιότητες": """
-**Κατανόηση Κατανομής:**  
-Δείτε ένα παράδειγμα για το πως να μοιράσετε τους 100 πόντους που έχετε στη διάθεσή σας.
-
-Στόχος είναι οι πόντοι που θα δώσετε σε κάθε πρόταση να περιγράφουν την πραγματικότητα που βιώνετε **σήμερα** στον οργανισμό.
-
-**Πως πρέπει να σκεφτείτε:**  
-Σε αυτήν την ενότητα σκεφτόμαστε πού εστιάζει η στρατηγική της εταιρείας και τι τονίζεται σε συναντήσεις/ανακοινώσεις.
-
-**Παράδειγμα:** Η εταιρεία υιοθετεί κυρίως κουλτούρα καινοτομίας και δημιουργικότητας, δίνοντας έμφαση στην ανάπτυξη νέων, πρωτοποριακών προϊόντων. Παράλληλα, ίσως σε μικρότερο βαθμό, στοχεύει στην αύξηση του μεριδίου αγοράς.
-
-**Κατανομή:** 55 πόντοι στη 2η πρόταση, 25 στην 3η, 10 στην 1η και 10 στη 4η. *(Σύνολο: 100).*
-""",
-    "Κριτήρια Επιτυχίας": """
-**Κατανόηση Κατανομής:**  
-Δείτε ένα παράδειγμα για το πως να μοιράσετε τους 100 πόντους που έχετε στη διάθεσή σας.
-
-Στόχος είναι οι πόντοι που θα δώσετε σε κάθε πρόταση να περιγράφουν την πραγματικότητα που βιώνετε **σήμερα** στον οργανισμό.
-
-**Πως πρέπει να σκεφτείτε:**  
-Σε αυτήν την ενότητα σκεφτόμαστε πώς ορίζεται η επιτυχία εντός της εταιρείας.
-
-**Παράδειγμα:** Η επιτυχία ορίζεται κυρίως από τα οικονομικά αποτελέσματα και το μερίδιο αγοράς. Ωστόσο, υπάρχει ισχυρή πεποίθηση ότι η πραγματική επιτυχία βασίζεται στην ευημερία και την ανάπτυξη των ανθρώπων μας.
-
-**Κατανομή:** 50 πόντοι στην 3η πρόταση, 50 στην 1η, 0 στη 2η και 0 στη 4η. *(Σύνολο: 100).*
-""",
-}
+    # the process's pool of authorized Sheets clients; connections are opened on first use
+    from sheets import SheetsClientPool
+
+    return SheetsClientPool(st.secrets["GOOGLE_CREDENTIALS"])
+
+@st.cache_resource(show_spinner=False)
+def get_submission_queue():
+    # One queue per process: every session's rows share the same batched writer.
+    # Imported here, not at the top: NumPy (aggregates) and the backends are not needed to render the page.
+    from aggregates import ResponseAggregates
+    from journal import ResponseJournal
+    from shared_queue import submission_queue
+    from storage import backend_from_env
+
+    data_dir = os.getenv("CVF_DATA_DIR", ".cvf_data")
+    # with CVF_SHARED_QUEUE set, rows go through the replicas' shared queue and its single writer
+    return submission_queue(
+        backend_from_env(connect_gsheets, survey, data_dir=data_dir),
+        ResponseJournal(
+            os.path.join(data_dir, "app_responses.sqlite3"),
+            # rows journaled before version tags are of the bundled survey, whatever CVF_SURVEY serves now
+            aggregates=ResponseAggregates(survey, legacy_version=bundled_version("cvf_v2.yaml")),
+            wave=os.getenv("CVF_WAVE"), survey_version=survey.version,
+        ),
+        batch_size=int(os.getenv("CVF_BATCH_SIZE", "20")),
+        flush_interval=float(os.getenv("CVF_FLUSH_INTERVAL", "5")),
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_draft_store():
+    # Drafts of unfinished surveys (drafts.py): a reload or a dropped connection resumes where it stopped
+    data_dir = os.getenv("CVF_DATA_DIR", ".cvf_data")
+    return DraftStore(
+        os.getenv("CVF_DRAFTS") or os.path.join(data_dir, "app_drafts.sqlite3"),
+        flush_interval=float(os.getenv("CVF_DRAFT_INTERVAL", "2")),
+    )
 
 # ——————————————————
-# Example allocations (order: opt1,opt2,opt3,opt4)
+# Survey definition (surveys/cvf_v2.yaml; statements shown without Clan/Adhocracy/Market/Hierarchy)
 # ——————————————————
-example_allocations = {
-    "Κύρια Χαρακτηριστικά": [10, 10, 45, 35],
-    "Ηγεσία Οργανισμού": [40, 25, 0, 35],
-    "Διαχείριση Προσωπικού": [50, 20, 0, 30],
-    "Συνοχή Οργανισμού": [15, 5, 20, 60],
-    "Στρατηγικές Προτεραιότητες": [10, 55, 25, 10],
-    "Κριτήρια Επιτυχίας": [50, 0, 50, 0],
-}
-
-# ——————————————————
-# Demographics
-# ——————————————————
-demographic_keys = ["division", "level", "gender", "tenure", "generation"]
-
-# init session state
-for elem, opts in elements.items():
-    for k in opts:
-        st.session_state.setdefault(f"{elem}_{k}", 0)
+survey = load_survey(survey_path("cvf_v2.yaml"))
+
+def draft_owner():
+    # this browser's owner secret of its drafts (drafts.py): the one its cookie carries, else a new one
+    secret = st.session_state.get("_draft_owner")
+    if secret is None:
+        cookie = st.context.cookies.get(DRAFT_COOKIE)
+        secret = st.session_state["_draft_owner"] = cookie if is_resume_token(cookie) else new_resume_token()
+    return secret
+
+def resume_draft():
+    # a draft is restored for the URL's resume token only in the browser that saved it
+    token = st.query_params.get("resume")
+    draft = get_draft_store().load(token, survey, draft_owner()) if is_resume_token(token) else None
+    if draft:
+        st.session_state.update(draft)
+    else:
+        token = new_resume_token()  # goes into the URL once there is something to resume
+        st.query_params.pop("resume", None)
+    st.session_state["_resume_token"] = token
+
+def save_draft():
+    token = st.session_state.get("_resume_token")
+    if token and get_draft_store().save(token, survey, st.session_state, draft_owner()):
+        if st.query_params.get("resume") != token:
+            st.query_params["resume"] = token
+
+def set_draft_cookie():
+    # the browser sends the cookie with its next session's websocket, so the secret outlives a reload;
+    # st.context.cookies is only what that websocket carried, so the session remembers its own write
+    secret = draft_owner()
+    if st.session_state.get("_draft_cookie") != secret and st.context.cookies.get(DRAFT_COOKIE) != secret:
+        components.html(cookie_script(secret), height=0)
+        st.session_state["_draft_cookie"] = secret
+
+# init session state once per session (and again if a new survey version is deployed)
+if st.session_state.get("_survey_version") != survey.version:
+    for key, value in survey.default_state:
+        st.session_state.setdefault(key, value)
+    st.session_state["_survey_version"] = survey.version
+    resume_draft()
+rerun.mark("setup")
+
+def form_edited():
+    # an answer changed: whatever is submitted next is a new form, with a new idempotency key
+    st.session_state.pop("_submission_id", None)
 
 def build_row():
-    row = {
-        "Timestamp": datetime.now(ZoneInfo("Europe/Athens")).isoformat(),
-        "Division": st.session_state.get("division"),
-        "Level": st.session_state.get("level"),
-        "Gender": st.session_state.get("gender"),
-        "Generation": st.session_state.get("generation"),
-        "Tenure": st.session_state.get("tenure"),
-    }
-    for elem, opts in elements.items():
-        for k in ["opt1","opt2","opt3","opt4"]:
-            row[f"{elem}_{k}"] = st.session_state.get(f"{elem}_{k}", 0)
-    return row
+    # idempotency key of this filled-in form: a retried or repeated submit reuses it,
+    # and only an edit of an answer (form_edited) lets the next submit mint a new one
+    st.session_state.setdefault("_submission_id", uuid.uuid4().hex)
+    return survey.build_row(st.session_state, datetime.now(ZoneInfo("Europe/Athens")).isoformat())
 
 def submit_callback():
+    # a second click handled after the reset below sees a blank form: journal nothing
+    if not survey.is_complete(st.session_state):
+        return
     try:
-        sheet = connect_gsheets()
-        row = build_row()
-        sheet.append_row(list(row.values()))
+        with timed("build_row"):
+            row = build_row()
+        with timed("submit"):
+            get_submission_queue().put(row.values(), submission_id=st.session_state["_submission_id"])
+        # the next filled-in form gets a new resume token and draft owner secret, and the URL
+        # leads nowhere, so on a shared browser the next participant starts blank
+        get_draft_store().discard(st.session_state.get("_resume_token"))
+        st.session_state["_resume_token"] = new_resume_token()
+        st.session_state["_draft_owner"] = new_resume_token()
+        st.query_params.pop("resume", None)
         # reset
-        for elem, opts in elements.items():
-            for k in opts:
-                st.session_state[f"{elem}_{k}"] = 0
-        for k in demographic_keys:
+        for key, value in survey.default_state:
+            st.session_state[key] = value
+        for k in survey.demographic_keys:
             st.session_state[k] = None
+        for element in survey.elements:
+            st.session_state.pop(f"_valid_{element.name}", None)
         st.session_state["just_submitted"] = True
         st.session_state["submission_success"] = True
     except Exception as e:
@@ -225,15 +157,15 @@ def submit_callback():
 # ——————————————————
 # Header
 # ——————————————————
-LOGO_URL = "https://www.accentfuture.com/wp-content/uploads/2024/08/streamlit-training.png"
+LOGO_URL = static_url("Alumil_Culture_Insight_Bright.png")
 
-st.markdown(f"""
+st.markdown(html_block(f"""
 <div class="header" style="display: flex; align-items: center; justify-content: space-between; margin-bottom: 20px;">
   <img src="{LOGO_URL}" alt="Company Logo" style="height:80px;">
-  <h1 style="flex-grow: 1; text-align: center; margin: 0;">Έρευνα Οργανωσιακής Κουλτούρας (CVF)</h1>
+  <h1 style="flex-grow: 1; text-align: center; margin: 0;">{survey.title}</h1>
   <div style="width:80px;"></div> <!-- empty spacer to balance the logo -->
 </div>
-""", unsafe_allow_html=True)
+"""), unsafe_allow_html=True)
 
 
 
@@ -241,23 +173,13 @@ st.markdown(f"""
 # Sidebar
 # ——————————————————
 st.sidebar.title("👤 Δημογραφικά Στοιχεία")
-divisions = ["General Management","Innovation","Operations Division","Sales Division","Finance Division",
-             "Human Resources Division","IT Division","Production Division","Logistics Division","Legal Division","Engineering"]
-levels = ["Corporate Directors","Managers, Υπεύθυνοι Διοικητικών Τμημάτων & Leads","Διοικητικοί Υπάλληλοι & Υπεύθυνοι Βάρδιας","Εργατοτεχνικό Προσωπικό"]
-genders = ["Άνδρας","Γυναίκα","Άλλο"]
-tenures = ["0-6 μήνες","6 μήνες–1 έτος","1–3 έτη","3–5 έτη","5–10 έτη","10+ έτη"]
-generations = ["1997–2012","1981–1996","1965–1980","1946–1964"]
-
-st.sidebar.selectbox("Διεύθυνση", divisions, key="division", index=None, placeholder="Επιλέξτε Διεύθυνση...")
-st.sidebar.selectbox("Επίπεδο", levels, key="level", index=None, placeholder="Επιλέξτε Επίπεδο...")
-st.sidebar.selectbox("Φύλο", genders, key="gender", index=None, placeholder="Επιλέξτε Φύλο...")
-st.sidebar.selectbox("Έτη Εργασίας στην Εταιρία", tenures, key="tenure", index=None, placeholder="Επιλέξτε Προυπηρεσία...")
-st.sidebar.selectbox("Έτος Γεννήσεως", generations, key="generation", index=None, placeholder="Επιλέξτε το έτος...",
-    help="Gen Z: 1997–2012 | Millennials: 1981–1996 | Gen X: 1965–1980 | Baby Boomers: 1946–1964")
+for demo in survey.demographics:
+    st.sidebar.selectbox(demo.label, demo.options, key=demo.key, index=None,
+                         placeholder=demo.placeholder, help=demo.help, on_change=form_edited)
 
 st.sidebar.markdown("---")
 st.sidebar.subheader("ℹ️ Σχετικά με την Συμπλήρωση Ερωτηματολογίου!")
-st.sidebar.markdown("""
+st.sidebar.markdown(html_block("""
 <div class="project-info" style="text-align: justify;">
 <strong>Οδηγίες Συμμετοχής στην Έρευνα Κουλτούρας</strong><br><br>
 Αυτή η έρευνα έχει σκοπό να μας βοηθήσει να κατανοήσουμε καλύτερα την κουλτούρα του οργανισμού μας.<br>
@@ -275,52 +197,105 @@ st.sidebar.markdown("""
 
 Για τυχόν απορίες, επικοινωνήστε με την <b>Διεύθυνση Ανθρώπινου Δυναμικού</b>.
 </div>
-""", unsafe_allow_html=True)
+"""), unsafe_allow_html=True)
 
 
 # ——————————————————
 # Main
 # ——————————————————
-all_totals_are_100 = True
-fixed_order = ["opt1","opt2","opt3","opt4"]
+@st.cache_resource
+def option_labels(version, _survey):
+    # Card HTML for every option, built once per process and survey version instead of on every rerun
+    return {
+        (option.state_key, css_class): html_block(f'<div class="small {css_class}">{option.text}</div>')
+        for element in _survey.elements
+        for option in element.options
+        for css_class in ("cvf-label", "cvf-label-example")
+    }
 
-for elem, opts in elements.items():
-    st.subheader(elem)
+def section_total(element):
+    return sum(st.session_state.get(key, 0) for key in element.state_keys)
 
+def render_example(element, labels):
     with st.expander("💡 Παράδειγμα: κείμενο & ενδεικτική κατανομή"):
-        st.markdown(example_texts[elem])
+        st.markdown(element.example_text)
         # Example slicers (read-only)
         cols_ex = st.columns(4)
-        alloc = example_allocations.get(elem, [25,25,25,25])
-        for i, k in enumerate(fixed_order):
+        alloc = element.example_allocation or (25, 25, 25, 25)
+        for i, option in enumerate(element.options):
             with cols_ex[i]:
-                st.markdown(f'<div class="small cvf-label-example">{elements[elem][k]}</div>', unsafe_allow_html=True)
+                st.markdown(labels[option.state_key, "cvf-label-example"], unsafe_allow_html=True)
                 st.slider(
-                    label=f"EX_{elem}_{k}", min_value=0, max_value=100, value=alloc[i],
-                    step=5, disabled=True, label_visibility="hidden", key=f"EX_{elem}_{k}"
+                    label=f"EX_{option.state_key}", min_value=0, max_value=100, value=alloc[i],
+                    step=5, disabled=True, label_visibility="hidden", key=f"EX_{option.state_key}"
                 )
 
+@timed("section")
+def render_allocator(element):
+    # Sliders and their total live in the browser (allocator.py); the page reruns only
+    # when this section reaches 100 points or leaves 100, and the submit button follows
+    st.subheader(element.name)
+    render_example(element, option_labels(survey.version, survey))
+    allocator(element, ALLOCATOR_MESSAGES[element.name], quiet=bool(st.session_state.get("just_submitted")),
+              on_change=form_edited, draft_key=st.session_state.get("_resume_token"))
+    st.markdown("---")
+
+@st.fragment
+@timed("section")
+def render_section(element):
+    # A slider move reruns only this section; the rest of the page stays as rendered
+    elem = element.name
+    st.subheader(elem)
+    labels = option_labels(survey.version, survey)
+    render_example(element, labels)
+
     # Active input sliders (equal-height cards)
     cols = st.columns(4)
-    current_total = 0
-    for i, k in enumerate(fixed_order):
+    for i, option in enumerate(element.options):
         with cols[i]:
             with st.container(border=True):
-                st.markdown(f'<div class="small cvf-label">{elements[elem][k]}</div>', unsafe_allow_html=True)
-                st.slider(label=f"{elem}_{k}", min_value=0, max_value=100, step=5,
-                          key=f"{elem}_{k}", label_visibility="hidden")
-                current_total += st.session_state[f"{elem}_{k}"]
-
-    if current_total != 100:
-        all_totals_are_100 = False
-        if not st.session_state.get("just_submitted"):
-            st.error(f"❌ Το σύνολο στο στοιχείο «{elem}» πρέπει να είναι 100 (τώρα: {current_total}).")
+                st.markdown(labels[option.state_key, "cvf-label"], unsafe_allow_html=True)
+                st.slider(label=option.state_key, min_value=0, max_value=100, step=5,
+                          key=option.state_key, label_visibility="hidden", on_change=form_edited)
+
+    current_total = section_total(element)
+    if current_total != 100 and not st.session_state.get("just_submitted"):
+        st.error(f"❌ Το σύνολο στο στοιχείο «{elem}» πρέπει να είναι 100 (τώρα: {current_total}).")
     st.markdown("---")
+    save_draft()  # a slider move reruns only this fragment, not the end of the script
+
+    # The submit button lives outside the fragment: only when this section flips
+    # between valid and invalid does the whole page need to rerun to update it
+    valid = current_total == 100
+    was_valid = st.session_state.get(f"_valid_{elem}", valid)
+    st.session_state[f"_valid_{elem}"] = valid
+    if valid != was_valid:
+        st.rerun()
+
+# CVF_ALLOCATOR=sliders: one st.slider per statement, each move a fragment rerun (no custom component)
+ALLOCATOR = os.getenv("CVF_ALLOCATOR", "component")
+if ALLOCATOR == "component":
+    from allocator import allocator
+
+    ALLOCATOR_MESSAGES = {
+        element.name: {
+            "valid": "✅ Σύνολο: {current} / {total}",
+            "invalid": f"❌ Το σύνολο στο στοιχείο «{element.name}» πρέπει να είναι {{total}} (τώρα: {{current}}).",
+        }
+        for element in survey.elements
+    }
+for element in survey.elements:
+    if ALLOCATOR == "component":
+        render_allocator(element)
+    else:
+        render_section(element)
+
+all_totals_are_100 = all(section_total(element) == 100 for element in survey.elements)
 
 # ——————————————————
 # Submit
 # ——————————————————
-all_demographics_filled = all(st.session_state.get(key) is not None for key in demographic_keys)
+all_demographics_filled = all(st.session_state.get(key) is not None for key in survey.demographic_keys)
 disabled = (not all_totals_are_100) or (not all_demographics_filled)
 hint = ""
 if not all_demographics_filled:
@@ -332,6 +307,7 @@ _, mid, _ = st.columns([1,1.5,1])
 with mid:
     st.button("Υποβολή Απαντήσεων", disabled=disabled, on_click=submit_callback,
               use_container_width=True, help=hint)
+rerun.mark("render")
 
 # ——————————————————
 # Post-submission
@@ -357,3 +333,15 @@ if st.session_state.get("just_submitted"):
 
 
 
+
+# ——————————————————
+# Process warm-up: queue, journal and Sheets connection in the background, after the first page is out
+# ——————————————————
+@st.cache_resource
+def start_warm_up():
+    return warm_up(get_submission_queue)
+
+start_warm_up()
+save_draft()
+set_draft_cookie()
+rerun.finish(st.session_state)
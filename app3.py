@@ -1,12 +1,14 @@
 import streamlit as st
-import pandas as pd
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime
 import streamlit.components.v1 as components
-from datetime import datetime
 from zoneinfo import ZoneInfo
-import os, json, toml
+import os, json, uuid
+from drafts import DRAFT_COOKIE, DraftStore, cookie_script, is_resume_token, new_resume_token
+from metrics import start_rerun, timed
+from startup import warm_up
+from survey_schema import bundled_version, load_survey, survey_path
+
+rerun = start_rerun()  # timing of this script run (metrics.py)
 
 
 # ——————————————————
@@ -73,6 +75,8 @@ def load_google_creds():
 
     # 2) Render Secret File named 'secrets.toml' at project root
     if os.path.exists("secrets.toml"):
+        import toml
+
         data = toml.load("secrets.toml")
         if "GOOGLE_CREDENTIALS" in data:
             return data["GOOGLE_CREDENTIALS"]
@@ -87,164 +91,130 @@ def load_google_creds():
         "or an env var GOOGLE_CREDENTIALS."
     )
 
-@st.cache_resource
+@st.cache_resource(show_spinner=False)  # also called from the warm-up thread
 def connect_gsheets():
-    scope = [
-        "https://spreadsheets.google.com/feeds",
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive.file",
-        "https://www.googleapis.com/auth/drive",
-    ]
-    creds_dict = load_google_creds()
-    creds  = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-    client = gspread.authorize(creds)
-
-    SPREADSHEET_ID = "1MxlsC3f3pvBhdkYYQj5B7Q-ShqPK7ZLOFtE1d2VNKJ0"
-    # use .worksheet("SheetName") if you target a specific tab
-    return client.open_by_key(SPREADSHEET_ID).sheet1
+    # the process's pool of authorized Sheets clients; connections are opened on first use
+    from sheets import SheetsClientPool
+
+    return SheetsClientPool(load_google_creds())
+
+@st.cache_resource(show_spinner=False)
+def get_submission_queue():
+    # One queue per process: every session's rows share the same batched writer.
+    # Imported here, not at the top: NumPy (aggregates) and the backends are not needed to render the page.
+    from aggregates import ResponseAggregates
+    from journal import ResponseJournal
+    from shared_queue import submission_queue
+    from storage import backend_from_env
+
+    data_dir = os.getenv("CVF_DATA_DIR", ".cvf_data")
+    # with CVF_SHARED_QUEUE set, rows go through the replicas' shared queue and its single writer
+    return submission_queue(
+        backend_from_env(connect_gsheets, survey, data_dir=data_dir),
+        ResponseJournal(
+            os.path.join(data_dir, "app3_responses.sqlite3"),
+            # rows journaled before version tags are of the bundled survey, whatever CVF_SURVEY serves now
+            aggregates=ResponseAggregates(survey, legacy_version=bundled_version("cvf_v1.yaml")),
+            wave=os.getenv("CVF_WAVE"), survey_version=survey.version,
+        ),
+        batch_size=int(os.getenv("CVF_BATCH_SIZE", "20")),
+        flush_interval=float(os.getenv("CVF_FLUSH_INTERVAL", "5")),
+    )
 
-# ——————————————————
-# Define survey structure
-# ——————————————————
-# ——————————————————
-# Define survey structure with EXAMPLES
-# ——————————————————
-elements = {
-    "Δομικά Χαρακτηριστικά": {
-        "Clan": "Οργανισμός σαν μεγάλη οικογένεια· συνεργασία & αμοιβαία φροντίδα.",
-        "Adhocracy": "Δυναμικός & καινοτόμος· ενθάρρυνση ανάληψης ρίσκου.",
-        "Market": "Ανταγωνιστικός & στοχοπροσηλωμένος· επίτευξη αποτελεσμάτων.",
-        "Hierarchy": "Ελεγχόμενος & δομημένος· τήρηση επίσημων διαδικασιών."
-    },
-    "Ηγεσία Οργανισμού": {
-        "Clan": "Οι ηγέτες καθοδηγούν, υποστηρίζουν & χτίζουν εμπιστοσύνη.",
-        "Adhocracy": "Οι ηγέτες καινοτομούν & ενθαρρύνουν την εξερεύνηση.",
-        "Market": "Οι ηγέτες απαιτούν αποτελεσματικότητα & νίκη στην αγορά.",
-        "Hierarchy": "Οι ηγέτες οργανώνουν & ελέγχουν τη λειτουργία αποδοτικά."
-    },
-    "Διαχείριση Προσωπικού": {
-        "Clan": "Προώθηση ομαδικότητας, συναίνεσης & συμμετοχής.",
-        "Adhocracy": "Ενθάρρυνση ατομικής ελευθερίας & δημιουργικότητας.",
-        "Market": "Επιβράβευση επίτευξης στόχων & ανταγωνισμού.",
-        "Hierarchy": "Διασφάλιση ασφάλειας, σταθερότητας & συμμόρφωσης."
-    },
-    "Συνοχή Οργανισμού": {
-        "Clan": "Glue: αμοιβαία εμπιστοσύνη & δέσμευση.",
-        "Adhocracy": "Glue: καινοτομία & όραμα για το μέλλον.",
-        "Market": "Glue: επίτευξη αποτελεσμάτων & νίκη.",
-        "Hierarchy": "Glue: τήρηση κανόνων & διαδικασιών."
-    },
-    "Στρατηγικές Προτεραιότητες": {
-        "Clan": "Έμφαση στην ανάπτυξη ανθρώπων & σχέσεων.",
-        "Adhocracy": "Έμφαση σε νέες ιδέες & πειραματισμό.",
-        "Market": "Έμφαση στην ηγεσία αγοράς & απόδοση.",
-        "Hierarchy": "Έμφαση στην αποδοτικότητα & σταθερότητα."
-    },
-    "Κριτήρια Επιτυχίας": {
-        "Clan": "Επιτυχία = δέσμευση & ικανοποίηση εργαζομένων.",
-        "Adhocracy": "Επιτυχία = πρωτοπορία & προσαρμοστικότητα.",
-        "Market": "Επιτυχία = μερίδιο αγοράς & οικονομικά αποτελέσματα.",
-        "Hierarchy": "Επιτυχία = συνέπεια, διαδικασίες & χαμηλό κόστος."
-    }
-}
+@st.cache_resource(show_spinner=False)
+def get_draft_store():
+    # Drafts of unfinished surveys (drafts.py): a reload or a dropped connection resumes where it stopped
+    data_dir = os.getenv("CVF_DATA_DIR", ".cvf_data")
+    return DraftStore(
+        os.getenv("CVF_DRAFTS") or os.path.join(data_dir, "app3_drafts.sqlite3"),
+        flush_interval=float(os.getenv("CVF_DRAFT_INTERVAL", "2")),
+    )
 
 # ——————————————————
-# NEW: Dictionary with Professional Examples
+# Survey definition (surveys/cvf_v1.yaml, with EXAMPLES)
 # ——————————————————
-example_texts = {
-    "Δομικά Χαρακτηριστικά": """
-    #### Κατανόηση της Κατανομής
-    Στόχος είναι η βαθμολογία σας να αντικατοπτρίζει την **υπάρχουσα κατάσταση** στην εταιρεία. Φανταστείτε ότι έχετε 100 "μονάδες κουλτούρας" να μοιράσετε.
-
-    **Παράδειγμα Σκέψης:** Ένας εργαζόμενος μπορεί να αισθάνεται ότι η εταιρεία είναι πολύ εστιασμένη στους στόχους και τον ανταγωνισμό, αλλά ταυτόχρονα έχει αυστηρούς κανόνες. Η συνεργασία και η καινοτομία είναι λιγότερο έντονες.
-    * **Κατανομή:** Θα μπορούσε να δώσει **45 πόντους στο Market** (κυρίαρχο στοιχείο), **35 στην Hierarchy** (ισχυρό δευτερεύον στοιχείο), **10 στο Clan** και **10 στην Adhocracy**. (Σύνολο: 100).
-
-    ---
-    * **Clan (Συνεργασία):** Εκδηλώνεται με ομαδικό πνεύμα, κοινές δραστηριότητες και αίσθημα "οικογένειας". Η ηγεσία λειτουργεί ως μέντορας.
-    * **Adhocracy (Καινοτομία):** Εκδηλώνεται με ενθάρρυνση για πειραματισμό, ανάληψη ρίσκου και εστίαση σε νέες ιδέες. Το περιβάλλον είναι δυναμικό.
-    * **Market (Ανταγωνισμός):** Εκδηλώνεται με επιθετική εστίαση στην επίτευξη μετρήσιμων στόχων (KPIs), στην απόδοση και στην επικράτηση έναντι του ανταγωνισμού.
-    * **Hierarchy (Δομή):** Εκδηλώνεται με έμφαση σε σαφείς κανόνες, διαδικασίες, συντονισμό και σταθερότητα. Οι ρόλοι είναι αυστηρά καθορισμένοι.
-    """,
-    "Ηγεσία Οργανισμού": """
-    #### Κατανόηση της Ηγεσίας
-    Αξιολογήστε το κυρίαρχο στυλ των ηγετών (από προϊσταμένους έως τη διοίκηση). Ένας ηγέτης μπορεί να συνδυάζει στοιχεία, αλλά ποιο είναι το πιο έντονο;
-
-    **Παράδειγμα Σκέψης:** Ο διευθυντής μου είναι πολύ απαιτητικός με τους στόχους (Market), αλλά ταυτόχρονα φροντίζει να συντονίζει άψογα την ομάδα (Hierarchy). Δεν τον ενδιαφέρει τόσο η καινοτομία (Adhocracy) και κρατάει μια πιο επαγγελματική, παρά φιλική, στάση (Clan).
-    * **Κατανομή:** Θα μπορούσε να δώσει **50 πόντους στο Market**, **40 στην Hierarchy**, **5 στο Clan** και **5 στην Adhocracy**. (Σύνολο: 100).
-    """,
-    "Διαχείριση Προσωπικού": """
-    #### Κατανόηση της Διαχείρισης
-    Πώς η εταιρεία δομεί την εργασία και παρακινεί τους εργαζομένους;
-
-    **Παράδειγμα Σκέψης:** Στην ομάδα μου, ενθαρρύνεται η ομαδική δουλειά και η συμμετοχή στις αποφάσεις (Clan). Παράλληλα, υπάρχουν σαφή όρια και διαδικασίες που πρέπει να τηρούμε (Hierarchy).
-    * **Κατανομή:** Θα μπορούσε να δώσει **50 πόντους στο Clan**, **35 στην Hierarchy**, **10 στο Market** και **5 στην Adhocracy**. (Σύνολο: 100).
-    """,
-    "Συνοχή Οργανισμού": """
-    #### Κατανόηση της "Κόλλας"
-    Τι είναι αυτό που κρατάει την εταιρεία συνεκτική και τους ανθρώπους ευθυγραμμισμένους;
-
-    **Παράδειγμα Σκέψης:** Αυτό που μας ενώνει είναι η προσήλωση στους κανόνες και τις επίσημες πολιτικές της εταιρείας, που εξασφαλίζουν σταθερότητα (Hierarchy). Δευτερευόντως, μας ενώνει ο κοινός στόχος να είμαστε οι κορυφαίοι στην αγορά (Market).
-    * **Κατανομή:** Θα μπορούσε να δώσει **60 πόντους στην Hierarchy**, **30 στο Market**, **5 στο Clan** και **5 στην Adhocracy**. (Σύνολο: 100).
-    """,
-    "Στρατηγικές Προτεραιότητες": """
-    #### Κατανόηση των Προτεραιοτήτων
-    Πού εστιάζει η εταιρεία τη στρατηγική της; Τι τονίζεται περισσότερο στις συναντήσεις και τις ανακοινώσεις;
-
-    **Παράδειγμα Σκέψης:** Η εταιρεία δίνει τεράστια έμφαση στην ανάπτυξη νέων, καινοτόμων προϊόντων (Adhocracy). Για να το πετύχει αυτό, εστιάζει και στην απόκτηση μεγαλύτερου μεριδίου αγοράς (Market).
-    * **Κατανομή:** Θα μπορούσε να δώσει **55 πόντους στην Adhocracy**, **35 στο Market**, **5 στο Clan** και **5 στην Hierarchy**. (Σύνολο: 100).
-    """,
-    "Κριτήρια Επιτυχίας": """
-    #### Κατανόηση της Επιτυχίας
-    Πώς ορίζεται η επιτυχία στην εταιρεία; Τι επιβραβεύεται και τι θεωρείται νίκη;
-
-    **Παράδειγμα Σκέψης:** Η επιτυχία ορίζεται κυρίως από τα οικονομικά αποτελέσματα και το μερίδιο αγοράς (Market). Ωστόσο, υπάρχει και μια ισχυρή πεποίθηση ότι η επιτυχία βασίζεται στην ευημερία και την ανάπτυξη των ανθρώπων μας (Clan).
-    * **Κατανομή:** Θα μπορούσε να δώσει **50 πόντους στο Market**, **40 στο Clan**, **5 στην Adhocracy** και **5 στην Hierarchy**. (Σύνολο: 100).
-    """
-}
-
-demographic_keys = ["division", "level", "gender", "tenure", "generation"]
-
-# --- NEW: Initialize Session State ---
+survey = load_survey(survey_path("cvf_v1.yaml"))
+
+def draft_owner():
+    # this browser's owner secret of its drafts (drafts.py): the one its cookie carries, else a new one
+    secret = st.session_state.get("_draft_owner")
+    if secret is None:
+        cookie = st.context.cookies.get(DRAFT_COOKIE)
+        secret = st.session_state["_draft_owner"] = cookie if is_resume_token(cookie) else new_resume_token()
+    return secret
+
+def resume_draft():
+    # a draft is restored for the URL's resume token only in the browser that saved it
+    token = st.query_params.get("resume")
+    draft = get_draft_store().load(token, survey, draft_owner()) if is_resume_token(token) else None
+    if draft:
+        st.session_state.update(draft)
+    else:
+        token = new_resume_token()  # goes into the URL once there is something to resume
+        st.query_params.pop("resume", None)
+    st.session_state["_resume_token"] = token
+
+def save_draft():
+    token = st.session_state.get("_resume_token")
+    if token and get_draft_store().save(token, survey, st.session_state, draft_owner()):
+        if st.query_params.get("resume") != token:
+            st.query_params["resume"] = token
+
+def set_draft_cookie():
+    # the browser sends the cookie with its next session's websocket, so the secret outlives a reload;
+    # st.context.cookies is only what that websocket carried, so the session remembers its own write
+    secret = draft_owner()
+    if st.session_state.get("_draft_cookie") != secret and st.context.cookies.get(DRAFT_COOKIE) != secret:
+        components.html(cookie_script(secret), height=0)
+        st.session_state["_draft_cookie"] = secret
+
+# --- Initialize Session State ---
 # This ensures every slider has a starting value in the state, preventing the warning.
-# This block runs only once at the beginning of the session.
-for elem, stmts in elements.items():
-    for cult in stmts:
-        key = f"{elem}_{cult}"
-        if key not in st.session_state:
-            st.session_state[key] = 0
+# Runs once per session, and again if a new survey version is deployed.
+if st.session_state.get("_survey_version") != survey.version:
+    for key, value in survey.default_state:
+        st.session_state.setdefault(key, value)
+    st.session_state["_survey_version"] = survey.version
+    resume_draft()
+rerun.mark("setup")
+
+def form_edited():
+    # an answer changed: whatever is submitted next is a new form, with a new idempotency key
+    st.session_state.pop("_submission_id", None)
 
 def build_row():
     """Build a row for Google Sheets from session_state"""
-    row = {
-        "Timestamp": datetime.now(ZoneInfo("Europe/Athens")).isoformat(),
-        "Division": st.session_state.get("division"),
-        "Level": st.session_state.get("level"),
-        "Gender": st.session_state.get("gender"),
-        "Generation": st.session_state.get("generation"),
-        "Tenure": st.session_state.get("tenure")
-    }
-    for elem, stmts in elements.items():
-        for cult in stmts:
-            row[f"{elem}_{cult}"] = st.session_state.get(f"{elem}_{cult}", 0)
-    return row
+    # idempotency key of this filled-in form: a retried or repeated submit reuses it,
+    # and only an edit of an answer (form_edited) lets the next submit mint a new one
+    st.session_state.setdefault("_submission_id", uuid.uuid4().hex)
+    return survey.build_row(st.session_state, datetime.now(ZoneInfo("Europe/Athens")).isoformat())
 
 # ——————————————————
 # Submission callback (MODIFIED)
 # ——————————————————
 def submit_callback():
-    """Builds row, appends to GSheets, then resets state."""
+    """Builds row, queues it for the batched GSheets writer, then resets state."""
+    # a second click handled after the reset below sees a blank form: journal nothing
+    if not survey.is_complete(st.session_state):
+        return
     try:
-        sheet = connect_gsheets()
-        row = build_row()
-        sheet.append_row(list(row.values()))
+        with timed("build_row"):
+            row = build_row()
+        with timed("submit"):
+            get_submission_queue().put(row.values(), submission_id=st.session_state["_submission_id"])
+        # the next filled-in form gets a new resume token and draft owner secret, and the URL
+        # leads nowhere, so on a shared browser the next participant starts blank
+        get_draft_store().discard(st.session_state.get("_resume_token"))
+        st.session_state["_resume_token"] = new_resume_token()
+        st.session_state["_draft_owner"] = new_resume_token()
+        st.query_params.pop("resume", None)
 
         # 1. Reset survey slider values to 0
-        for elem, stmts in elements.items():
-            for cult in stmts:
-                st.session_state[f"{elem}_{cult}"] = 0
+        for key, value in survey.default_state:
+            st.session_state[key] = value
 
         # 2. Reset demographic selectbox values to None (to show placeholder)
-        for key in demographic_keys:
+        for key in survey.demographic_keys:
             st.session_state[key] = None
 
         # 3. Set flag to show success message and trigger scroll
@@ -263,29 +233,9 @@ st.sidebar.title("👤 Δημογραφικά Στοιχεία")
 LOGO_URL = "https://aldom.gr/wp-content/uploads/2020/05/alumil.png"  
 
 
-divisions = [
-    "General Management", "Innovation", "Operations Division",
-    "Sales Division", "Finance Division", "Human Resources Division",
-    "IT Division", "Production Division", "Logistics Division",
-    "Legal Division", "Engineering"
-]
-levels = ["Διευθυντής", "Manager", "Διοικητικό Προσωπικό", "Εργατοτεχνικό Προσωπικό"]
-genders = ["Άνδρας", "Γυναίκα", "Άλλο"]
-tenures = ["0–1 έτος", "1–3 έτη", "3–5 έτη", "5–10 έτη", "10+ έτη"]
-generations = ["Gen Z", "Millennials", "Gen X", "Baby Boomers"]
-
-st.sidebar.selectbox("Διεύθυνση", divisions, key="division", index=None, placeholder="Επιλέξτε Διεύθυνση...")
-st.sidebar.selectbox("Επίπεδο", levels, key="level", index=None, placeholder="Επιλέξτε Επίπεδο...")
-st.sidebar.selectbox("Φύλο", genders, key="gender", index=None, placeholder="Επιλέξτε Φύλο...")
-st.sidebar.selectbox("Προυπηρεσία", tenures, key="tenure", index=None, placeholder="Επιλέξτε Προυπηρεσία...")
-st.sidebar.selectbox(
-    "Γενιά", generations, key="generation",
-    index=None, placeholder="Επιλέξτε Γενιά...",
-    help=("Gen Z: 1997–2012\n"
-          "Millennials: 1981–1996\n"
-          "Gen X: 1965–1980\n"
-          "Baby Boomers: 1946–1964")
-)
+for demo in survey.demographics:
+    st.sidebar.selectbox(demo.label, demo.options, key=demo.key, index=None,
+                         placeholder=demo.placeholder, help=demo.help, on_change=form_edited)
 
 
 # Project info box
@@ -320,29 +270,27 @@ st.sidebar.markdown(
 st.markdown(f"""
 <div class="header">
   <img src="{LOGO_URL}" alt="Company Logo">
-  <h1>Έρευνα Οργανωσιακής Κουλτούρας (CVF)</h1>
+  <h1>{survey.title}</h1>
 </div>
 """, unsafe_allow_html=True)
 st.markdown("---")
 
 all_totals_are_100 = True
-for elem, stmts in elements.items():
+for element in survey.elements:
+    elem = element.name
     st.subheader(elem)
 
-    # --- NEW: Add the expander using the separate 'example_texts' dictionary ---
-    if elem in example_texts:
+    if element.example_text:
         with st.expander("💡 Δείτε ένα επαγγελματικό παράδειγμα για την κατανομή των πόντων"):
-            st.markdown(example_texts[elem], unsafe_allow_html=True)
-    # --- END OF NEW CODE ---
+            st.markdown(element.example_text, unsafe_allow_html=True)
 
     cols = st.columns(4)
     current_total = 0
-    for i, (cult, desc) in enumerate(stmts.items()):
-        key = f"{elem}_{cult}"
+    for i, option in enumerate(element.options):
         with cols[i]:
-            st.slider(cult, 0, 100, step=5, key=key)
-            st.caption(desc)
-            current_total += st.session_state[key]
+            st.slider(option.key, 0, 100, step=5, key=option.state_key, on_change=form_edited)
+            st.caption(option.text)
+            current_total += st.session_state[option.state_key]
     
     # ... the rest of your loop for error checking ...
     if current_total != 100:
@@ -358,7 +306,7 @@ for elem, stmts in elements.items():
 # Submission Button
 # ——————————————————
 # Check if all demographic fields are filled
-all_demographics_filled = all(st.session_state.get(key) is not None for key in demographic_keys)
+all_demographics_filled = all(st.session_state.get(key) is not None for key in survey.demographic_keys)
 
 is_disabled = not all_totals_are_100 or not all_demographics_filled
 submit_tooltip = ""
@@ -375,6 +323,7 @@ with col2:
               use_container_width=True,
               help=submit_tooltip
              )
+rerun.mark("render")
 
 # ——————————————————
 # Banner at bottom (MODIFIED)
@@ -398,15 +347,14 @@ if st.session_state.get("just_submitted"):
     if "submission_success" in st.session_state:
         del st.session_state["submission_success"]
 
+# ——————————————————
+# Process warm-up: queue, journal and Sheets connection in the background, after the first page is out
+# ——————————————————
+@st.cache_resource
+def start_warm_up():
+    return warm_up(get_submission_queue)
 
-
-
-
-
-
-
-
-
-
-
-
+start_warm_up()
+save_draft()
+set_draft_cookie()
+rerun.finish(st.session_state)
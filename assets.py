@@ -0,0 +1,48 @@
+"""
+Static page assets rendered once per process.
+
+The CSS block, header and sidebar HTML never change between reruns, so they
+are minified on first use and cached for the life of the server process
+(imported modules survive Streamlit reruns). Images are served by Streamlit's
+static file route (``server.enableStaticServing`` in .streamlit/config.toml)
+from the ``static/`` folder next to the app.
+"""
+import hashlib
+import os
+import re
+from functools import lru_cache
+
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+
+def minify_css(css):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};:,>])\s*", r"\1", css)
+    return css.replace(";}", "}").strip()
+
+
+def minify_html(html):
+    html = re.sub(r"<!--.*?-->", "", html, flags=re.S)
+    html = re.sub(r">\s+<", "><", html)
+    return re.sub(r"\s+", " ", html).strip()
+
+
+@lru_cache(maxsize=None)
+def style_block(css):
+    """``<style>`` tag with minified CSS, ready for st.markdown(..., unsafe_allow_html=True)."""
+    return f"<style>{minify_css(css)}</style>"
+
+
+@lru_cache(maxsize=None)
+def html_block(html):
+    return minify_html(html)
+
+
+@lru_cache(maxsize=None)
+def static_url(filename):
+    """URL of a file in static/, versioned by content hash so browsers can keep it cached."""
+    with open(os.path.join(STATIC_DIR, filename), "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:12]
+    return f"app/static/{filename}?v={digest}"
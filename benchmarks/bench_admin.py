@@ -0,0 +1,91 @@
+"""
+Render time of the admin dashboard (admin.py) over a large journal.
+
+Fills a throwaway journal with synthetic responses spread over two weeks,
+builds its aggregates, starts ``streamlit run admin.py`` headless and opens
+the page with the websocket client from bench_rerun.py: first with cold
+caches (every query hits SQLite), then as a series of new viewers and as a
+burst of concurrent viewers, which all read the shared query cache.
+
+    python benchmarks/bench_admin.py --rows 50000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from aggregates import ResponseAggregates
+from bench_rerun import Session, free_port, start_server, wait_for_server
+from bench_store import synthetic_rows
+from bench_submit import fmt_ms
+from journal import ResponseJournal
+from survey_schema import load_survey, survey_path
+
+
+def fill_journal(path, survey, n):
+    journal = ResponseJournal(path)
+    rows = synthetic_rows(survey, n)
+    for row in rows:
+        journal.append([row[c] for c in survey.columns])
+    created = time.time() - 14 * 86400 + np.sort(np.random.default_rng(1).uniform(0, 14 * 86400, n))
+    with journal._conn() as conn:
+        conn.executemany("UPDATE responses SET created_at = ? WHERE id = ?",
+                         [(float(t), i + 1) for i, t in enumerate(created)])
+    ResponseJournal(path, aggregates=ResponseAggregates(survey))  # builds the aggregates
+
+
+async def view(url):
+    """One new viewer: connect, render the page once, return the seconds until the run finished."""
+    import websockets
+
+    async with websockets.connect(url, subprotocols=["streamlit"], max_size=None) as ws:
+        elapsed, _ = await Session(ws).rerun()
+        return elapsed
+
+
+async def drive(url, views, concurrent):
+    cold = await view(url)
+    sequential = [await view(url) for _ in range(views)]
+    burst = await asyncio.gather(*(view(url) for _ in range(concurrent)))
+    return cold, sequential, burst
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--views", type=int, default=50, help="sequential page views after the first")
+    parser.add_argument("--concurrent", type=int, default=30, help="viewers opening the page at the same time")
+    args = parser.parse_args()
+
+    survey = load_survey(survey_path("cvf_v2.yaml"))
+    os.environ["CVF_DATA_DIR"] = tempfile.mkdtemp(prefix="cvf-admin-")
+    t0 = time.perf_counter()
+    fill_journal(os.path.join(os.environ["CVF_DATA_DIR"], "app_responses.sqlite3"), survey, args.rows)
+    print(f"rows={args.rows} journal built in {time.perf_counter() - t0:.1f} s")
+
+    port = free_port()
+    # no password prompt to get past: open the dashboard explicitly
+    server = start_server(os.path.join(ROOT, "admin.py"), port, {"CVF_ADMIN_OPEN": "1"})
+    try:
+        wait_for_server(server, port)
+        cold, sequential, burst = asyncio.run(
+            drive(f"ws://127.0.0.1:{port}/_stcore/stream", args.views, args.concurrent)
+        )
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"first view (cold caches)  {cold * 1000:.1f} ms")
+    print(f"new viewers               {fmt_ms(sequential)}")
+    print(f"{args.concurrent} concurrent viewers   {fmt_ms(burst)}")
+
+
+if __name__ == "__main__":
+    main()
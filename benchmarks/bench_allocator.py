@@ -0,0 +1,131 @@
+"""
+Reruns per completed survey: st.slider sections vs the browser-side allocator.
+
+Starts app.py twice against a real server (CVF_ALLOCATOR=sliders, then
+component) and fills in all six allocations with the websocket client from
+bench_rerun.py. With sliders every slider that gets points is one rerun (a
+lower bound: a participant who adjusts a slider again pays again); with the
+allocator each element is one commit, sent the way the component's iframe
+sends it. Checks that the committed values come back from the server.
+
+    python benchmarks/bench_allocator.py --surveys 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_rerun import Session, free_port, start_server, wait_for_server
+from bench_submit import fmt_ms
+from load_test import random_allocation
+
+
+class AllocatorSession(Session):
+    """Session that also tracks the allocator components and sends their JSON values."""
+
+    def __init__(self, ws):
+        super().__init__(ws)
+        self.components = {}  # widget id -> args of its last render
+        self.json_values = {}  # widget id -> committed value
+
+    async def rerun(self, fragment_id=""):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.fragment_id = fragment_id
+        for widget_id, value in self.values.items():
+            state = msg.rerun_script.widget_states.widgets.add()
+            state.id = widget_id
+            state.double_array_value.data.append(value)
+        for widget_id, value in self.json_values.items():
+            state = msg.rerun_script.widget_states.widgets.add()
+            state.id = widget_id
+            state.json_value = json.dumps(value)
+
+        received = 0
+        t0 = time.perf_counter()
+        await self.ws.send(msg.SerializeToString())
+        while True:
+            raw = await self.ws.recv()
+            received += len(raw)
+            fwd = ForwardMsg()
+            fwd.ParseFromString(raw)
+            kind = fwd.WhichOneof("type")
+            element = fwd.delta.new_element if kind == "delta" else None
+            if element is not None and element.WhichOneof("type") == "slider":
+                if not element.slider.disabled:
+                    self.sliders[element.slider.id] = (element.slider.label, fwd.delta.fragment_id)
+                    self.values.setdefault(element.slider.id, element.slider.default[0] if element.slider.default else 0)
+            elif element is not None and element.WhichOneof("type") == "component_instance":
+                self.components[element.component_instance.id] = json.loads(element.component_instance.json_args)
+            elif kind == "script_finished":
+                return time.perf_counter() - t0, received
+
+
+async def fill_in(url, mode, rng):
+    import websockets
+
+    async with websockets.connect(url, subprotocols=["streamlit"], max_size=None) as ws:
+        session = AllocatorSession(ws)
+        await session.rerun()
+        latencies, payload = [], []
+        if mode == "component":
+            for seq, widget_id in enumerate(list(session.components), 1):
+                allocation = random_allocation(rng)
+                session.json_values[widget_id] = {"values": allocation, "seq": seq}
+                elapsed, size = await session.rerun()
+                latencies.append(elapsed)
+                payload.append(size)
+                if session.components[widget_id]["value"] != allocation:
+                    raise RuntimeError(f"committed {allocation}, server rendered {session.components[widget_id]['value']}")
+        else:
+            ids = list(session.sliders)
+            for start in range(0, len(ids), 4):
+                for widget_id, value in zip(ids[start:start + 4], random_allocation(rng)):
+                    if value == session.values[widget_id]:
+                        continue
+                    session.values[widget_id] = value
+                    elapsed, size = await session.rerun(session.sliders[widget_id][1])
+                    latencies.append(elapsed)
+                    payload.append(size)
+    return latencies, payload
+
+
+def run(mode, surveys, seed):
+    port = free_port()
+    server = start_server(os.path.join(ROOT, "app.py"), port, {"CVF_ALLOCATOR": mode})
+    rng = random.Random(seed)
+    latencies, payload, reruns = [], [], []
+    try:
+        wait_for_server(server, port)
+        for _ in range(surveys):
+            lat, size = asyncio.run(fill_in(f"ws://127.0.0.1:{port}/_stcore/stream", mode, rng))
+            latencies += lat
+            payload += size
+            reruns.append(len(lat))
+    finally:
+        server.terminate()
+        server.wait()
+    print(f"{mode:<9} reruns per survey {sum(reruns) / len(reruns):5.1f}   rerun {fmt_ms(latencies)}   "
+          f"{sum(payload) / 1024 / len(reruns):.1f} KiB per survey")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--surveys", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for mode in ("sliders", "component"):
+        run(mode, args.surveys, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Scoring throughput of cvf_analysis.py on synthetic responses.
+
+Builds an (N, elements, 4) allocation array plus random demographic codes in
+memory, then times the overall statistics and each single-column breakdown.
+
+    python benchmarks/bench_analysis.py --rows 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import cvf_analysis
+from bench_store import synthetic_allocations
+from survey_schema import load_survey, survey_path
+
+
+def synthetic_responses(survey, n, seed=0):
+    rng = np.random.default_rng(seed)
+    alloc = synthetic_allocations(n, len(survey.elements), rng)
+    demo = {}
+    for d in survey.demographics:
+        codes = rng.integers(0, len(d.options), size=n).astype(np.int8)
+        codes[rng.random(n) < 0.01] = -1
+        demo[d.column] = (codes, list(d.options))
+    alloc = cvf_analysis.canonical_order(alloc, survey.quadrants)
+    return cvf_analysis.Responses(alloc, demo, [e.name for e in survey.elements], survey.version)
+
+
+def timed(fn, *args, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--survey", default=survey_path("cvf_v2.yaml"))
+    args = parser.parse_args()
+
+    survey = load_survey(args.survey)
+    responses = synthetic_responses(survey, args.rows)
+    print(f"rows={args.rows} survey={survey.version} array={responses.allocations.nbytes / 2**20:.0f} MiB")
+
+    seconds, overall = timed(cvf_analysis.overall_stats, responses)
+    expected = responses.allocations.reshape(args.rows, -1).mean(axis=0)
+    assert np.allclose(overall.means[0].ravel(), expected)
+    print(f"{'overall':<22} {seconds * 1000:8.1f} ms")
+    total = seconds
+    for d in survey.demographics:
+        seconds, _ = timed(cvf_analysis.group_stats, responses, d.column)
+        total += seconds
+        print(f"{'by ' + d.column:<22} {seconds * 1000:8.1f} ms")
+    seconds, _ = timed(cvf_analysis.group_stats, responses, "Division", "Level")
+    total += seconds
+    print(f"{'by Division x Level':<22} {seconds * 1000:8.1f} ms")
+    print(f"{'total':<22} {total * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
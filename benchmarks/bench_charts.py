@@ -0,0 +1,65 @@
+"""
+Chart rendering and cache throughput of charts.py.
+
+Renders every Division x element radar of synthetic responses into an empty
+cache, once in this process and once with a pool of worker processes, then
+asks for the whole batch again (all cache hits) and times single warm and
+cold charts.
+
+    python benchmarks/bench_charts.py --rows 50000 --workers 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import charts
+from bench_analysis import synthetic_responses
+from survey_schema import load_survey, survey_path
+
+
+def ms(seconds):
+    return f"{seconds * 1000:8.1f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    survey = load_survey(survey_path("cvf_v2.yaml"))
+    responses = synthetic_responses(survey, args.rows)
+    tasks = charts.radar_tasks(responses, "Division")
+    print(f"rows={args.rows} radars={len(tasks)} cores={os.cpu_count()}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        version = charts.data_version(responses)
+        print(f"{'data version':<26} {ms(time.perf_counter() - t0)}")
+
+        for workers in sorted({1, args.workers}):
+            service = charts.ChartService(responses, charts.ChartCache(os.path.join(tmp, f"w{workers}")), version)
+            t0 = time.perf_counter()
+            _, drawn = charts.render_batch(service, tasks, workers)
+            print(f"{f'cold batch, {workers} workers':<26} {time.perf_counter() - t0:8.2f} s   ({drawn} drawn)")
+
+        t0 = time.perf_counter()
+        _, drawn = charts.render_batch(service, tasks, args.workers)
+        print(f"{'warm batch':<26} {ms(time.perf_counter() - t0)}   ({drawn} drawn)")
+
+        for kind in charts.KINDS:
+            t0 = time.perf_counter()
+            service.chart(kind, by="Generation")
+            cold = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            service.chart(kind, by="Generation")
+            print(f"{kind + ' by Generation':<26} cold {ms(cold)}   warm {ms(time.perf_counter() - t0)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Dashboard filters from the culture cube (cube.py) against a group-by per filter.
+
+Archives synthetic responses, builds the cube once and then answers random
+filter combinations — each demographic either unfiltered or restricted to one
+or two answers, broken down by one column — both from the cube and by
+filtering the responses and grouping them again (cvf_analysis.group_stats),
+checking that both give the same counts and means.
+
+    python benchmarks/bench_cube.py --rows 1000000 --queries 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_store import synthetic_rows
+from bench_submit import fmt_ms
+from cube import CultureCube
+from cvf_analysis import group_stats, load_responses
+from response_store import write_archive
+from survey_schema import load_survey, survey_path
+
+
+def random_query(responses, rng):
+    """(breakdown column, {column: answers}) with every other demographic unfiltered or one or two answers."""
+    columns = list(responses.demographics)
+    by = columns[rng.integers(len(columns))]
+    where = {}
+    for column in columns:
+        categories = responses.demographics[column][1]
+        if column != by and rng.random() < 0.5:
+            where[column] = list(rng.choice(categories, size=rng.integers(1, 3), replace=False))
+    return by, where
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    survey = load_survey(survey_path("cvf_v2.yaml"))
+    path = os.path.join(tempfile.mkdtemp(prefix="cvf-cube-"), "responses.parquet")
+    write_archive(path, survey, synthetic_rows(survey, args.rows))
+    responses = load_responses(path)
+
+    t0 = time.perf_counter()
+    cube = CultureCube.from_responses(responses)
+    print(f"build      {(time.perf_counter() - t0) * 1000:8.1f} ms for {args.rows:,} responses, "
+          f"{' x '.join(str(n) for n in cube.data.shape[:-1])} cells, {cube.data.nbytes / 2**20:.1f} MB")
+
+    rng = np.random.default_rng(args.seed)
+    from_cube, regrouped = [], []
+    for _ in range(args.queries):
+        by, where = random_query(responses, rng)
+        t0 = time.perf_counter()
+        stats = cube.stats(by, where=where, min_cell=0)
+        from_cube.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        keep = np.ones(len(responses), dtype=bool)
+        for column, answers in where.items():
+            codes, categories = responses.demographics[column]
+            keep &= np.isin(codes, [categories.index(a) for a in answers])
+        expected = group_stats(responses.subset(keep), by)
+        regrouped.append(time.perf_counter() - t0)
+
+        assert np.array_equal(stats.counts, expected.counts)
+        assert np.allclose(stats.means, expected.means, equal_nan=True)
+    print(f"cube       {fmt_ms(from_cube)}")
+    print(f"group-by   {fmt_ms(regrouped)}")
+    print(f"speed-up   {np.median(regrouped) / np.median(from_cube):8.0f}x (median, {args.queries} filter combinations)")
+
+
+if __name__ == "__main__":
+    main()
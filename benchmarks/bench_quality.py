@@ -0,0 +1,115 @@
+"""
+Throughput of the response quality checks (quality.py) on synthetic responses.
+
+Batch: scores arrays of rows/4, rows/2 and rows responses with straight-liners,
+near-duplicates and a kiosk burst mixed in, checks every injected response is
+flagged, and reports the time per response at each size, which should stay
+flat (linear scaling). Incremental: fills a journal, scans it once, then
+scans again after a small batch of new submissions.
+
+    python benchmarks/bench_quality.py --rows 400000 --journal-rows 50000
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import quality
+from aggregates import ResponseAggregates
+from bench_store import synthetic_allocations, synthetic_rows
+from journal import ResponseJournal
+from survey_schema import load_survey, survey_path
+
+
+def synthetic_batch(survey, n, seed=0):
+    """Arrays for quality.score() with 0.5% straight-liners, 0.5% near-duplicates and one burst."""
+    rng = np.random.default_rng(seed)
+    alloc = synthetic_allocations(n, len(survey.elements), rng)
+    times = np.sort(rng.uniform(0, 30 * 86400, n))
+    codes = [(rng.integers(0, len(d.options), size=n), len(d.options)) for d in survey.demographics]
+    cells = quality.cell_codes(codes)
+    k = max(n // 200, 1)
+    straight = rng.choice(n, k, replace=False)
+    alloc[straight] = alloc[straight, :1]
+    # a later copy of an earlier response of the same cell, with one element changed
+    originals = rng.choice(n // 2, k, replace=False)
+    copies = rng.choice(np.arange(n // 2, n - 20), k, replace=False)
+    copies = copies[~np.isin(copies, straight)]
+    originals = originals[:len(copies)]
+    alloc[copies] = alloc[originals]
+    alloc[copies, 0] = (100, 0, 0, 0)
+    cells[copies] = cells[originals]
+    burst = np.arange(n - 10, n - 5)
+    cells[burst] = cells[n - 10]
+    times[burst] = times[n - 11] + np.arange(1, 6)
+    times[n - 5:] = times[n - 5] + 100 + np.arange(5)  # keep the tail sorted
+    return alloc, times, cells, straight, copies, burst
+
+
+def bench_batch(survey, rows):
+    print(f"{'responses':>10} {'score':>10} {'per response':>13}  flagged")
+    for n in (rows // 4, rows // 2, rows):
+        alloc, times, cells, straight, copies, burst = synthetic_batch(survey, n)
+        best = float("inf")
+        for _ in range(3):
+            t0 = time.perf_counter()
+            flags = quality.score(alloc, times, cells)
+            best = min(best, time.perf_counter() - t0)
+        assert (flags[straight] & quality.STRAIGHT_LINE).all()
+        assert (flags[copies] & quality.NEAR_DUPLICATE).all()
+        # the first responses of the burst are not flagged, the ones past the threshold are
+        size = quality.Thresholds.burst_size
+        assert not (flags[burst[:size - 1]] & quality.BURST).any()
+        assert (flags[burst[size - 1:]] & quality.BURST).all()
+        counts = ", ".join(f"{name} {int(np.count_nonzero(flags & bit))}" for name, bit in quality.FLAGS.items())
+        print(f"{n:>10,} {best * 1000:>8.1f} ms {best / n * 1e6:>10.2f} us  {counts}")
+
+
+def bench_journal(survey, rows, increment):
+    path = os.path.join(tempfile.mkdtemp(prefix="cvf-quality-"), "journal.sqlite3")
+    journal = ResponseJournal(path, aggregates=ResponseAggregates(survey))
+    data = [[r[c] for c in survey.columns] for r in synthetic_rows(survey, rows + increment)]
+    for values in data[:rows]:
+        journal.append(values)
+    # spread the submissions over the last 30 days, or every cell is one long burst
+    created = time.time() - 30 * 86400 + np.sort(np.random.default_rng(1).uniform(0, 30 * 86400 - 3600, rows))
+    with journal._conn() as conn:
+        conn.executemany("UPDATE responses SET created_at = ? WHERE id = ?",
+                         [(float(t), i + 1) for i, t in enumerate(created)])
+
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    aggregates = ResponseAggregates(survey)
+    index = quality.QualityIndex(survey, aggregates)
+    t0 = time.perf_counter()
+    scored, excluded = index.scan(conn)
+    print(f"journal scan   {scored:,} responses in {(time.perf_counter() - t0) * 1000:.0f} ms, {excluded} excluded")
+    for values in data[rows:]:
+        journal.append(values)
+    t0 = time.perf_counter()
+    scored, excluded = index.scan(conn)
+    print(f"incremental    {scored:,} new responses in {(time.perf_counter() - t0) * 1000:.0f} ms, {excluded} excluded")
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=400_000)
+    parser.add_argument("--journal-rows", type=int, default=50_000)
+    parser.add_argument("--increment", type=int, default=1_000)
+    parser.add_argument("--survey", default=survey_path("cvf_v2.yaml"))
+    args = parser.parse_args()
+
+    survey = load_survey(args.survey)
+    bench_batch(survey, args.rows)
+    bench_journal(survey, args.journal_rows, args.increment)
+
+
+if __name__ == "__main__":
+    main()
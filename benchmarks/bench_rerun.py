@@ -0,0 +1,158 @@
+"""
+Per-interaction rerun cost of the survey page, measured against a real server.
+
+Starts ``streamlit run`` headless, connects a minimal websocket client that
+speaks Streamlit's protobuf protocol (like the browser does), renders the page
+once and then nudges sliders one at a time. Each nudge is sent the way the
+frontend sends it, including the fragment id when the slider lives inside an
+``st.fragment``, and timed until the server reports the script run finished.
+
+    python benchmarks/bench_rerun.py --app app.py --nudges 200
+    python benchmarks/bench_rerun.py --rev HEAD~1      # same app file at an older commit
+
+Run it for two revisions to get a before/after comparison. Reports rerun
+latency percentiles and the bytes the server pushes to the browser per rerun.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_submit import fmt_ms
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(app_path, port, extra_env=None, stderr=subprocess.DEVNULL):
+    env = dict(os.environ)
+    env.setdefault("CVF_STORAGE_BACKEND", "sqlite")
+    env.setdefault("CVF_DATA_DIR", tempfile.mkdtemp(prefix="cvf-rerun-"))
+    env.update(extra_env or {})
+    cmd = [
+        sys.executable, "-m", "streamlit", "run", app_path,
+        "--server.headless", "true", "--server.port", str(port),
+        "--browser.gatherUsageStats", "false", "--server.fileWatcherType", "none",
+    ]
+    return subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=stderr)
+
+
+def wait_for_server(server, port, timeout=60):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            if time.time() > deadline or server.poll() is not None:
+                raise RuntimeError("streamlit server did not start")
+            time.sleep(0.2)
+
+
+class Session:
+    """Just enough of the Streamlit frontend to drive widget reruns."""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.sliders = {}  # widget id -> (label, fragment id)
+        self.values = {}   # widget id -> current value
+
+    async def rerun(self, fragment_id=""):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.fragment_id = fragment_id
+        for widget_id, value in self.values.items():
+            state = msg.rerun_script.widget_states.widgets.add()
+            state.id = widget_id
+            state.double_array_value.data.append(value)
+
+        received = 0
+        t0 = time.perf_counter()
+        await self.ws.send(msg.SerializeToString())
+        while True:
+            raw = await self.ws.recv()
+            received += len(raw)
+            fwd = ForwardMsg()
+            fwd.ParseFromString(raw)
+            kind = fwd.WhichOneof("type")
+            if kind == "delta" and fwd.delta.new_element.WhichOneof("type") == "slider":
+                slider = fwd.delta.new_element.slider
+                if not slider.disabled:
+                    self.sliders[slider.id] = (slider.label, fwd.delta.fragment_id)
+                    self.values.setdefault(slider.id, slider.default[0] if slider.default else 0)
+            elif kind == "script_finished":
+                return time.perf_counter() - t0, received
+
+
+async def drive(url, nudges):
+    import websockets
+
+    async with websockets.connect(url, subprotocols=["streamlit"], max_size=None) as ws:
+        session = Session(ws)
+        first, first_bytes = await session.rerun()
+
+        latencies, payload, fragment_runs = [], [], 0
+        ids = list(session.sliders)
+        for n in range(nudges):
+            widget_id = ids[n % len(ids)]
+            session.values[widget_id] = (session.values[widget_id] + 5) % 105
+            fragment_id = session.sliders[widget_id][1]
+            fragment_runs += bool(fragment_id)
+            elapsed, size = await session.rerun(fragment_id)
+            latencies.append(elapsed)
+            payload.append(size)
+    return first, first_bytes, latencies, payload, fragment_runs, len(ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="app.py")
+    parser.add_argument("--rev", default=None, help="benchmark the app file as of this git revision")
+    parser.add_argument("--nudges", type=int, default=120)
+    args = parser.parse_args()
+
+    app_path = os.path.join(ROOT, args.app)
+    tmp_app = None
+    if args.rev:
+        # keep it next to the real app so its local imports resolve
+        source = subprocess.check_output(["git", "show", f"{args.rev}:{args.app}"], cwd=ROOT)
+        tmp_app = app_path = os.path.join(ROOT, f".bench_{os.path.basename(args.app)}")
+        with open(tmp_app, "wb") as f:
+            f.write(source)
+
+    port = free_port()
+    # per-nudge reruns only exist with st.slider sections (bench_allocator.py covers the component)
+    server = start_server(app_path, port, {"CVF_ALLOCATOR": "sliders"})
+    try:
+        wait_for_server(server, port)
+        first, first_bytes, latencies, payload, fragment_runs, sliders = asyncio.run(
+            drive(f"ws://127.0.0.1:{port}/_stcore/stream", args.nudges)
+        )
+    finally:
+        server.terminate()
+        server.wait()
+        if tmp_app:
+            os.remove(tmp_app)
+
+    print(f"app={args.app} rev={args.rev or 'working tree'} sliders={sliders} nudges={len(latencies)}")
+    print(f"first render   {first * 1000:.1f} ms, {first_bytes / 1024:.1f} KiB")
+    print(f"slider rerun   {fmt_ms(latencies)}")
+    print(f"payload        {sum(payload) / len(payload) / 1024:.1f} KiB per rerun on average")
+    print(f"fragment-scoped reruns: {fragment_runs}/{len(latencies)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Sheets write latency with and without the client pool's background maintenance.
+
+Runs sheets.SheetsClientPool with real gspread and google-auth against
+fake_sheets.py: a throwaway service-account key whose token_uri is the fake
+server, tokens that expire after --token-ttl seconds and cost --token-latency
+seconds to fetch, and a fraction of appends whose connection is dropped. A
+flusher-like loop appends one batch every --interval seconds, once with
+nobody calling maintain() and once with a thread calling it every second, as
+startup.py does.
+
+google-auth refreshes a token inline (inside the write) once it is within
+3m45s of expiry, so the default TTL of 235 s leaves a 10 s window for the
+background refresh (refresh margin 230 s) to get there first.
+
+    python benchmarks/bench_sheets_pool.py --seconds 30 --drop-rate 0.02
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fake_sheets
+from bench_submit import fmt_ms
+from sheets import SheetsClientPool
+from storage import GoogleSheetsBackend
+
+
+def service_account_info(token_uri):
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                            serialization.NoEncryption()).decode()
+    return {
+        "type": "service_account",
+        "project_id": "cvf-bench",
+        "private_key_id": "bench",
+        "private_key": pem,
+        "client_email": "bench@cvf-bench.iam.gserviceaccount.com",
+        "token_uri": token_uri,
+    }
+
+
+def run(args, info, maintained):
+    server, state, url = fake_sheets.start_in_thread(
+        latency=args.latency, token_ttl=args.token_ttl, token_latency=args.token_latency, drop_rate=args.drop_rate,
+    )
+    info = dict(info, token_uri=f"{url}/token")
+    pool = SheetsClientPool(info, "bench", size=args.pool_size, refresh_margin=args.token_ttl - 5,
+                            probe_after=args.interval * 4, base_url=url)
+    backend = GoogleSheetsBackend(lambda: pool)
+    backend.warm_up()
+    issued_at_start = state.tokens_issued
+
+    stop = threading.Event()
+
+    def maintenance():
+        while not stop.wait(1.0):
+            backend.maintain()
+
+    if maintained:
+        threading.Thread(target=maintenance, daemon=True).start()
+
+    latencies, failures = [], 0
+    deadline = time.perf_counter() + args.seconds
+    n = 0
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        try:
+            backend.append_rows([[n, "bench"]])
+            latencies.append(time.perf_counter() - t0)
+        except Exception:
+            failures += 1
+        n += 1
+        time.sleep(args.interval)
+    stop.set()
+    pool.close()
+    server.shutdown()
+
+    background = pool.stats["token_refreshes"]
+    inline = state.tokens_issued - issued_at_start - background + 1  # warm_up's token is counted in both
+    print(f"{'maintain() every 1 s' if maintained else 'no maintenance':<22} appends={n} failed={failures} "
+          f"{fmt_ms(latencies)}  max={max(latencies) * 1000:8.2f} ms")
+    print(f"{'':<22} tokens: background={background} inline={max(inline, 0)} "
+          f"clients created={pool.stats['created']} discarded={pool.stats['discarded']} "
+          f"probes={pool.stats['probes']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--interval", type=float, default=0.1, help="seconds between appends")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per append")
+    parser.add_argument("--token-ttl", type=float, default=235)
+    parser.add_argument("--token-latency", type=float, default=0.3)
+    parser.add_argument("--drop-rate", type=float, default=0.02)
+    parser.add_argument("--pool-size", type=int, default=2)
+    args = parser.parse_args()
+
+    info = service_account_info(None)
+    print(f"seconds={args.seconds} token ttl={args.token_ttl} s drop rate={args.drop_rate}")
+    for maintained in (False, True):
+        run(args, info, maintained)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Cold-start cost of a survey app: time to first render of a fresh server process.
+
+Each run starts ``streamlit run`` headless in a new process, waits until it
+accepts connections, opens one session and times the first script run until
+the page is complete. With ``--imports`` the server runs with
+PYTHONPROFILEIMPORTTIME and the modules the first session imported (on top of
+Streamlit's own startup) are listed by cumulative import time.
+
+    python benchmarks/bench_startup.py --app app.py --runs 5 --imports 10
+    python benchmarks/bench_startup.py --app app3.py --rev HEAD~1
+"""
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_rerun import Session, free_port, start_server, wait_for_server
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+async def first_render(url):
+    import websockets
+
+    async with websockets.connect(url, subprotocols=["streamlit"], max_size=None) as ws:
+        elapsed, _ = await Session(ws).rerun()
+    return elapsed
+
+
+def session_imports(log_path, offset):
+    """Top-level imports logged after offset: (cumulative seconds, module)."""
+    with open(log_path, encoding="utf-8", errors="replace") as f:
+        f.seek(offset)
+        lines = f.read().splitlines()
+    imports = []
+    for line in lines:
+        match = IMPORT_LINE.match(line)
+        if match and not match.group(3):
+            imports.append((int(match.group(2)) / 1e6, match.group(4)))
+    return sorted(imports, reverse=True)
+
+
+def run_once(app_path, profile_imports):
+    port = free_port()
+    log = tempfile.NamedTemporaryFile(prefix="cvf-startup-", suffix=".log", delete=False)
+    extra_env = {"PYTHONPROFILEIMPORTTIME": "1"} if profile_imports else {}
+    t0 = time.perf_counter()
+    server = start_server(app_path, port, extra_env, stderr=log)
+    try:
+        wait_for_server(server, port)
+        listening = time.perf_counter() - t0
+        offset = os.path.getsize(log.name)
+        script = asyncio.run(first_render(f"ws://127.0.0.1:{port}/_stcore/stream"))
+        total = time.perf_counter() - t0
+    finally:
+        server.terminate()
+        server.wait()
+        log.close()
+    imports = session_imports(log.name, offset) if profile_imports else []
+    os.remove(log.name)
+    return listening, script, total, imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="app.py")
+    parser.add_argument("--rev", default=None, help="benchmark the app file as of this git revision")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--imports", type=int, default=0, metavar="N",
+                        help="list the N slowest imports of the first session (profiled in an extra run)")
+    args = parser.parse_args()
+
+    app_path = os.path.join(ROOT, args.app)
+    tmp_app = None
+    if args.rev:
+        # keep it next to the real app so its local imports resolve
+        source = subprocess.check_output(["git", "show", f"{args.rev}:{args.app}"], cwd=ROOT)
+        tmp_app = app_path = os.path.join(ROOT, f".bench_{os.path.basename(args.app)}")
+        with open(tmp_app, "wb") as f:
+            f.write(source)
+
+    try:
+        runs = [run_once(app_path, False) for _ in range(args.runs)]
+        profiled = run_once(app_path, True) if args.imports else None
+    finally:
+        if tmp_app:
+            os.remove(tmp_app)
+
+    print(f"app={args.app} rev={args.rev or 'working tree'} runs={len(runs)} (median, min)")
+    for name, values in (("server listening", [r[0] for r in runs]),
+                         ("first script run", [r[1] for r in runs]),
+                         ("time to first render", [r[2] for r in runs])):
+        print(f"{name:<22} {statistics.median(values) * 1000:8.1f} ms  {min(values) * 1000:8.1f} ms")
+    if profiled:
+        print("\nslowest imports of the first session (cumulative, profiled run):")
+        for seconds, module in profiled[3][:args.imports]:
+            print(f"  {seconds * 1000:8.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Bootstrap and permutation throughput of cvf_stats.py.
+
+Times bootstrap confidence intervals per Division and one permutation test on
+synthetic responses, once with a single process and once with the process
+pool, and checks both give the same numbers for the same seed.
+
+    python benchmarks/bench_stats.py --rows 50000 --resamples 10000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import cvf_stats
+from bench_analysis import synthetic_responses
+from survey_schema import load_survey, survey_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--resamples", type=int, default=10_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    survey = load_survey(survey_path("cvf_v2.yaml"))
+    responses = synthetic_responses(survey, args.rows)
+    codes, labels = responses.codes("Division")
+    values = cvf_stats.quadrant_values(responses)
+    print(f"rows={args.rows} resamples={args.resamples} groups={len(labels)} cores={os.cpu_count()}")
+
+    results = {}
+    for workers in sorted({1, args.workers}):
+        t0 = time.perf_counter()
+        boot = cvf_stats.bootstrap_ci(values, codes, labels, args.resamples, seed=7, workers=workers)
+        boot_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        perm = cvf_stats.permutation_test(values, codes, labels, labels[0], labels[1], args.resamples,
+                                          seed=7, workers=workers)
+        perm_s = time.perf_counter() - t0
+        results[workers] = (boot, perm)
+        print(f"workers={workers:<3} bootstrap {boot_s:6.2f} s   permutation test {perm_s:6.2f} s")
+
+    (b1, p1), (bn, pn) = results[1], results[args.workers]
+    assert np.array_equal(b1.low, bn.low, equal_nan=True) and np.array_equal(p1.p_value, pn.p_value)
+    print("same results for every worker count")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Storage size and load time: Parquet archive vs. the sheet's text export.
+
+Generates synthetic responses for a survey definition, writes them once as the
+CSV you get from Google Sheets (every value stored as text) and once as a
+response_store.py archive, then times loading each back into an
+(N, elements, 4) array.
+
+    python benchmarks/bench_store.py --rows 100000
+"""
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import response_store
+from survey_schema import load_survey, survey_path
+
+
+def synthetic_allocations(n, n_elements, rng):
+    """(n, n_elements, 4) points in steps of 5, each element adding up to 100."""
+    cuts = np.sort(rng.integers(0, 21, size=(n, n_elements, 3)), axis=-1)
+    parts = np.diff(cuts, axis=-1, prepend=0, append=20)
+    return (parts * 5).astype(np.uint8)
+
+
+def synthetic_rows(survey, n, seed=0):
+    rng = np.random.default_rng(seed)
+    alloc = synthetic_allocations(n, len(survey.elements), rng).reshape(n, -1)
+    start = datetime(2025, 10, 1, 8, tzinfo=timezone.utc)
+    offsets = np.sort(rng.integers(0, 14 * 24 * 3600, size=n))
+    picks = {d.column: rng.integers(0, len(d.options), size=n) for d in survey.demographics}
+    rows = []
+    for i in range(n):
+        row = {"Timestamp": (start + timedelta(seconds=int(offsets[i]))).isoformat()}
+        for d in survey.demographics:
+            row[d.column] = d.options[picks[d.column][i]]
+        row.update(zip(survey.slider_keys, alloc[i].tolist()))
+        rows.append(row)
+    return rows
+
+
+def load_csv(path, survey):
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    values = np.array([[int(r[k]) for k in survey.slider_keys] for r in rows], dtype=np.uint8)
+    return values.reshape(len(rows), len(survey.elements), 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--survey", default=survey_path("cvf_v2.yaml"))
+    args = parser.parse_args()
+
+    survey = load_survey(args.survey)
+    rows = synthetic_rows(survey, args.rows)
+    workdir = tempfile.mkdtemp(prefix="cvf-store-")
+    csv_path = os.path.join(workdir, "sheet.csv")
+    pq_path = os.path.join(workdir, "responses.parquet")
+
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(survey.columns))
+        writer.writeheader()
+        writer.writerows(rows)
+    t0 = time.perf_counter()
+    response_store.write_archive(pq_path, survey, rows)
+    write_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    from_csv = load_csv(csv_path, survey)
+    csv_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    from_pq, _, _ = response_store.load_allocations(pq_path)
+    pq_s = time.perf_counter() - t0
+    assert np.array_equal(from_csv, from_pq)
+
+    csv_kib = os.path.getsize(csv_path) / 1024
+    pq_kib = os.path.getsize(pq_path) / 1024
+    print(f"rows={args.rows} survey={survey.version}")
+    print(f"sheet CSV   {csv_kib:10,.0f} KiB   load {csv_s * 1000:8.1f} ms")
+    print(f"parquet     {pq_kib:10,.0f} KiB   load {pq_s * 1000:8.1f} ms   (write {write_s * 1000:.0f} ms)")
+    print(f"ratio       {csv_kib / pq_kib:10.1f}x smaller      {csv_s / pq_s:8.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
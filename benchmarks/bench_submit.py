@@ -0,0 +1,148 @@
+"""
+End-to-end submission throughput and tail latency against a local backend.
+
+Runs the real submit path (ResponseJournal + SubmissionQueue + storage backend)
+with many concurrent submitters, no Google account needed:
+
+    python benchmarks/bench_submit.py --backend http --latency 0.2 --quota-per-minute 60
+    python benchmarks/bench_submit.py --backend sqlite --sessions 200 --rows 20
+    python benchmarks/bench_submit.py --quota-per-minute 60 --writes-per-minute 60 --batch-size 5
+
+Reports how long submit took for the participant (journal commit) and how long
+until the row reached the backend, as p50/p95/p99, plus rows per second.
+With --writes-per-minute the queue is paced by a ratelimit.RateLimiter at that
+rate, as it is against Google Sheets; without it, a quota only shows up as 429s.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_sheets
+from journal import ResponseJournal
+from ratelimit import RateLimiter
+from storage import HttpSheetsBackend, ParquetBackend, SQLiteBackend
+from submission_queue import SubmissionQueue
+from survey_schema import load_survey, survey_path
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def fmt_ms(values):
+    return "  ".join(f"p{p}={percentile(values, p) * 1000:8.2f} ms" for p in (50, 95, 99))
+
+
+class Recorder:
+    """Wraps a backend and notes when each row (identified by its unique timestamp) was stored."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.stored_at = {}
+        self.calls = 0
+        self.errors = 0
+
+    def append_rows(self, rows):
+        self.calls += 1
+        try:
+            self.backend.append_rows(rows)
+        except Exception:
+            self.errors += 1
+            raise
+        now = time.perf_counter()
+        for r in rows:
+            self.stored_at[r[0]] = now
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["http", "sqlite", "parquet"], default="http")
+    parser.add_argument("--sessions", type=int, default=100, help="concurrent submitting threads")
+    parser.add_argument("--rows", type=int, default=10, help="submissions per session")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--flush-interval", type=float, default=1.0)
+    parser.add_argument("--latency", type=float, default=0.1, help="fake Sheets latency (http backend)")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--quota-per-minute", type=int, default=None)
+    parser.add_argument("--writes-per-minute", type=int, default=None, help="pace appends with a rate limiter")
+    parser.add_argument("--timeout", type=float, default=300.0, help="max seconds to wait for the drain")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="cvf-bench-")
+    if args.backend == "http":
+        server, state, url = fake_sheets.start_in_thread(
+            latency=args.latency, jitter=args.jitter,
+            error_rate=args.error_rate, quota_per_minute=args.quota_per_minute,
+        )
+        backend = HttpSheetsBackend(url)
+    elif args.backend == "sqlite":
+        backend = SQLiteBackend(os.path.join(workdir, "store.sqlite3"))
+    else:
+        backend = ParquetBackend(os.path.join(workdir, "parquet"), load_survey(survey_path("cvf_v2.yaml")))
+
+    recorder = Recorder(backend)
+    queue = SubmissionQueue(
+        recorder, ResponseJournal(os.path.join(workdir, "journal.sqlite3")),
+        batch_size=args.batch_size, flush_interval=args.flush_interval, base_backoff=0.2, max_backoff=10,
+        rate_limiter=RateLimiter(args.writes_per_minute) if args.writes_per_minute else None,
+    )
+
+    submitted_at = {}
+    ack_latency = []
+    lock = threading.Lock()
+
+    base = datetime.now(timezone.utc)
+
+    def session(sid):
+        for n in range(args.rows):
+            row_id = (base + timedelta(microseconds=sid * args.rows + n)).isoformat()
+            row = [row_id, "Sales Division", "Manager", "Γυναίκα", "Gen X", "3–5 έτη"] + [25] * 24
+            t0 = time.perf_counter()
+            queue.put(row)
+            t1 = time.perf_counter()
+            with lock:
+                submitted_at[row_id] = t0
+                ack_latency.append(t1 - t0)
+
+    total = args.sessions * args.rows
+    start = time.perf_counter()
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(args.sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    accepted = time.perf_counter()
+
+    deadline = accepted + args.timeout
+    while len(recorder.stored_at) < total and time.perf_counter() < deadline:
+        time.sleep(0.05)
+    done = time.perf_counter()
+    metrics = queue.metrics()
+    queue.close()
+
+    stored = [recorder.stored_at[k] - submitted_at[k] for k in recorder.stored_at]
+    print(f"backend={args.backend} sessions={args.sessions} rows={total} batch={args.batch_size}")
+    print(f"accepted {total} rows in {accepted - start:.3f} s ({total / (accepted - start):,.0f} rows/s)")
+    print(f"submit (ack)   {fmt_ms(ack_latency)}")
+    print(f"stored         {fmt_ms(stored)}")
+    print(f"stored {len(recorder.stored_at)}/{total} rows in {done - start:.3f} s "
+          f"({len(recorder.stored_at) / (done - start):,.1f} rows/s) "
+          f"using {recorder.calls} append calls, {recorder.errors} failed")
+    limiter = metrics["rate_limiter"]
+    print(f"retries={metrics['retries']} quota errors={metrics['quota_errors']} pending={metrics['pending']}"
+          + (f" limiter: waited {limiter['wait_seconds']:.1f} s, throttled {limiter['throttled']}x, "
+             f"rate now {limiter['per_minute']:.0f}/min" if limiter else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Comparing two survey waves: the wave index (waves.py) against rescanning both archives.
+
+Writes a cvf-v1 archive (the earlier wave, app3.py) and a cvf-v2 archive (the
+later one, app.py) of synthetic responses, folds both into a wave index and
+then compares the waves for every single-answer slice of every demographic,
+broken down by Division. Rescan is what each comparison would cost without
+the index: read both archives and align them on the canonical layout again.
+Checks that the index gives the same profiles as a direct scan.
+
+    python benchmarks/bench_waves.py --rows 200000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_store import synthetic_rows
+from bench_submit import fmt_ms
+from cvf_analysis import group_stats, load_responses
+from response_store import write_archive
+from survey_schema import load_survey, survey_path
+from waves import WaveIndex, load_layout
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000, help="responses per wave")
+    args = parser.parse_args()
+
+    old, new = load_survey(survey_path("cvf_v1.yaml")), load_survey(survey_path("cvf_v2.yaml"))
+    workdir = tempfile.mkdtemp(prefix="cvf-waves-")
+    archives = {}
+    for wave, survey in (("2024", old), ("2025", new)):
+        archives[wave] = os.path.join(workdir, f"{wave}.parquet")
+        write_archive(archives[wave], survey, synthetic_rows(survey, args.rows, seed=int(wave)))
+
+    index = WaveIndex(os.path.join(workdir, "waves.sqlite3"), load_layout(new))
+    t0 = time.perf_counter()
+    for wave, path in archives.items():
+        index.add_archive(path, wave)
+    rescan = (time.perf_counter() - t0) / 2
+    print(f"rescan / build    {rescan * 1000:8.1f} ms per wave of {args.rows:,} responses")
+
+    t0 = time.perf_counter()
+    for wave in archives:
+        index.snapshot(wave)
+    print(f"load snapshots    {(time.perf_counter() - t0) * 1000:8.1f} ms for both waves, once")
+
+    slices = [{d.column: answer} for d in index.layout.demographics for answer in d.options]
+    latencies = []
+    for where in slices:
+        t0 = time.perf_counter()
+        index.compare("2024", "2025", "Division", where=where)
+        latencies.append(time.perf_counter() - t0)
+    print(f"compare           {fmt_ms(latencies)}   ({len(slices)} slices by Division)")
+    print(f"speed-up          {rescan * 2 / np.median(latencies):8.0f}x over rescanning both archives")
+
+    # the index must agree with a scan of the cvf-v2 archive, whose quadrants are already canonical
+    scanned = group_stats(load_responses(archives["2025"]), "Division")
+    indexed = index.snapshot("2025").group_stats("Division")
+    assert np.array_equal(scanned.counts, indexed.counts)
+    assert np.allclose(scanned.profile, indexed.profile, equal_nan=True)
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
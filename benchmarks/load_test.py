@@ -0,0 +1,171 @@
+"""
+Load test: N concurrent virtual participants filling in the survey.
+
+Each virtual participant is a Streamlit AppTest session running the real app
+script. It picks the five demographics, moves all 24 sliders (one rerun per
+widget change, like a browser would) to a valid 100-point allocation and
+submits against a local stub backend (fake_sheets.py), so no Google account
+is needed:
+
+    python benchmarks/load_test.py --app app.py --participants 200 --concurrency 50
+
+Reports p50/p95/p99 rerun latency, submissions per second and the memory each
+live session adds to the server process.
+
+AppTest drives a process-global Streamlit runtime, so script runs from the
+virtual participants are serialised through a lock. That matches a single
+server process, where CPU-bound reruns contend for the GIL anyway: "rerun
+latency" is what a participant waits (queueing + script run), "service time"
+is the script run alone.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fake_sheets
+from bench_submit import fmt_ms
+
+
+def random_allocation(rng):
+    """Four multiples of 5 that add up to 100."""
+    cuts = sorted(rng.randint(0, 20) for _ in range(3))
+    parts = [cuts[0], cuts[1] - cuts[0], cuts[2] - cuts[1], 20 - cuts[2]]
+    return [p * 5 for p in parts]
+
+
+def survey_keys(at):
+    """Slider keys of the active (non-example) sliders, grouped per element in render order."""
+    keys = [s.key for s in at.slider if not s.disabled]
+    return [keys[i:i + 4] for i in range(0, len(keys), 4)]
+
+
+_RUN_LOCK = threading.Lock()
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reruns = []
+        self.service = []
+        self.submitted = 0
+        self.failed = 0
+
+    def timed_run(self, at, timeout):
+        t0 = time.perf_counter()
+        with _RUN_LOCK:
+            t1 = time.perf_counter()
+            at.run(timeout=timeout)
+        t2 = time.perf_counter()
+        with self.lock:
+            self.reruns.append(t2 - t0)
+            self.service.append(t2 - t1)
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+
+
+def participant(app_path, seed, stats, timeout, think_time):
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    at = AppTest.from_file(app_path, default_timeout=timeout)
+    try:
+        stats.timed_run(at, timeout)
+        for key in [box.key for box in at.selectbox]:
+            box = at.selectbox(key=key)
+            box.set_value(rng.choice(box.options))
+            stats.timed_run(at, timeout)
+            time.sleep(think_time)
+        for keys in survey_keys(at):
+            for key, value in zip(keys, random_allocation(rng)):
+                at.slider(key=key).set_value(value)
+                stats.timed_run(at, timeout)
+                time.sleep(think_time)
+        submit = at.button[0]
+        if submit.disabled:
+            raise RuntimeError("submit button still disabled after a complete, valid survey")
+        submit.click()
+        stats.timed_run(at, timeout)
+        with stats.lock:
+            stats.submitted += 1
+    except Exception as e:
+        with stats.lock:
+            stats.failed += 1
+        print(f"participant {seed} failed: {e}", file=sys.stderr)
+    return at
+
+
+def measure_session_memory(app_path, sessions, timeout):
+    """Average traced allocation growth per rendered, still-alive session."""
+    from streamlit.testing.v1 import AppTest
+
+    warm = AppTest.from_file(app_path, default_timeout=timeout)
+    warm.run()  # imports, caches and the submission queue are shared, keep them out of the figure
+    tracemalloc.start()
+    base = tracemalloc.take_snapshot()
+    alive = []
+    for _ in range(sessions):
+        at = AppTest.from_file(app_path, default_timeout=timeout)
+        at.run()
+        alive.append(at)
+    grown = sum(s.size_diff for s in tracemalloc.take_snapshot().compare_to(base, "filename"))
+    tracemalloc.stop()
+    return grown / sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="app.py")
+    parser.add_argument("--participants", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=25)
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds between widget changes")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub backend latency per append")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-rerun timeout")
+    parser.add_argument("--memory-sessions", type=int, default=20, help="sessions used for the memory estimate")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Point the app at a throwaway journal and the stub backend before its first run
+    _, state, url = fake_sheets.start_in_thread(latency=args.latency)
+    os.environ["CVF_STORAGE_BACKEND"] = "http"
+    os.environ["CVF_SHEETS_URL"] = url
+    os.environ["CVF_DATA_DIR"] = tempfile.mkdtemp(prefix="cvf-load-")
+    os.environ.setdefault("CVF_FLUSH_INTERVAL", "0.5")
+    # AppTest cannot drive custom components; participants move st.slider sections
+    os.environ.setdefault("CVF_ALLOCATOR", "sliders")
+    os.chdir(ROOT)
+    app_path = os.path.join(ROOT, args.app)
+
+    stats = Stats()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for n in range(args.participants):
+            pool.submit(participant, app_path, args.seed + n, stats, args.timeout, args.think_time)
+    elapsed = time.perf_counter() - start
+
+    deadline = time.time() + 30
+    while len(state.rows) < stats.submitted and time.time() < deadline:
+        time.sleep(0.1)
+
+    per_session = measure_session_memory(app_path, args.memory_sessions, args.timeout)
+
+    print(f"app={args.app} participants={args.participants} concurrency={args.concurrency}")
+    print(f"reruns         {len(stats.reruns)} total, {len(stats.reruns) / elapsed:,.1f}/s")
+    print(f"rerun latency  {fmt_ms(stats.reruns)}")
+    print(f"service time   {fmt_ms(stats.service)}")
+    print(f"submissions    {stats.submitted} ok, {stats.failed} failed, "
+          f"{stats.submitted / elapsed:,.2f}/s over {elapsed:.1f} s")
+    print(f"stored         {len(state.rows)} rows in the stub backend")
+    print(f"memory         ~{per_session / 1024:,.0f} KiB per live session")
+
+
+if __name__ == "__main__":
+    main()
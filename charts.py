@@ -0,0 +1,430 @@
+"""
+Radar, box and violin charts of CVF profiles, with a content-addressed disk cache.
+
+A chart is identified by its kind, the demographic filter it is drawn for
+(e.g. Division = Sales Division), an optional breakdown and element, the
+output format and the version of the data. The SHA-256 of those is the file
+name in the cache, so a dashboard view or report build asking for the same
+chart over the same data reads the file instead of plotting again, and new
+responses (a new data version) never serve a stale image. The cache is
+bounded in bytes and evicts the least recently used files.
+
+    radar    mean points per quadrant, one series per group, with all
+             responses as reference when a filter is set
+    box      distribution of respondent quadrant scores per group
+    violin   the same as a density
+
+Cold batches (every Division x element radar) are rendered in worker processes.
+
+    python charts.py responses.parquet radar --filter Division="Sales Division" --by Level -o sales.png
+    python charts.py responses.parquet violin --by Generation -o generations.svg
+    python charts.py responses.parquet batch --by Division --workers 4
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import numpy as np
+
+from cvf_analysis import Responses, group_stats, load_responses, respondent_profiles
+from survey_schema import QUADRANTS
+
+
+KINDS = ("radar", "box", "violin")
+FORMATS = ("png", "svg")
+# bump when the drawing code changes, so cached images of the old style are not reused
+STYLE_VERSION = 1
+DEFAULT_MAX_BYTES = int(float(os.getenv("CVF_CHART_CACHE_MB", "256")) * 2**20)
+# eviction goes below the budget, so a full cache does not evict on every write
+EVICT_TO = 0.8
+
+
+# ——————————————————
+# Cache
+# ——————————————————
+def chart_key(kind, data_version, fmt, params):
+    """Content address of a chart: SHA-256 of everything that determines its pixels."""
+    spec = {"kind": kind, "data": data_version, "format": fmt, "params": params, "style": STYLE_VERSION}
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class ChartCache:
+    """Chart files named by key, with least-recently-used eviction once over max_bytes."""
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None  # bytes on disk, scanned on the first write
+
+    def path(self, key, fmt):
+        return os.path.join(self.directory, key[:2], f"{key}.{fmt}")
+
+    def get(self, key, fmt):
+        path = self.path(key, fmt)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # mtime records the last use: atime is often not updated (noatime/relatime)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def put(self, key, fmt, data):
+        path = self.path(key, fmt)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write next to the target and rename, so a concurrent reader never sees half a file
+        partial = f"{path}.{os.getpid()}-{threading.get_ident()}.partial"
+        with open(partial, "wb") as f:
+            f.write(data)
+        os.replace(partial, path)
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        else:
+            self._size += len(data)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def fetch(self, key, fmt, render):
+        """Cached bytes of a chart, calling render() and storing the result on a miss."""
+        data = self.get(key, fmt)
+        if data is None:
+            data = render()
+            self.put(key, fmt, data)
+        return data
+
+    def _entries(self):
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".partial"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:  # evicted by another process meanwhile
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        """Remove the least recently used charts until the cache is below its budget. Returns the number removed."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes * EVICT_TO:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size = total
+        return removed
+
+
+# ——————————————————
+# Drawing (matplotlib Figure objects, no pyplot state, safe in threads)
+# ——————————————————
+def _figure(size):
+    from matplotlib.figure import Figure
+
+    return Figure(figsize=size, dpi=100)
+
+
+def figure_bytes(fig, fmt="png"):
+    buf = BytesIO()
+    # no creation date in SVG metadata, so the same chart gives the same bytes
+    metadata = {"Date": None} if fmt == "svg" else None
+    fig.savefig(buf, format=fmt, bbox_inches="tight", metadata=metadata)
+    return buf.getvalue()
+
+
+def radar_figure(title, series):
+    """CVF radar; series is a list of (label, (clan, adhocracy, market, hierarchy))."""
+    fig = _figure((5, 5))
+    draw_radar(fig.add_subplot(projection="polar"), title, series)
+    return fig
+
+
+def draw_radar(ax, title, series, legend=True, fontsize=8):
+    """Draw a CVF radar on a polar Axes (used for single charts and report pages)."""
+    angles = np.linspace(0, 2 * np.pi, len(QUADRANTS), endpoint=False)
+    closed = np.append(angles, angles[0])
+    for label, values in series:
+        values = np.append(values, values[0])
+        ax.plot(closed, values, linewidth=2, label=label)
+        ax.fill(closed, values, alpha=0.12)
+    ax.set_xticks(angles, QUADRANTS, fontsize=fontsize + 2)
+    ax.set_ylim(0, max([50] + [max(v) + 5 for _, v in series]))
+    ax.tick_params(axis="y", labelsize=fontsize + 2)
+    ax.set_title(title, pad=18, fontsize=fontsize + 4)
+    if series and legend:
+        ax.legend(loc="upper center", bbox_to_anchor=(0.5, -0.08), fontsize=fontsize)
+
+
+def _positions(n_groups):
+    # groups side by side within each quadrant slot
+    width = 0.8 / max(n_groups, 1)
+    offsets = (np.arange(n_groups) - (n_groups - 1) / 2) * width
+    return width, [np.arange(len(QUADRANTS)) + offset for offset in offsets]
+
+
+def _finish_distribution(fig, ax, title, groups):
+    from matplotlib.patches import Patch
+
+    ax.set_xticks(np.arange(len(QUADRANTS)), QUADRANTS)
+    ax.set_ylabel("Points")
+    ax.set_title(title)
+    ax.grid(axis="y", alpha=0.3)
+    if len(groups) > 1:
+        handles = [Patch(color=f"C{g}", alpha=0.6, label=label) for g, (label, _) in enumerate(groups)]
+        ax.legend(handles=handles, fontsize=8, loc="upper left", bbox_to_anchor=(1.01, 1))
+    return fig
+
+
+def _box_stats(values):
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    return {
+        "med": median, "q1": q1, "q3": q3, "mean": values.mean(dtype=np.float64),
+        "whislo": values[values >= q1 - 1.5 * iqr].min(), "whishi": values[values <= q3 + 1.5 * iqr].max(),
+        "fliers": [],
+    }
+
+
+def box_figure(title, groups):
+    """Box plot per quadrant; groups is a list of (label, (N, 4) values). Outliers are not drawn."""
+    fig = _figure((8, 4.5))
+    ax = fig.add_subplot()
+    width, positions = _positions(len(groups))
+    for g, (label, values) in enumerate(groups):
+        # statistics computed here, so matplotlib never holds per-respondent arrays
+        stats = [_box_stats(values[:, k]) for k in range(len(QUADRANTS))]
+        artists = ax.bxp(stats, positions=positions[g], widths=width * 0.9, patch_artist=True,
+                         showfliers=False, showmeans=True, manage_ticks=False,
+                         medianprops={"color": "black"},
+                         meanprops={"marker": "D", "markersize": 4, "markerfacecolor": "white", "markeredgecolor": "black"})
+        for box in artists["boxes"]:
+            box.set(facecolor=f"C{g}", alpha=0.6)
+    return _finish_distribution(fig, ax, title, groups)
+
+
+def _violin_stats(values, points=100, bins=256):
+    # Gaussian KDE evaluated from a histogram: linear in N instead of N x points
+    low, high = float(values.min()), float(values.max())
+    if high - low < 1:
+        low, high = low - 1, high + 1
+    counts, edges = np.histogram(values, bins=bins, range=(low, high))
+    centres = (edges[:-1] + edges[1:]) / 2
+    bandwidth = max(1.06 * values.std() * len(values) ** -0.2, (high - low) / bins)
+    coords = np.linspace(low, high, points)
+    density = np.exp(-0.5 * ((coords[:, None] - centres[None, :]) / bandwidth) ** 2) @ counts
+    density /= density.sum() * (coords[1] - coords[0])
+    return {
+        "coords": coords, "vals": density, "mean": values.mean(dtype=np.float64),
+        "median": np.median(values), "min": low, "max": high,
+    }
+
+
+def violin_figure(title, groups):
+    """Violin plot per quadrant; groups is a list of (label, (N, 4) values)."""
+    fig = _figure((8, 4.5))
+    ax = fig.add_subplot()
+    width, positions = _positions(len(groups))
+    for g, (label, values) in enumerate(groups):
+        stats = [_violin_stats(values[:, k]) for k in range(len(QUADRANTS))]
+        artists = ax.violin(stats, positions=positions[g], widths=width * 0.9, showmedians=True, showextrema=False)
+        for body in artists["bodies"]:
+            body.set(facecolor=f"C{g}", edgecolor=f"C{g}", alpha=0.6)
+        artists["cmedians"].set(color="black")
+    return _finish_distribution(fig, ax, title, groups)
+
+
+# ——————————————————
+# Charts of a response set
+# ——————————————————
+def data_version(responses):
+    """Digest of the responses' contents, part of every chart key."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps([responses.version, responses.elements], ensure_ascii=False).encode("utf-8"))
+    digest.update(np.ascontiguousarray(responses.allocations).data)
+    for column in sorted(responses.demographics):
+        codes, categories = responses.demographics[column]
+        digest.update(json.dumps([column, categories], ensure_ascii=False).encode("utf-8"))
+        digest.update(np.ascontiguousarray(codes).data)
+    return digest.hexdigest()
+
+
+def describe(filters):
+    return " · ".join(f"{col}: {', '.join(values)}" for col, values in filters.items()) or "All responses"
+
+
+def _normalize_filters(filters):
+    # {column: value or [values]} -> {column: sorted [values]}, so equal filters give equal keys
+    normalized = {}
+    for column, values in sorted((filters or {}).items()):
+        normalized[column] = sorted([values] if isinstance(values, str) else values)
+    return normalized
+
+
+class ChartService:
+    """Cached charts of one response set."""
+
+    def __init__(self, responses, cache, version=None):
+        self.responses = responses
+        self.cache = cache
+        self.version = version or data_version(responses)
+        self._overall = None
+
+    def key(self, kind, filters=None, by=None, element=None, fmt="png"):
+        params = {"filters": _normalize_filters(filters), "by": by, "element": element}
+        return chart_key(kind, self.version, fmt, params)
+
+    def chart(self, kind, filters=None, by=None, element=None, fmt="png"):
+        """PNG or SVG bytes of a chart, from the cache when it was drawn before over the same data."""
+        if kind not in KINDS:
+            raise ValueError(f"chart kind must be one of {', '.join(KINDS)}")
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        key = self.key(kind, filters, by, element, fmt)
+        return self.cache.fetch(key, fmt, lambda: figure_bytes(self.figure(kind, filters, by, element), fmt))
+
+    def subset(self, filters):
+        """Responses matching {column: [values]}."""
+        mask = np.ones(len(self.responses), dtype=bool)
+        for column, values in _normalize_filters(filters).items():
+            if column not in self.responses.demographics:
+                raise ValueError(f"unknown demographic column: {column}")
+            codes, categories = self.responses.demographics[column]
+            mask &= np.isin(codes, [categories.index(v) for v in values if v in categories])
+        r = self.responses
+        demographics = {col: (codes[mask], categories) for col, (codes, categories) in r.demographics.items()}
+        return Responses(r.allocations[mask], demographics, r.elements, r.version)
+
+    def figure(self, kind, filters=None, by=None, element=None):
+        filters = _normalize_filters(filters)
+        title = describe(filters) if element is None else f"{element}\n{describe(filters)}"
+        subset = self.subset(filters)
+        e = None if element is None else self.responses.elements.index(element)
+        if kind == "radar":
+            return radar_figure(title, self._radar_series(subset, filters, by, e))
+        values = respondent_profiles(subset.allocations) if e is None else subset.allocations[:, e].astype(np.float32)
+        if by is None:
+            groups = [(describe(filters), values)] if len(values) else []
+        else:
+            codes, labels = subset.codes(by)
+            groups = [(label, values[codes == g]) for g, label in enumerate(labels) if (codes == g).any()]
+        draw = box_figure if kind == "box" else violin_figure
+        return draw(title, groups)
+
+    def _radar_series(self, subset, filters, by, e):
+        def values(stats, g):
+            return stats.profile[g] if e is None else stats.means[g, e]
+
+        series = []
+        if filters:
+            if self._overall is None:
+                self._overall = group_stats(self.responses)
+            series.append(("All responses", values(self._overall, 0)))
+        stats = group_stats(subset, *([by] if by else []))
+        for g, label in enumerate(stats.labels):
+            if stats.counts[g]:
+                series.append((describe(filters) if by is None else label, values(stats, g)))
+        return series
+
+
+# ——————————————————
+# Parallel cold batches
+# ——————————————————
+_SERVICE = None
+
+
+def _init_worker(responses, directory, max_bytes, version):
+    global _SERVICE
+    _SERVICE = ChartService(responses, ChartCache(directory, max_bytes), version)
+
+
+def _render_task(task):
+    _SERVICE.chart(**task)
+
+
+def render_batch(service, tasks, workers=None):
+    """Make sure every chart in tasks (chart() keyword dicts) is cached; misses are drawn by worker processes.
+
+    Returns {index in tasks: cache path} and the number of charts that were drawn.
+    """
+    paths = [service.cache.path(service.key(**task), task.get("fmt", "png")) for task in tasks]
+    missing = [task for task, path in zip(tasks, paths) if not os.path.exists(path)]
+    workers = min(workers or os.cpu_count(), len(missing))
+    if workers <= 1:
+        for task in missing:
+            service.chart(**task)
+    else:
+        cache = service.cache
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(service.responses, cache.directory, cache.max_bytes, service.version)) as pool:
+            list(pool.map(_render_task, missing, chunksize=max(1, len(missing) // (4 * workers))))
+    return dict(enumerate(paths)), len(missing)
+
+
+def radar_tasks(responses, by="Division", fmt="png"):
+    """A radar per group of a demographic column (that has responses) x element."""
+    codes, labels = responses.codes(by)
+    present = [label for g, label in enumerate(labels) if (codes == g).any()]
+    return [
+        {"kind": "radar", "filters": {by: label}, "element": element, "fmt": fmt}
+        for label in present for element in responses.elements
+    ]
+
+
+def main():
+    import time
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("archive", help="Parquet archive written by response_store.py")
+    parser.add_argument("kind", choices=KINDS + ("batch",), help="chart to draw, or batch: every --by group x element radar")
+    parser.add_argument("--filter", action="append", default=[], metavar="COLUMN=VALUE",
+                        help="restrict to respondents with this answer (repeat for several)")
+    parser.add_argument("--by", help="demographic column: one series/box per group")
+    parser.add_argument("--element", help="one element instead of the profile over all elements")
+    parser.add_argument("--format", choices=FORMATS, default="png")
+    parser.add_argument("-o", "--output", help="write the chart to this file")
+    parser.add_argument("--cache-dir", default=os.path.join(os.getenv("CVF_DATA_DIR", ".cvf_data"), "charts"))
+    parser.add_argument("--workers", type=int, default=None, help="processes for batch (default: all cores)")
+    args = parser.parse_args()
+
+    filters = {}
+    for item in args.filter:
+        column, sep, value = item.partition("=")
+        if not sep:
+            parser.error(f"--filter expects COLUMN=VALUE, got {item!r}")
+        filters.setdefault(column, []).append(value)
+    service = ChartService(load_responses(args.archive), ChartCache(args.cache_dir))
+
+    t0 = time.perf_counter()
+    if args.kind == "batch":
+        tasks = radar_tasks(service.responses, args.by or "Division", args.format)
+        _, drawn = render_batch(service, tasks, args.workers)
+        print(f"{len(tasks)} radars in {args.cache_dir}: {drawn} drawn, {len(tasks) - drawn} cached, "
+              f"{time.perf_counter() - t0:.1f} s")
+        return
+
+    data = service.chart(args.kind, filters, args.by, args.element, args.format)
+    output = args.output or f"{args.kind}.{args.format}"
+    with open(output, "wb") as f:
+        f.write(data)
+    print(f"wrote {output} ({len(data) / 1024:.0f} KiB, {(time.perf_counter() - t0) * 1000:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
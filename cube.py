@@ -0,0 +1,310 @@
+"""
+Culture cube: every demographic cross-tab of the responses, precomputed as dense NumPy arrays.
+
+One int64 array holds, for every combination of Division x Level x Gender x
+Tenure x Generation answers, the respondent count, the dominant-quadrant
+counts and the sum and sum of squares of each element x quadrant's points.
+Every dimension has two extra slots besides its categories: "unanswered" and
+"all" (the sum over the whole axis), so all 2^5 cuboids — any subset of the
+dimensions rolled up — live in the same array (about 19k cells, 8 MB for the
+CVF survey). A filter or breakdown is a slice of it, summed over the axes of
+filters that allow several answers: a few hundred microseconds, whatever the
+number of responses.
+
+Groups of fewer than ``min_cell`` respondents are suppressed for anonymity:
+their count is kept but means, dispersion and profile are withheld (NaN). If
+only one group of a breakdown falls under the threshold, the next smallest is
+suppressed too, so the small one cannot be recovered by subtracting the rest
+from the total. Filters are checked the same way: a group is suppressed when
+any answer a filter lets in, or the rest of the answers it leaves out, holds
+fewer than ``min_cell`` of the group's respondents, since the difference of
+two filters (Division in [A, B] minus Division = B, or no filter minus every
+division but A) would otherwise recover the small part.
+
+    python cube.py build .cvf_data/app_responses.sqlite3 cube.npz
+    python cube.py build responses.parquet cube.npz
+    python cube.py query cube.npz --by Level --where Division="Sales Division" Gender=Γυναίκα
+"""
+import argparse
+import dataclasses
+import json
+import os
+import sqlite3
+from dataclasses import dataclass
+
+import numpy as np
+
+from cvf_analysis import _reduce_by_group, dominant_culture, stats_from_sums
+from survey_schema import load_survey, survey_path
+
+
+MIN_CELL = int(os.getenv("CVF_MIN_GROUP", "5"))
+
+
+@dataclass
+class CultureCube:
+    columns: tuple          # demographic columns, one axis each
+    categories: tuple       # per column its answers; slot len(c) is "unanswered", len(c) + 1 is "all"
+    data: np.ndarray        # (*[len(c) + 2 for c in categories], 5 + 2 * elements * 4) int64:
+                            # n, dominant counts (QUADRANTS order), sums, sums of squares (canonical quadrant order)
+    elements: list
+    version: str
+
+    @property
+    def width(self):
+        return (self.data.shape[-1] - 5) // 2
+
+    # ——————————————————
+    # Building
+    # ——————————————————
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """Cube of a journal's aggregates (aggregates.py): the cells are rolled up once."""
+        survey = snapshot.survey
+        columns = tuple(d.column for d in survey.demographics)
+        categories = []
+        for i, demo in enumerate(survey.demographics):
+            answers = list(demo.options)
+            # keep answers the current definition no longer offers, like AggregateSnapshot.group_stats does
+            answers += sorted({cell[i] for cell in snapshot.cells if cell[i] is not None and cell[i] not in answers})
+            categories.append(answers)
+        codes = np.array([
+            [_code(lookup, answer) for lookup, answer in zip(map(_lookup, categories), cell)]
+            for cell in snapshot.cells
+        ], dtype=np.int64).reshape(len(snapshot.cells), len(columns))
+        values = np.column_stack([snapshot.counts, snapshot.dominant, snapshot.sums, snapshot.sumsq])
+        return cls._build(columns, categories, codes, values.astype(np.int64),
+                          [e.name for e in survey.elements], survey.version)
+
+    @classmethod
+    def from_responses(cls, responses, columns=None):
+        """Cube of an archive's responses (cvf_analysis.Responses), one pass per response."""
+        columns = tuple(columns or responses.demographics)
+        categories = [list(responses.demographics[c][1]) for c in columns]
+        codes = np.column_stack([responses.demographics[c][0] for c in columns]).astype(np.int64)
+        shape = [len(c) + 1 for c in categories]
+        flat = np.ravel_multi_index(tuple(_base_codes(codes, categories).T), shape)
+        alloc = responses.allocations
+        counts, sums, sumsq = _reduce_by_group(alloc.reshape(len(alloc), -1), flat, int(np.prod(shape)))
+        dominant = np.bincount(flat * 4 + dominant_culture(alloc), minlength=len(counts) * 4).reshape(-1, 4)
+        base = np.column_stack([counts, dominant, sums, sumsq]).astype(np.int64)
+        return cls._from_base(columns, categories, base.reshape(*shape, -1), list(responses.elements),
+                              responses.version)
+
+    @classmethod
+    def _build(cls, columns, categories, codes, values, elements, version):
+        shape = [len(c) + 1 for c in categories]
+        base = np.zeros((int(np.prod(shape)), values.shape[1]), dtype=np.int64)
+        if len(codes):
+            np.add.at(base, np.ravel_multi_index(tuple(_base_codes(codes, categories).T), shape), values)
+        return cls._from_base(columns, categories, base.reshape(*shape, -1), elements, version)
+
+    @classmethod
+    def _from_base(cls, columns, categories, base, elements, version):
+        # append each axis' total as its "all" slot; later axes sum earlier totals, so every cuboid is there
+        for axis in range(len(columns)):
+            base = np.concatenate([base, base.sum(axis=axis, keepdims=True)], axis=axis)
+        return cls(tuple(columns), tuple(tuple(c) for c in categories), base, list(elements), version)
+
+    # ——————————————————
+    # Queries
+    # ——————————————————
+    def select(self, by=(), where=None):
+        """Group labels and (G, 5 + 2 * width) totals of a breakdown by columns within a filter.
+
+        where maps a column to one answer or a list of answers; a column in by
+        is broken down over its filtered answers.
+        """
+        index = self._slots(by, where)
+        totals = self._reduce(self.data, index, by)
+        labels = {column: [answers[s] for s in index[self.columns.index(column)]]
+                  for column, answers in zip(self.columns, self.categories) if column in by}
+        if not by:
+            return ["All"], totals
+        group_labels = [()]
+        for column in by:
+            group_labels = [prev + (a,) for prev in group_labels for a in labels[column]]
+        return [lab if len(lab) > 1 else lab[0] for lab in group_labels], totals
+
+    def stats(self, *by, where=None, min_cell=MIN_CELL):
+        """GroupStats of a breakdown within a filter, with groups under min_cell respondents suppressed."""
+        labels, totals = self.select(by, where)
+        k = self.width
+        counts, dominant = totals[:, 0], totals[:, 1:5]
+        sums, sumsq = totals[:, 5:5 + k], totals[:, 5 + k:]
+        stats = stats_from_sums(by, labels, counts, sums, sumsq, dominant, len(self.elements))
+        return suppress(stats, min_cell, exposed=self._exposed(by, where, min_cell))
+
+    def _slots(self, by, where):
+        """Per axis the slots a breakdown by columns within a filter reads."""
+        where = where or {}
+        for column in (*by, *where):
+            if column not in self.columns:
+                raise KeyError(f"unknown demographic column {column}")
+        index = []
+        for column, answers in zip(self.columns, self.categories):
+            if column in where:
+                chosen = where[column]
+                chosen = [chosen] if isinstance(chosen, str) or not np.iterable(chosen) else list(chosen)
+                lookup = _lookup(answers)
+                missing = [a for a in chosen if a not in lookup]
+                if missing:
+                    raise KeyError(f"{column} has no answer {missing[0]!r}")
+                slots = [lookup[a] for a in chosen]
+            elif column in by:
+                slots = list(range(len(answers)))
+            else:
+                slots = [len(answers) + 1]  # the "all" slot
+            index.append(np.array(slots, dtype=np.intp))
+        return index
+
+    def _reduce(self, data, index, by, extra=None):
+        """(G, ...) sums of data over index: the breakdown axes in the order of by, then axis extra (kept) if given."""
+        block = data[np.ix_(*index)]
+        keep = [self.columns.index(c) for c in by] + ([extra] if extra is not None else [])
+        block = block.sum(axis=tuple(a for a in range(len(self.columns)) if a not in keep))
+        order = [sorted(keep).index(a) for a in keep]
+        block = block.transpose(order + list(range(len(keep), block.ndim)))
+        n_groups = int(np.prod([len(index[self.columns.index(c)]) for c in by]))
+        return block.reshape(n_groups, *block.shape[len(by):])
+
+    def _exposed(self, by, where, min_cell):
+        """(G,) True for groups a filter could expose: an answer it admits, or the rest it leaves out,
+        holds between 1 and min_cell - 1 of the group's respondents."""
+        index = self._slots(by, where)
+        counts = self.data[..., 0]
+        exposed = np.zeros(int(np.prod([len(index[self.columns.index(c)]) for c in by])), dtype=bool)
+        for column in where or {}:
+            if column in by:
+                continue  # a broken-down column's answers are groups of their own
+            axis = self.columns.index(column)
+            # the filter's answers and, last, the whole axis
+            with_all = index.copy()
+            with_all[axis] = np.append(index[axis], len(self.categories[axis]) + 1)
+            parts = self._reduce(counts, with_all, by, extra=axis)
+            parts[:, -1] -= parts[:, :-1].sum(axis=1)  # the rest: unanswered and the answers left out
+            exposed |= ((parts > 0) & (parts < min_cell)).any(axis=1)
+        return exposed
+
+    # ——————————————————
+    # Storage
+    # ——————————————————
+    def save(self, path):
+        meta = {"columns": list(self.columns), "categories": [list(c) for c in self.categories],
+                "elements": self.elements, "version": self.version}
+        with open(path, "wb") as f:
+            np.savez_compressed(f, data=self.data, meta=np.array(json.dumps(meta, ensure_ascii=False)))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as npz:
+            meta = json.loads(str(npz["meta"]))
+            data = npz["data"]
+        return cls(tuple(meta["columns"]), tuple(tuple(c) for c in meta["categories"]), data,
+                   meta["elements"], meta["version"])
+
+
+def suppress(stats, min_cell=MIN_CELL, exposed=None):
+    """Withhold the results of groups under min_cell respondents or exposed by a filter (and one complementary group)."""
+    small = (stats.counts > 0) & (stats.counts < min_cell)
+    if exposed is not None:
+        small |= exposed & (stats.counts > 0)
+    if small.sum() == 1 and len(stats.labels) > 1:
+        # one withheld group could be recovered as total minus the others; withhold the next smallest too
+        candidates = np.flatnonzero((stats.counts > 0) & ~small)
+        if len(candidates):
+            small[candidates[np.argmin(stats.counts[candidates])]] = True
+    if not small.any():
+        return dataclasses.replace(stats, suppressed=small)
+    withheld = lambda a, fill=np.nan: np.where(small.reshape(-1, *[1] * (a.ndim - 1)), fill, a)
+    return dataclasses.replace(
+        stats,
+        means=withheld(stats.means),
+        std=withheld(stats.std),
+        profile=withheld(stats.profile),
+        dominant=withheld(stats.dominant, -1),
+        dominant_share=withheld(stats.dominant_share),
+        suppressed=small,
+    )
+
+
+def _lookup(answers):
+    return {a: i for i, a in enumerate(answers)}
+
+
+def _code(lookup, answer):
+    return lookup.get(answer, -1) if answer is not None else -1
+
+
+def _base_codes(codes, categories):
+    """Codes with a missing answer (-1) moved to the column's "unanswered" slot."""
+    sizes = np.array([len(c) for c in categories], dtype=np.int64)
+    return np.where(codes < 0, sizes, codes)
+
+
+def load_cube(source, survey=None):
+    """Cube of an archive (.parquet), a journal's aggregates (.sqlite3) or a saved cube (.npz)."""
+    if source.endswith(".npz"):
+        return CultureCube.load(source)
+    if source.endswith(".parquet"):
+        from cvf_analysis import load_responses
+
+        return CultureCube.from_responses(load_responses(source))
+    from aggregates import load_snapshot
+
+    return CultureCube.from_snapshot(load_snapshot(source, survey))
+
+
+def _parse_where(items, parser):
+    where = {}
+    for item in items:
+        column, sep, answer = item.partition("=")
+        if not sep:
+            parser.error(f"--where expects Column=answer, got {item!r}")
+        where.setdefault(column, []).append(answer)
+    return where
+
+
+def main():
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--survey", default=survey_path("cvf_v2.yaml"), help="survey definition of a journal")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("build", help="precompute the cube of an archive or a journal and save it (.npz)")
+    p.add_argument("source", help="response_store.py archive (.parquet) or response journal (.sqlite3)")
+    p.add_argument("output")
+    p = sub.add_parser("query", help="print group profiles of a breakdown within a filter")
+    p.add_argument("source", help="saved cube (.npz), archive (.parquet) or response journal (.sqlite3)")
+    p.add_argument("--by", nargs="*", default=[], help="demographic columns to break down by")
+    p.add_argument("--where", nargs="*", default=[], metavar="COLUMN=ANSWER",
+                   help="filter; repeat a column to allow several answers")
+    p.add_argument("--min-cell", type=int, default=MIN_CELL, help="suppress groups with fewer respondents")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        parser.error(f"no archive, journal or cube at {args.source}")
+    survey = None if args.source.endswith((".parquet", ".npz")) else load_survey(args.survey)
+    try:
+        cube = load_cube(args.source, survey)
+    except sqlite3.OperationalError as e:
+        parser.error(f"cannot read the aggregates of {args.source} ({e}); run: python aggregates.py rebuild {args.source}")
+    if args.command == "build":
+        cube.save(args.output)
+        print(f"cube of {int(cube.data[(-1,) * len(cube.columns)][0]):,} responses, "
+              f"{' x '.join(str(n) for n in cube.data.shape[:-1])} cells, "
+              f"{cube.data.nbytes / 2**20:.1f} MB in memory, {os.path.getsize(args.output) / 1024:.0f} KiB on disk")
+        return
+
+    try:
+        stats = cube.stats(*args.by, where=_parse_where(args.where, parser), min_cell=args.min_cell)
+    except KeyError as e:
+        parser.error(e.args[0])
+    frame = stats.to_frame()
+    frame.loc[stats.suppressed, "dominant"] = f"< {args.min_cell}"
+    pd.set_option("display.width", 160)
+    print(frame[frame["n"] > 0].round(1).to_string())
+
+
+if __name__ == "__main__":
+    main()
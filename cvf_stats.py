@@ -0,0 +1,225 @@
+"""
+Bootstrap confidence intervals and permutation tests for CVF profiles.
+
+Point estimates for small groups (a division with a dozen respondents) say
+little on their own, so this module attaches uncertainty to them:
+
+    bootstrap_ci       percentile confidence interval of every quadrant mean
+                       (or element x quadrant mean) per demographic group
+    permutation_test   two-sided p-value per quadrant for the difference
+                       between two groups' means
+
+Resampling is vectorized: a block of bootstrap resamples is drawn as one
+integer matrix, turned into per-respondent resample counts and reduced with
+one matrix product; permutations shuffle a block of group masks at once.
+Blocks are spread over a process pool and each block has its own child of
+one SeedSequence, so a given seed gives the same result whatever the number
+of workers.
+
+    python cvf_stats.py responses.parquet --by Division --resamples 10000 --seed 7
+    python cvf_stats.py responses.parquet --by Division --compare "Production Division" "Sales Division"
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+
+from cvf_analysis import load_responses, respondent_profiles
+from survey_schema import QUADRANTS
+
+
+# work per block (resamples x respondents), bounds the memory of one task
+BLOCK_CELLS = 2_000_000
+MAX_BLOCK = 500
+
+
+@dataclass
+class BootstrapResult:
+    labels: list
+    counts: np.ndarray      # (G,)
+    mean: np.ndarray        # (G, K) observed means
+    low: np.ndarray         # (G, K) lower confidence bound, NaN for groups under min_count
+    high: np.ndarray        # (G, K)
+    level: float
+    resamples: int
+
+    def to_frame(self, columns=QUADRANTS):
+        import pandas as pd
+
+        parts = {}
+        for k, name in enumerate(columns):
+            parts[(name, "mean")] = self.mean[:, k]
+            parts[(name, "low")] = self.low[:, k]
+            parts[(name, "high")] = self.high[:, k]
+        frame = pd.DataFrame(parts, index=pd.Index(self.labels, name="group"))
+        frame.insert(0, ("n", ""), self.counts)
+        return frame
+
+
+@dataclass
+class PermutationResult:
+    group_a: str
+    group_b: str
+    n_a: int
+    n_b: int
+    difference: np.ndarray  # (K,) mean of a minus mean of b
+    p_value: np.ndarray     # (K,) two-sided
+    permutations: int
+
+    def to_frame(self, columns=QUADRANTS):
+        import pandas as pd
+
+        return pd.DataFrame(
+            {"difference": self.difference, "p_value": self.p_value},
+            index=pd.Index(list(columns), name=f"{self.group_a} − {self.group_b}"),
+        )
+
+
+def quadrant_values(responses):
+    """(N, 4) per-respondent quadrant scores, the mean over elements."""
+    return respondent_profiles(responses.allocations)
+
+
+def element_values(responses):
+    """(N, elements * 4) per-respondent points, element-major."""
+    return responses.allocations.reshape(len(responses), -1).astype(np.float32)
+
+
+# ——————————————————
+# Worker side
+# ——————————————————
+_VALUES = None
+_CODES = None
+
+
+def _init_worker(values, codes):
+    global _VALUES, _CODES
+    _VALUES, _CODES = values, codes
+
+
+def _bootstrap_block(group, n_resamples, seed):
+    x = _VALUES[_CODES == group]
+    n = len(x)
+    picks = np.random.default_rng(seed).integers(0, n, size=(n_resamples, n), dtype=np.int32)
+    # how often each respondent was drawn in each resample, then all resample means in one product
+    counts = np.empty((n_resamples, n), dtype=np.float32)
+    for i in range(n_resamples):
+        counts[i] = np.bincount(picks[i], minlength=n)
+    return (counts @ x) / n
+
+
+def _permutation_block(group_a, group_b, n_permutations, seed):
+    in_a, in_b = _CODES == group_a, _CODES == group_b
+    z = np.concatenate([_VALUES[in_a], _VALUES[in_b]])
+    n_a, n = int(in_a.sum()), len(z)
+    masks = np.zeros((n_permutations, n), dtype=np.float32)
+    masks[:, :n_a] = 1
+    np.random.default_rng(seed).permuted(masks, axis=1, out=masks)
+    sums_a = masks @ z
+    return sums_a / n_a - (z.sum(axis=0) - sums_a) / (n - n_a)
+
+
+def _blocks(total, group_size):
+    size = max(1, min(MAX_BLOCK, BLOCK_CELLS // max(group_size, 1)))
+    return [min(size, total - start) for start in range(0, total, size)]
+
+
+def _run(fn, tasks, values, codes, workers):
+    if workers == 1:
+        _init_worker(values, codes)
+        return [fn(*task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(values, codes)) as pool:
+        # map keeps task order, so the result does not depend on scheduling
+        return list(pool.map(fn, *zip(*tasks)))
+
+
+# ——————————————————
+# Public API
+# ——————————————————
+def bootstrap_ci(values, codes, labels, resamples=10_000, level=0.95, seed=0, workers=None, min_count=2):
+    """Percentile bootstrap CI of the mean of values (N, K) for every group code in range(len(labels))."""
+    values = np.ascontiguousarray(values, dtype=np.float32)
+    codes = np.asarray(codes)
+    counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+    mean = np.full((len(labels), values.shape[1]), np.nan)
+    for g in np.flatnonzero(counts):
+        mean[g] = values[codes == g].mean(axis=0, dtype=np.float64)
+
+    groups = [g for g in range(len(labels)) if counts[g] >= min_count]
+    tasks = [(g, size) for g in groups for size in _blocks(resamples, counts[g])]
+    seeds = np.random.SeedSequence(seed).spawn(len(tasks))
+    tasks = [(g, size, s) for (g, size), s in zip(tasks, seeds)]
+    results = _run(_bootstrap_block, tasks, values, codes, workers or os.cpu_count())
+
+    low = np.full_like(mean, np.nan)
+    high = np.full_like(mean, np.nan)
+    alpha = (1 - level) / 2
+    for g in groups:
+        means = np.concatenate([r for (group, _, _), r in zip(tasks, results) if group == g])
+        low[g], high[g] = np.quantile(means, [alpha, 1 - alpha], axis=0)
+    return BootstrapResult(list(labels), counts, mean, low, high, level, resamples)
+
+
+def permutation_test(values, codes, labels, group_a, group_b, permutations=10_000, seed=0, workers=None):
+    """Two-sided permutation test of the difference in mean values between two labelled groups."""
+    values = np.ascontiguousarray(values, dtype=np.float32)
+    codes = np.asarray(codes)
+    a, b = list(labels).index(group_a), list(labels).index(group_b)
+    x_a, x_b = values[codes == a], values[codes == b]
+    if len(x_a) < 1 or len(x_b) < 1:
+        raise ValueError(f"both groups need responses ({group_a}: {len(x_a)}, {group_b}: {len(x_b)})")
+    observed = x_a.mean(axis=0, dtype=np.float64) - x_b.mean(axis=0, dtype=np.float64)
+
+    sizes = _blocks(permutations, len(x_a) + len(x_b))
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(a, b, size, s) for size, s in zip(sizes, seeds)]
+    diffs = np.concatenate(_run(_permutation_block, tasks, values, codes, workers or os.cpu_count()))
+    # tolerance so float32 ties with the observed difference count as "as extreme"
+    extreme = (np.abs(diffs) >= np.abs(observed) - 1e-4).sum(axis=0)
+    p_value = (extreme + 1) / (permutations + 1)
+    return PermutationResult(group_a, group_b, len(x_a), len(x_b), observed, p_value, permutations)
+
+
+def main():
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("archive", help="Parquet archive written by response_store.py")
+    parser.add_argument("--by", default="Division", help="demographic column defining the groups")
+    parser.add_argument("--elements", action="store_true", help="element x quadrant means instead of profiles")
+    parser.add_argument("--resamples", type=int, default=10_000)
+    parser.add_argument("--level", type=float, default=0.95)
+    parser.add_argument("--compare", nargs=2, metavar=("GROUP_A", "GROUP_B"), help="run a permutation test instead")
+    parser.add_argument("--permutations", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    args = parser.parse_args()
+
+    responses = load_responses(args.archive)
+    codes, labels = responses.codes(args.by)
+    if args.elements:
+        values = element_values(responses)
+        columns = [f"{e} · {q}" for e in responses.elements for q in QUADRANTS]
+    else:
+        values, columns = quadrant_values(responses), QUADRANTS
+    pd.set_option("display.width", 200)
+
+    if args.compare:
+        result = permutation_test(values, codes, labels, *args.compare, permutations=args.permutations,
+                                  seed=args.seed, workers=args.workers)
+        print(f"{result.group_a} (n={result.n_a}) vs {result.group_b} (n={result.n_b}), "
+              f"{result.permutations} permutations")
+        print(result.to_frame(columns).round(4).to_string())
+        return
+
+    result = bootstrap_ci(values, codes, labels, resamples=args.resamples, level=args.level,
+                          seed=args.seed, workers=args.workers)
+    print(f"{len(responses)} responses by {args.by}, {args.level:.0%} bootstrap CI over {result.resamples} resamples")
+    frame = result.to_frame(columns)
+    print(frame[frame[("n", "")] > 0].round(1).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Drafts of unfinished surveys, so a participant who loses the session gets it back.
+
+Once something is filled in, the page URL carries the session's resume token
+(``?resume=<token>``). A reload or a reconnect after the websocket dropped
+finds the draft saved under that token and restores the allocations and
+demographics instead of starting over.
+
+The token alone does not open a draft: each draft is stored with the hash of
+an owner secret that the app keeps in session state and in a browser cookie
+(DRAFT_COOKIE), so a link copied to another device or opened by a later
+session without the cookie starts blank. For a browser that is shared (a
+kiosk, a reused tab) drafts expire after ``max_age`` seconds without a change
+(CVF_DRAFT_MAX_AGE, default an hour), and the apps drop the token from the
+URL and rotate the secret when a survey is submitted.
+
+A draft is one byte per allocation and one per demographic (the index of the
+chosen option), about 30 bytes for the CVF survey, stored with the survey
+version in a SQLite table keyed by the token. A draft of another survey
+version is ignored.
+
+Saving is cheap enough to call on every rerun: save() only encodes the state
+and, if it changed, remembers it in memory; a background thread writes all
+changed drafts in one transaction every ``flush_interval`` seconds. A draft is
+discarded when its survey is submitted, expired drafts are never loaded,
+and the writer thread purges them every few minutes.
+"""
+import atexit
+import hashlib
+import logging
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+
+
+log = logging.getLogger(__name__)
+
+MAX_AGE = float(os.getenv("CVF_DRAFT_MAX_AGE", "3600"))
+PURGE_INTERVAL = 300.0
+DRAFT_COOKIE = "cvf_draft"
+MISSING = 255  # byte of an unset allocation or unanswered demographic
+_TOKEN = re.compile(r"[A-Za-z0-9_-]{16,64}")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS drafts (
+    token          TEXT PRIMARY KEY,
+    survey_version TEXT NOT NULL,
+    updated_at     REAL NOT NULL,
+    payload        BLOB NOT NULL,
+    owner          TEXT
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS drafts_updated ON drafts(updated_at);
+"""
+
+
+def new_resume_token():
+    return secrets.token_urlsafe(16)
+
+
+def is_resume_token(token):
+    return isinstance(token, str) and _TOKEN.fullmatch(token) is not None
+
+
+def owner_key(secret):
+    """What a draft stores of its owner secret: a hash, so the table alone does not open drafts."""
+    return hashlib.sha256(secret.encode("ascii")).hexdigest()
+
+
+def cookie_script(secret, max_age=MAX_AGE):
+    """JavaScript that keeps secret in the DRAFT_COOKIE of the page (for components.html)."""
+    return (f"<script>window.parent.document.cookie = "
+            f"'{DRAFT_COOKIE}={secret}; path=/; max-age={int(max_age)}; SameSite=Strict';</script>")
+
+
+def encode(survey, state):
+    """The survey's allocations and demographics in state, one byte each."""
+    out = bytearray()
+    for key in survey.slider_keys:
+        value = state.get(key)
+        out.append(value if isinstance(value, int) and 0 <= value <= 100 else MISSING)
+    for demo in survey.demographics:
+        value = state.get(demo.key)
+        out.append(demo.options.index(value) if value in demo.options else MISSING)
+    return bytes(out)
+
+
+def decode(survey, payload):
+    """Session-state values of an encoded draft; unset allocations and demographics are left out."""
+    if len(payload) != len(survey.slider_keys) + len(survey.demographics):
+        return None
+    state = {}
+    for key, byte in zip(survey.slider_keys, payload):
+        if byte != MISSING:
+            state[key] = byte
+    for demo, byte in zip(survey.demographics, payload[len(survey.slider_keys):]):
+        if byte != MISSING and byte < len(demo.options):
+            state[demo.key] = demo.options[byte]
+    return state
+
+
+def _blank(survey):
+    return encode(survey, dict(survey.default_state))
+
+
+class DraftStore:
+    def __init__(self, path, flush_interval=2.0, max_age=MAX_AGE):
+        self.path = path
+        self.flush_interval = flush_interval
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self.max_age = max_age
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+            # stores written before drafts had owners; their drafts open for nobody
+            if "owner" not in {r[1] for r in conn.execute("PRAGMA table_info(drafts)")}:
+                conn.execute("ALTER TABLE drafts ADD COLUMN owner TEXT")
+        self.purge(max_age)
+        self._purged_at = time.monotonic()
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._dirty = {}    # token -> (survey version, payload, owner) waiting to be written, None to be deleted
+        self._written = {}  # token -> (survey version, payload, owner) last written, to skip unchanged saves
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="cvf-draft-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ——————————————————
+    # Public API
+    # ——————————————————
+    def save(self, token, survey, state, owner):
+        """Remember the draft of token for owner (a secret); it is written within flush_interval seconds if it changed.
+
+        Returns whether there is a draft to resume, False while nothing is filled in.
+        """
+        draft = (survey.version, encode(survey, state), owner_key(owner))
+        with self._lock:
+            if self._dirty.get(token, self._written.get(token)) == draft:
+                return True
+            if self._dirty.get(token) is None and token not in self._written and draft[1] == _blank(survey):
+                return False  # nothing filled in yet, nothing to resume
+            self._dirty[token] = draft
+            return True
+
+    def load(self, token, survey, owner):
+        """Session-state values saved under token by owner, None if there is no such unexpired draft of this survey version."""
+        with self._lock:
+            if token in self._dirty and self._dirty[token] is None:
+                return None
+            draft = self._dirty.get(token)
+        if draft is None:
+            row = self._conn().execute(
+                "SELECT survey_version, payload, owner FROM drafts WHERE token = ? AND updated_at >= ?",
+                (token, time.time() - self.max_age),
+            ).fetchone()
+            if row is None:
+                return None
+            draft = (row[0], bytes(row[1]), row[2])
+            if draft[2] == owner_key(owner):
+                with self._lock:
+                    self._written[token] = draft
+        if draft[0] != survey.version or draft[2] != owner_key(owner):
+            return None
+        return decode(survey, draft[1])
+
+    def discard(self, token):
+        """Forget the draft of token (its survey was submitted); it is deleted with the next flush."""
+        with self._lock:
+            self._dirty[token] = None
+            self._written.pop(token, None)
+
+    def flush(self):
+        """Write the changed drafts now; returns how many."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return 0
+        now = time.time()
+        try:
+            with self._conn() as conn:
+                conn.executemany(
+                    """INSERT OR REPLACE INTO drafts (token, survey_version, updated_at, payload, owner)
+                       VALUES (?, ?, ?, ?, ?)""",
+                    [(token, draft[0], now, draft[1], draft[2]) for token, draft in dirty.items() if draft is not None],
+                )
+                conn.executemany(
+                    "DELETE FROM drafts WHERE token = ?", [(token,) for token, draft in dirty.items() if draft is None]
+                )
+        except BaseException:
+            with self._lock:
+                # newer saves made meanwhile win
+                self._dirty = {**dirty, **self._dirty}
+            raise
+        with self._lock:
+            if len(self._written) > 100_000:
+                self._written.clear()  # only costs a repeated write of unchanged drafts
+            self._written.update((token, draft) for token, draft in dirty.items() if draft is not None)
+        return len(dirty)
+
+    def purge(self, max_age):
+        """Delete drafts not saved for max_age seconds; returns how many."""
+        with self._conn() as conn:
+            return conn.execute("DELETE FROM drafts WHERE updated_at < ?", (time.time() - max_age,)).rowcount
+
+    def close(self, timeout=10.0):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify()
+        self._thread.join(timeout)
+
+    # ——————————————————
+    # Internals
+    # ——————————————————
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._closed:
+                    self._wakeup.wait(self.flush_interval)
+                closing = self._closed
+            try:
+                self.flush()
+                if time.monotonic() - self._purged_at >= PURGE_INTERVAL:
+                    self._purged_at = time.monotonic()
+                    self.purge(self.max_age)
+            except Exception:
+                log.warning("could not write drafts to %s", self.path, exc_info=True)
+            if closing:
+                return
@@ -0,0 +1,202 @@
+"""
+Streaming export of survey responses to CSV or Parquet.
+
+Reads a response journal (or a response_store.py archive) in fixed-size chunks
+and writes each chunk out before reading the next, so memory stays bounded by
+the chunk size whatever the number of responses. Two layouts:
+
+    wide   one row per respondent, one column per {element}_{option} slider,
+           as in the sheet (allocations typed as uint8 in Parquet), then the
+           submission id when the source archive has one
+    long   one row per respondent x element x quadrant:
+           respondent, timestamp, demographics, element, quadrant, points
+
+The output format follows the file extension: .csv, .csv.gz or .parquet.
+
+    python export.py .cvf_data/app_responses.sqlite3 responses_long.csv --layout long
+    python export.py responses.parquet responses_wide.parquet --layout wide
+"""
+import argparse
+import os
+import threading
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+from response_store import archive_files, archive_metadata, rows_to_table
+from survey_schema import QUADRANTS, SUBMISSION_ID_COLUMN, load_survey, survey_path
+
+
+LAYOUTS = ("long", "wide")
+
+
+# ——————————————————
+# Sources: (respondent ids, archive-layout table) per chunk
+# ——————————————————
+def journal_chunks(journal_path, survey, chunk_size=5000, legacy_version=None):
+    """Chunks of the journal rows of survey's version; untagged rows are taken to be of legacy_version (default: survey's)."""
+    from journal import ResponseJournal, of_version
+
+    ids, rows = [], []
+    for row_id, _, _, row_version, values in ResponseJournal(journal_path).iter_tagged(chunk_size):
+        if not of_version(row_version, survey.version, legacy_version) or len(values) != len(survey.columns):
+            continue  # a row written under another survey definition
+        ids.append(row_id)
+        rows.append(values)
+        if len(rows) == chunk_size:
+            yield np.array(ids, dtype=np.int64), rows_to_table(survey, rows)
+            ids, rows = [], []
+    if rows:
+        yield np.array(ids, dtype=np.int64), rows_to_table(survey, rows)
+
+
+def archive_chunks(archive_path, chunk_size=5000):
+    start = 1
+    for path in archive_files(archive_path):
+        parquet = pq.ParquetFile(path)
+        schema = parquet.schema_arrow
+        for batch in parquet.iter_batches(batch_size=chunk_size):
+            table = pa.Table.from_batches([batch]).replace_schema_metadata(schema.metadata)
+            yield np.arange(start, start + len(table), dtype=np.int64), table
+            start += len(table)
+
+
+# ——————————————————
+# Layouts
+# ——————————————————
+def _demographic_columns(table):
+    return [name for name in table.column_names if name not in ("timestamp", "allocations", SUBMISSION_ID_COLUMN)]
+
+
+def wide_table(ids, table):
+    meta = archive_metadata(table)
+    points = table.column("allocations").combine_chunks().flatten().to_numpy(zero_copy_only=False)
+    points = points.reshape(len(table), -1)
+    names = [f"{e}_{k}" for e in meta["elements"] for k in meta["option_keys"]]
+    columns = {"respondent": pa.array(ids), "timestamp": table.column("timestamp")}
+    columns.update((name, table.column(name)) for name in _demographic_columns(table))
+    columns.update((name, pa.array(points[:, i])) for i, name in enumerate(names))
+    if SUBMISSION_ID_COLUMN in table.column_names:
+        columns[SUBMISSION_ID_COLUMN] = table.column(SUBMISSION_ID_COLUMN)
+    return pa.table(columns)
+
+
+def long_table(ids, table):
+    meta = archive_metadata(table)
+    n, n_elements = len(table), len(meta["elements"])
+    per_respondent = n_elements * 4
+    points = table.column("allocations").combine_chunks().flatten()
+    # every input row repeats per element x option; element and quadrant are dictionary codes
+    repeat = pa.array(np.repeat(np.arange(n), per_respondent))
+    quadrant_of_option = [QUADRANTS.index(q) for q in meta["quadrants"]]
+    elements = np.tile(np.repeat(np.arange(n_elements, dtype=np.int8), 4), n)
+    quadrants = np.tile(np.array(quadrant_of_option * n_elements, dtype=np.int8), n)
+
+    columns = {
+        "respondent": pa.array(np.repeat(ids, per_respondent)),
+        "timestamp": table.column("timestamp").take(repeat),
+    }
+    columns.update((name, table.column(name).take(repeat)) for name in _demographic_columns(table))
+    columns["element"] = pa.DictionaryArray.from_arrays(pa.array(elements), pa.array(meta["elements"]))
+    columns["quadrant"] = pa.DictionaryArray.from_arrays(pa.array(quadrants), pa.array(QUADRANTS))
+    columns["points"] = points
+    return pa.table(columns)
+
+
+# ——————————————————
+# Writers
+# ——————————————————
+class _ParquetSink:
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+
+    def write(self, table):
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema, compression="zstd")
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class _CsvSink:
+    def __init__(self, path, compression=None):
+        self.stream = pa.OSFile(path, "wb") if compression is None else pa.CompressedOutputStream(path, compression)
+        self.writer = None
+
+    def write(self, table):
+        # CSV has no dictionary type; write the labels
+        table = table.cast(pa.schema([
+            pa.field(f.name, f.type.value_type) if pa.types.is_dictionary(f.type) else f for f in table.schema
+        ]))
+        if self.writer is None:
+            self.writer = pacsv.CSVWriter(self.stream, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.stream.close()
+
+
+def open_sink(path, output_name=None):
+    """Chunk writer for path, in the format given by the extension of output_name (default: path)."""
+    name = output_name or path
+    if name.endswith(".parquet"):
+        return _ParquetSink(path)
+    if name.endswith(".csv.gz"):
+        return _CsvSink(path, "gzip")
+    if name.endswith(".csv"):
+        return _CsvSink(path)
+    raise ValueError(f"unsupported export format: {name} (use .csv, .csv.gz or .parquet)")
+
+
+def export(chunks, output_path, layout="long", on_chunk=None):
+    """Write every chunk to output_path in the given layout. Returns the number of respondents."""
+    if layout not in LAYOUTS:
+        raise ValueError(f"layout must be one of {', '.join(LAYOUTS)}")
+    transform = long_table if layout == "long" else wide_table
+    # write next to the target and rename, so a reader never sees a half-written file
+    partial = f"{output_path}.{os.getpid()}-{threading.get_ident()}.partial"
+    sink = open_sink(partial, output_path)
+    respondents = 0
+    try:
+        for ids, table in chunks:
+            sink.write(transform(ids, table))
+            respondents += len(ids)
+            if on_chunk is not None:
+                on_chunk(respondents)
+    except BaseException:
+        sink.close()
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    sink.close()
+    os.replace(partial, output_path)
+    return respondents
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="response journal (.sqlite3) or response_store.py archive (.parquet)")
+    parser.add_argument("output", help="output file: .csv, .csv.gz or .parquet")
+    parser.add_argument("--layout", choices=LAYOUTS, default="long")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="respondents per chunk")
+    parser.add_argument("--survey", default=survey_path("cvf_v2.yaml"), help="survey definition of a journal")
+    args = parser.parse_args()
+
+    if args.source.endswith(".parquet"):
+        chunks = archive_chunks(args.source, args.chunk_size)
+    else:
+        chunks = journal_chunks(args.source, load_survey(args.survey), args.chunk_size)
+    respondents = export(chunks, args.output, args.layout)
+    print(f"exported {respondents} responses ({args.layout}) to {args.output} "
+          f"({os.path.getsize(args.output) / 1024:.1f} KiB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+In-process stand-in for the Google Sheets ``values:append`` API.
+
+Lets the submit path be exercised and benchmarked without a Google account:
+
+    python fake_sheets.py --port 8765 --latency 0.15 --jitter 0.05 --quota-per-minute 60
+
+then run the app with CVF_STORAGE_BACKEND=http. Appended rows are kept in memory
+and can be read back with GET /v4/spreadsheets/<id>/values/<range>.
+
+It also answers what gspread and google-auth need to open a sheet (spreadsheet
+metadata and a POST /token OAuth endpoint for service-account credentials whose
+token_uri points here), so sheets.SheetsClientPool can run against it with
+base_url. With --token-ttl, requests with a missing or expired access token get
+401; --drop-rate closes a fraction of append connections without an answer.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+APPEND_PATH = re.compile(r"^/v4/spreadsheets/([^/]+)/values/([^/?]+):append")
+VALUES_PATH = re.compile(r"^/v4/spreadsheets/([^/]+)/values/([^/?:]+)$")
+METADATA_PATH = re.compile(r"^/v4/spreadsheets/([^/?]+)(\?.*)?$")
+
+
+class FakeSheets:
+    """Shared state of the fake server: stored rows, latency and quota settings."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, quota_per_minute=None, token_ttl=None,
+                 drop_rate=0.0, token_latency=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.quota_per_minute = quota_per_minute
+        self.token_ttl = token_ttl  # None: no authorization check
+        self.drop_rate = drop_rate
+        self.token_latency = token_latency
+        self.rows = []
+        self.received_at = []
+        self.requests = 0
+        self.rejected = 0
+        self.unauthorized = 0
+        self.dropped = 0
+        self.tokens_issued = 0
+        self._tokens = {}  # access token -> expiry time
+        self._lock = threading.Lock()
+        self._window = []
+
+    def issue_token(self):
+        ttl = self.token_ttl or 3600
+        time.sleep(self.token_latency)
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._tokens[token] = time.time() + ttl
+            self.tokens_issued += 1
+        return token, ttl
+
+    def authorized(self, header):
+        if self.token_ttl is None:
+            return True
+        token = (header or "").removeprefix("Bearer ").strip()
+        with self._lock:
+            ok = self._tokens.get(token, 0) > time.time()
+            self.unauthorized += not ok
+        return ok
+
+    def drop(self):
+        with self._lock:
+            dropped = random.random() < self.drop_rate
+            self.dropped += dropped
+        return dropped
+
+    def _over_quota(self, now):
+        if self.quota_per_minute is None:
+            return False
+        # sliding 60 s window over accepted write requests, like the real per-minute quota
+        self._window = [t for t in self._window if now - t < 60]
+        if len(self._window) >= self.quota_per_minute:
+            return True
+        self._window.append(now)
+        return False
+
+    def append(self, values):
+        """Returns the HTTP status the real API would answer with."""
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        with self._lock:
+            self.requests += 1
+            now = time.time()
+            if random.random() < self.error_rate or self._over_quota(now):
+                self.rejected += 1
+                return 429
+            self.rows.extend(values)
+            self.received_at.extend([now] * len(values))
+            return 200
+
+
+def _make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _unauthorized(self):
+            return self._reply(401, {"error": {"code": 401, "status": "UNAUTHENTICATED",
+                                               "message": "Request had invalid authentication credentials."}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length)
+            if self.path == "/token":
+                token, ttl = state.issue_token()
+                return self._reply(200, {"access_token": token, "expires_in": ttl, "token_type": "Bearer"})
+            if not APPEND_PATH.match(self.path):
+                return self._reply(404, {"error": {"code": 404, "message": "Not found"}})
+            if not state.authorized(self.headers.get("Authorization")):
+                return self._unauthorized()
+            if state.drop():
+                # like a keep-alive connection the other side already closed
+                self.close_connection = True
+                return
+            values = json.loads(body or b"{}").get("values", [])
+            status = state.append(values)
+            if status == 429:
+                return self._reply(429, {"error": {
+                    "code": 429, "status": "RESOURCE_EXHAUSTED",
+                    "message": "Quota exceeded for quota metric 'Write requests' per minute per user.",
+                }})
+            self._reply(200, {"updates": {"updatedRows": len(values)}})
+
+        def do_GET(self):
+            if not state.authorized(self.headers.get("Authorization")):
+                return self._unauthorized()
+            metadata = METADATA_PATH.match(self.path)
+            if metadata:
+                return self._reply(200, {
+                    "spreadsheetId": metadata.group(1),
+                    "properties": {"title": "Fake responses"},
+                    "sheets": [{"properties": {"sheetId": 0, "title": "Sheet1", "index": 0,
+                                               "gridProperties": {"rowCount": 1000, "columnCount": 64}}}],
+                })
+            if not VALUES_PATH.match(self.path):
+                return self._reply(404, {"error": {"code": 404, "message": "Not found"}})
+            with state._lock:
+                rows = list(state.rows)
+            self._reply(200, {"values": rows})
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start_in_thread(port=0, **settings):
+    """Start a fake server on a background thread. Returns (server, state, base_url)."""
+    state = FakeSheets(**settings)
+    server = ThreadingHTTPServer(("127.0.0.1", port), _make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-sheets", daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of uniform latency jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--quota-per-minute", type=int, default=None, help="write requests allowed per 60 s")
+    parser.add_argument("--token-ttl", type=float, default=None, help="require access tokens from /token, valid this long")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fraction of appends whose connection is dropped")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="seconds per token request")
+    args = parser.parse_args()
+
+    state = FakeSheets(args.latency, args.jitter, args.error_rate, args.quota_per_minute, args.token_ttl,
+                       args.drop_rate, args.token_latency)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), _make_handler(state))
+    print(f"Fake Sheets API listening on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
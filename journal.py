@@ -0,0 +1,202 @@
+"""
+Local write-ahead journal for survey responses.
+
+Every submitted row is committed to an append-only SQLite table (WAL mode)
+before the participant is acknowledged. Rows keep a ``sent_at`` marker so a
+background worker can replay whatever has not reached Google Sheets yet, and
+the table doubles as the complete local log of responses.
+
+An optional ``aggregates`` hook (see aggregates.py) is updated in the same
+transaction as each insert.
+
+Rows may carry a submission id (an idempotency key made once per filled-in
+form): a second append with the same id, from a retried or double-clicked
+submit, raises DuplicateSubmission and stores nothing. The id travels to
+storage as the row's last cell, the declared "Submission ID" column after the
+survey columns (Survey.storage_columns), so a shared queue (shared_queue.py),
+the sheet and the Parquet archive can tell duplicates apart too.
+
+Rows are tagged with the survey wave they belong to and the version of the
+survey definition that produced them, so yearly runs can be told apart and
+aligned later (waves.py). The wave defaults to the year of the submission.
+Readers that work with one survey definition (aggregates, quality checks,
+exports) take only the rows of its version, see of_version(): two versions
+can have the same number of columns but different elements and options.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at    REAL NOT NULL,
+    payload       TEXT NOT NULL,
+    sent_at       REAL,
+    submission_id TEXT,
+    wave          TEXT,
+    survey_version TEXT
+);
+CREATE INDEX IF NOT EXISTS responses_unsent ON responses(id) WHERE sent_at IS NULL;
+CREATE INDEX IF NOT EXISTS responses_created ON responses(created_at);
+"""
+
+
+def of_version(row_version, version, legacy_version=None):
+    """Whether a row tagged row_version belongs to survey version.
+
+    Rows journaled before the tags existed (None) are of legacy_version, by
+    default version itself.
+    """
+    if row_version is None:
+        return (legacy_version or version) == version
+    return row_version == version
+
+
+def new_submission_id():
+    return uuid.uuid4().hex
+
+
+class DuplicateSubmission(Exception):
+    """A row with this submission id is already journaled (row_id)."""
+
+    def __init__(self, submission_id, row_id):
+        super().__init__(f"submission {submission_id} is already journaled as row {row_id}")
+        self.submission_id = submission_id
+        self.row_id = row_id
+
+
+class ResponseJournal:
+    def __init__(self, path, aggregates=None, wave=None, survey_version=None):
+        self.path = path
+        self.aggregates = aggregates
+        self.wave = wave
+        self.survey_version = survey_version
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+            # journals written before submission ids and wave tags existed
+            existing = {r[1] for r in conn.execute("PRAGMA table_info(responses)")}
+            for column in ("submission_id", "wave", "survey_version"):
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE responses ADD COLUMN {column} TEXT")
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS responses_submission ON responses(submission_id)")
+        if aggregates is not None:
+            aggregates.attach(self._conn())
+
+    def _conn(self):
+        # sqlite3 connections are not shareable across threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # NORMAL is durable across application crashes in WAL mode and avoids an fsync per commit
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def append(self, values, submission_id=None):
+        """Commit one row (list of cell values) and return its journal id.
+
+        Raises DuplicateSubmission, and stores nothing, if submission_id is already journaled.
+        """
+        values = list(values)
+        now = time.time()
+        with self._conn() as conn:
+            cur = conn.execute(
+                """INSERT OR IGNORE INTO responses (created_at, payload, submission_id, wave, survey_version)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (now, json.dumps(values, ensure_ascii=False), submission_id,
+                 self.wave or time.strftime("%Y", time.localtime(now)), self.survey_version),
+            )
+            if not cur.rowcount:
+                row_id = conn.execute(
+                    "SELECT id FROM responses WHERE submission_id = ?", (submission_id,)
+                ).fetchone()[0]
+                raise DuplicateSubmission(submission_id, row_id)
+            if self.aggregates is not None and of_version(
+                self.survey_version, self.aggregates.version, self.aggregates.legacy_version
+            ):
+                self.aggregates.add(conn, cur.lastrowid, values)
+            return cur.lastrowid
+
+    def unsent(self, limit):
+        """Oldest rows not yet written to the sheet, as (id, row) pairs; row is values + [submission id or None],
+        in Survey.storage_columns order."""
+        cur = self._conn().execute(
+            "SELECT id, payload, submission_id FROM responses WHERE sent_at IS NULL ORDER BY id LIMIT ?",
+            (limit,),
+        )
+        return [(row_id, json.loads(payload) + [submission_id]) for row_id, payload, submission_id in cur.fetchall()]
+
+    def oldest_unsent_at(self):
+        """created_at of the oldest row not yet written, None when all are sent."""
+        row = self._conn().execute(
+            "SELECT created_at FROM responses WHERE sent_at IS NULL ORDER BY id LIMIT 1"
+        ).fetchone()
+        return row[0] if row else None
+
+    def count_unsent(self):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM responses WHERE sent_at IS NULL"
+        ).fetchone()[0]
+
+    def mark_sent(self, ids):
+        with self._conn() as conn:
+            conn.executemany(
+                "UPDATE responses SET sent_at = ? WHERE id = ?",
+                [(time.time(), row_id) for row_id in ids],
+            )
+
+    def iter_rows(self, chunk_size=1000):
+        """Yield (id, created_at, values) for every journaled row, oldest first."""
+        last_id = 0
+        conn = self._conn()
+        while True:
+            chunk = conn.execute(
+                "SELECT id, created_at, payload FROM responses WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, chunk_size),
+            ).fetchall()
+            if not chunk:
+                return
+            for row_id, created_at, payload in chunk:
+                yield row_id, created_at, json.loads(payload)
+            last_id = chunk[-1][0]
+
+    def iter_stored(self, chunk_size=1000):
+        """Yield (id, row) for every journaled row, oldest first; row is as in unsent()."""
+        last_id = 0
+        conn = self._conn()
+        while True:
+            chunk = conn.execute(
+                "SELECT id, payload, submission_id FROM responses WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, chunk_size),
+            ).fetchall()
+            if not chunk:
+                return
+            for row_id, payload, submission_id in chunk:
+                yield row_id, json.loads(payload) + [submission_id]
+            last_id = chunk[-1][0]
+
+    def iter_tagged(self, chunk_size=1000):
+        """Yield (id, created_at, wave, survey_version, values) for every journaled row, oldest first.
+
+        Rows journaled before the tags existed have None for both.
+        """
+        last_id = 0
+        conn = self._conn()
+        while True:
+            chunk = conn.execute(
+                """SELECT id, created_at, wave, survey_version, payload FROM responses
+                   WHERE id > ? ORDER BY id LIMIT ?""",
+                (last_id, chunk_size),
+            ).fetchall()
+            if not chunk:
+                return
+            for row_id, created_at, wave, survey_version, payload in chunk:
+                yield row_id, created_at, wave, survey_version, json.loads(payload)
+            last_id = chunk[-1][0]
@@ -0,0 +1,406 @@
+"""
+In-process timing metrics of the survey apps' hot paths.
+
+Every phase is recorded in one histogram, cvf_phase_seconds{phase=...}:
+
+    rerun            a whole script run of a session
+    setup, render    segments of a rerun, marked in the app script
+    section          one survey section, in a full rerun or on its own as a fragment (app.py)
+    build_row        building the sheet row of a submit
+    submit           journaling it (SubmissionQueue.put)
+    append_rows      one storage append of the background writer
+    connect_gsheets  opening an authorized Sheets client (sheets.py)
+
+plus the session-state size of a sample of reruns (CVF_STATE_SAMPLE, default
+1%; pickling the state is not free), the number of active sessions and the
+submission queue's depth and retry counters. Recording is a bisect and a
+few additions under a lock; nothing is exported unless configured:
+
+    CVF_METRICS_PORT=9464    Prometheus text format on http://<host>:9464/metrics
+    CVF_METRICS_LOG=path     one JSON line every CVF_METRICS_INTERVAL seconds (default 60)
+                             with count, mean and estimated p50/p95/p99 per phase
+
+Sampled profiling of reruns:
+
+    CVF_PROFILE_SAMPLE=0.01  profile 1% of reruns into CVF_PROFILE_DIR
+                             (default <CVF_DATA_DIR>/profiles), one cProfile .prof
+                             file each (CVF_PROFILER=pyinstrument: .html, if installed)
+"""
+import bisect
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+
+log = logging.getLogger(__name__)
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _fmt(value):
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by one label."""
+
+    def __init__(self, name, help, buckets=SECONDS_BUCKETS, label=None):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.label = label
+        self._lock = threading.Lock()
+        self._series = {}  # label value -> [bucket counts..., +Inf count], sum
+
+    def observe(self, value, label_value=None):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def _copy(self):
+        with self._lock:
+            return {k: (list(counts), total) for k, (counts, total) in self._series.items()}
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_value, (counts, total) in sorted(self._copy().items(), key=lambda kv: str(kv[0])):
+            labels = f'{self.label}="{label_value}",' if self.label else ""
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{{{labels}le="{_fmt(bound)}"}} {cumulative}')
+            plain = f"{{{labels.rstrip(',')}}}" if labels else ""
+            lines.append(f"{self.name}_sum{plain} {total}")
+            lines.append(f"{self.name}_count{plain} {cumulative}")
+        return lines
+
+    def summary(self):
+        """Per label value: count, mean and percentiles estimated as the upper bound of their bucket."""
+        result = {}
+        for label_value, (counts, total) in self._copy().items():
+            count = sum(counts)
+            if not count:
+                continue
+            entry = {"count": count, "mean": total / count}
+            for pct in (50, 95, 99):
+                rank, cumulative = pct / 100 * count, 0
+                for bound, n in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += n
+                    if cumulative >= rank:
+                        entry[f"p{pct}"] = bound if bound != float("inf") else None
+                        break
+            result[str(label_value) if label_value is not None else self.name] = entry
+        return result
+
+
+class Registry:
+    def __init__(self):
+        self.histograms = []
+        self._gauges = []  # (name, help, fn returning a number or None)
+        self._lock = threading.Lock()
+
+    def histogram(self, name, help, buckets=SECONDS_BUCKETS, label=None):
+        histogram = Histogram(name, help, buckets, label)
+        self.histograms.append(histogram)
+        return histogram
+
+    def gauge(self, name, help, fn):
+        """Register a gauge read from fn() at export time; a later registration of name replaces it."""
+        with self._lock:
+            self._gauges = [g for g in self._gauges if g[0] != name] + [(name, help, fn)]
+
+    def _gauge_values(self):
+        with self._lock:
+            gauges = list(self._gauges)
+        values = []
+        for name, help, fn in gauges:
+            try:
+                value = fn()
+            except Exception:
+                value = None
+            if value is not None:
+                values.append((name, help, value))
+        return values
+
+    def exposition(self):
+        """The registry in the Prometheus text format."""
+        lines = []
+        for histogram in self.histograms:
+            lines += histogram.exposition()
+        for name, help, value in self._gauge_values():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """Plain-data summary for the log file."""
+        snapshot = {"time": time.time()}
+        for histogram in self.histograms:
+            snapshot[histogram.name] = histogram.summary()
+        for name, _, value in self._gauge_values():
+            snapshot[name] = value
+        return snapshot
+
+
+REGISTRY = Registry()
+PHASES = REGISTRY.histogram("cvf_phase_seconds", "Duration of survey app phases", label="phase")
+STATE_BYTES = REGISTRY.histogram("cvf_session_state_bytes", "Pickled session-state size per rerun",
+                                 buckets=BYTES_BUCKETS)
+
+
+def observe(phase, seconds):
+    PHASES.observe(seconds, phase)
+
+
+@contextmanager
+def timed(phase):
+    """Record the duration of the with-block under phase (also when it raises)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASES.observe(time.perf_counter() - t0, phase)
+
+
+# ——————————————————
+# Reruns
+# ——————————————————
+_profiling = threading.Lock()  # one sampled rerun at a time
+_profile_seq = itertools.count(1)
+
+
+class Rerun:
+    """Timing of one script run: start_rerun() at the top, mark() after each segment, finish() at the end."""
+
+    def __init__(self, profile=False, measure_state=False):
+        self.started = self._last = time.perf_counter()
+        self.measure_state = measure_state
+        self._profiler = [_start_profiler() if profile else None]
+        if self._profiler[0] is not None:
+            # a rerun interrupted by a newer one never reaches finish(); free the profiling slot when it is dropped
+            weakref.finalize(self, _abandon_profile, self._profiler)
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        PHASES.observe(now - self._last, phase)
+        self._last = now
+
+    def finish(self, session_state=None):
+        PHASES.observe(time.perf_counter() - self.started, "rerun")
+        if session_state is not None and (self.measure_state or self._profiler[0] is not None):
+            size = _state_size(session_state)
+            if size is not None:
+                STATE_BYTES.observe(size)
+        profiler, self._profiler[0] = self._profiler[0], None
+        if profiler is not None:
+            _stop_profiler(profiler)
+
+
+def start_rerun():
+    _seen_session()
+    rate = float(os.getenv("CVF_PROFILE_SAMPLE", "0") or 0)
+    state_rate = float(os.getenv("CVF_STATE_SAMPLE", "0.01") or 0)
+    return Rerun(profile=rate > 0 and random.random() < rate,
+                 measure_state=state_rate > 0 and random.random() < state_rate)
+
+
+def _state_size(session_state):
+    import pickle
+
+    try:
+        return len(pickle.dumps({k: v for k, v in session_state.items()}, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return None  # something unpicklable in the state; not worth a fallback
+
+
+def _start_profiler():
+    if not _profiling.acquire(blocking=False):
+        return None
+    try:
+        if os.getenv("CVF_PROFILER", "cprofile").lower() == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+
+                profiler = Profiler()
+                profiler.start()
+                return profiler
+            except ImportError:
+                log.warning("CVF_PROFILER=pyinstrument but pyinstrument is not installed; using cProfile")
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    except BaseException:
+        _profiling.release()
+        raise
+
+
+def _abandon_profile(holder):
+    if holder[0] is not None:
+        holder[0] = None
+        _profiling.release()
+
+
+def _stop_profiler(profiler):
+    try:
+        directory = os.getenv("CVF_PROFILE_DIR") or os.path.join(os.getenv("CVF_DATA_DIR", ".cvf_data"), "profiles")
+        os.makedirs(directory, exist_ok=True)
+        stem = os.path.join(directory, f"rerun-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_profile_seq)}")
+        if hasattr(profiler, "disable"):
+            profiler.disable()
+            profiler.dump_stats(stem + ".prof")
+        else:
+            profiler.stop()
+            with open(stem + ".html", "w", encoding="utf-8") as f:
+                f.write(profiler.output_html())
+    except Exception:
+        log.warning("could not write the rerun profile", exc_info=True)
+    finally:
+        _profiling.release()
+
+
+# ——————————————————
+# Gauges
+# ——————————————————
+SESSION_IDLE = 300.0  # a session without a rerun for this long no longer counts as active in the fallback
+_sessions = {}  # session id -> time of its last rerun
+_sessions_pruned = 0.0  # monotonic time of the last pass dropping idle sessions
+_sessions_lock = threading.Lock()
+
+
+def _seen_session():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+        ctx = get_script_run_ctx(suppress_warning=True)
+    except Exception:
+        return
+    if ctx is not None:
+        now = time.monotonic()
+        with _sessions_lock:
+            _sessions[ctx.session_id] = now
+            # whether or not the gauge ever reads them, idle sessions don't pile up
+            if now - _sessions_pruned > SESSION_IDLE:
+                _prune_sessions(now)
+
+
+def _prune_sessions(now):
+    # called with _sessions_lock held
+    global _sessions_pruned
+    cutoff = now - SESSION_IDLE
+    for session_id in [s for s, seen in _sessions.items() if seen < cutoff]:
+        del _sessions[session_id]
+    _sessions_pruned = now
+
+
+def _active_sessions():
+    from streamlit import runtime
+
+    if not runtime.exists():
+        return None
+    # the connected count lives behind a private attribute; if a Streamlit release moves it,
+    # count the sessions that reran recently instead
+    try:
+        return runtime.get_instance()._session_mgr.num_active_sessions()
+    except Exception:
+        pass
+    with _sessions_lock:
+        _prune_sessions(time.monotonic())
+        return len(_sessions)
+
+
+REGISTRY.gauge("cvf_active_sessions", "Streamlit sessions connected to this process", _active_sessions)
+
+
+def watch_queue(queue):
+    """Export a SubmissionQueue's depth and counters (and its shared-queue writer's, if any)."""
+    for prefix, source in (("cvf_queue", queue), ("cvf_writer", queue.writer)):
+        if source is None:
+            continue
+        REGISTRY.gauge(f"{prefix}_pending", "Rows waiting to be written", source.pending)
+        for stat in ("batches", "rows", "retries", "quota_errors", "duplicates"):
+            REGISTRY.gauge(f"{prefix}_{stat}_total", f"{stat.replace('_', ' ').capitalize()} since start",
+                           lambda source=source, stat=stat: source.stats[stat])
+        if source.rate_limiter is not None:
+            limiter = source.rate_limiter
+            REGISTRY.gauge(f"{prefix}_limiter_waiting", "Writers waiting for a rate-limit token",
+                           lambda: limiter.metrics()["waiting"])
+            REGISTRY.gauge(f"{prefix}_limiter_per_minute", "Current write rate allowed by the limiter",
+                           lambda: limiter.metrics()["per_minute"])
+
+
+# ——————————————————
+# Exporters (once per process)
+# ——————————————————
+_started = False
+_start_lock = threading.Lock()
+
+
+def start_exporters():
+    """Start the endpoint and log writer configured in the environment; later calls do nothing."""
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+        port = os.getenv("CVF_METRICS_PORT")
+        if port:
+            serve(int(port))
+        path = os.getenv("CVF_METRICS_LOG")
+        if path:
+            write_log(path, float(os.getenv("CVF_METRICS_INTERVAL", "60")))
+
+
+def serve(port, host="0.0.0.0"):
+    """Serve REGISTRY at /metrics on a daemon thread; returns the server."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = REGISTRY.exposition().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="cvf-metrics", daemon=True).start()
+    log.info("metrics on http://%s:%d/metrics", host, server.server_address[1])
+    return server
+
+
+def write_log(path, interval):
+    """Append a JSON snapshot of REGISTRY to path every interval seconds on a daemon thread."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(REGISTRY.snapshot()) + "\n")
+            except Exception:
+                log.warning("could not write metrics to %s", path, exc_info=True)
+
+    thread = threading.Thread(target=run, name="cvf-metrics-log", daemon=True)
+    thread.start()
+    return thread
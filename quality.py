@@ -0,0 +1,453 @@
+"""
+Response quality checks: straight-lining, near-duplicate answers and submission bursts.
+
+Every response gets a bitmask of flags:
+
+    straight_line   the same allocation in every element (25/25/25/25 throughout,
+                    or 100 points on the same statement in all six)
+    low_variance    allocations that hardly change between elements: the per-statement
+                    standard deviation across elements averages under low_variance points
+    near_duplicate  identical, in all but at most one element, to an earlier response
+                    of the same demographic cell
+    burst           a response with burst_size - 1 or more earlier responses of its
+                    demographic cell in the burst_window seconds before it: the ones
+                    past the threshold, not the first (likely genuine) ones of the run.
+                    Informational: a busy team filling in together looks the same,
+                    so bursts are not excluded by default
+
+Near-duplicates come from a hashed index. Each response gets one 64-bit key per
+element: a hash of its demographic cell and its allocation vector with that
+element left out. Two responses that differ in at most one element share a key,
+so a response is a near-duplicate when any of its keys was seen before; pandas'
+hash table finds repeated keys in one linear pass. Bursts are counted over
+trailing windows of the responses sorted by cell and time, so a later
+submission never changes an earlier one's flag. Every check is whole-array
+NumPy work.
+
+Two ways to run it:
+
+    python quality.py score responses.parquet                  # a whole archive, in memory
+    python quality.py scan .cvf_data/app_responses.sqlite3     # a journal, incrementally
+
+``scan`` keeps the flags and the key index in the journal database and only
+scores rows added since the last scan (reading the recent rows a burst may
+count), so it can run as often as wanted; the survey apps run it in the
+background every CVF_QUALITY_INTERVAL seconds when that is set. Responses
+whose flags intersect the exclusion mask (``--exclude``, by default
+straight_line and near_duplicate) are taken out of the journal's aggregates (aggregates.py),
+so the admin dashboard and ``aggregates.py show`` no longer count them. The
+sheet and the journal keep every response.
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+
+from journal import ResponseJournal, of_version
+from survey_schema import load_survey, survey_path
+
+
+log = logging.getLogger(__name__)
+
+FLAGS = {"straight_line": 1, "low_variance": 2, "near_duplicate": 4, "burst": 8}
+STRAIGHT_LINE, LOW_VARIANCE, NEAR_DUPLICATE, BURST = FLAGS.values()
+DEFAULT_EXCLUDE = STRAIGHT_LINE | NEAR_DUPLICATE
+
+
+@dataclass(frozen=True)
+class Thresholds:
+    low_variance: float = 5.0   # points
+    burst_size: int = 4         # responses of one cell ...
+    burst_window: float = 60.0  # ... within this many seconds
+
+
+def flag_names(flags):
+    return [name for name, bit in FLAGS.items() if flags & bit]
+
+
+def parse_flags(names):
+    """Bitmask of flag names, e.g. ["straight_line", "burst"]."""
+    mask = 0
+    for name in names:
+        if name not in FLAGS:
+            raise ValueError(f"unknown quality flag {name!r} (expected one of {', '.join(FLAGS)})")
+        mask |= FLAGS[name]
+    return mask
+
+
+# ——————————————————
+# Checks on arrays
+# ——————————————————
+def _splitmix64(x):
+    x = (x + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return x ^ (x >> 31)
+
+
+@lru_cache(maxsize=None)
+def _multipliers(n):
+    # fixed odd 64-bit constants: keys stored by an earlier scan must stay valid
+    return np.array([_splitmix64(i) | 1 for i in range(n)], dtype=np.uint64)
+
+
+def cell_codes(demographics):
+    """One integer per response for its demographic cell; demographics is a list of (codes, n_categories).
+
+    A missing (negative) or unknown code gets its own bucket, so the codes stay stable between scans.
+    """
+    combined = None
+    for codes, n_categories in demographics:
+        codes = np.asarray(codes, dtype=np.int64)
+        codes = np.where((codes < 0) | (codes >= n_categories), n_categories, codes)
+        combined = codes if combined is None else combined * (n_categories + 1) + codes
+    return combined
+
+
+def straight_lined(allocations):
+    """(N,) True where every element has the same allocation; allocations is (N, elements, 4) in survey order."""
+    return (allocations == allocations[:, :1]).all(axis=(1, 2))
+
+
+def low_variance(allocations, threshold):
+    """(N,) True where the per-statement standard deviation across elements averages below threshold."""
+    return allocations.std(axis=1, dtype=np.float32).mean(axis=1) < threshold
+
+
+def near_duplicate_keys(allocations, cells):
+    """(N, elements) uint64 keys: a hash of the cell and the allocations with one element left out."""
+    n, n_elements, n_options = allocations.shape
+    slots = n_elements * n_options
+    m = _multipliers(slots + 1 + n_elements)
+    with np.errstate(over="ignore"):
+        # wrapping uint64 arithmetic is the hash
+        weighted = allocations.reshape(n, slots).astype(np.uint64) * m[:slots]
+        full = weighted.sum(axis=1, dtype=np.uint64) + cells.astype(np.uint64) * m[slots]
+        per_element = weighted.reshape(n, n_elements, n_options).sum(axis=2, dtype=np.uint64)
+        return full[:, None] - per_element + m[slots + 1:]
+
+
+def _repeated(keys, seen=()):
+    """(N,) True where a row's key repeats an earlier row's, or one of seen; keys is (N, K) in row order."""
+    import pandas as pd
+
+    flat = pd.Series(keys.view(np.int64).ravel())
+    repeated = flat.duplicated()
+    if len(seen):
+        repeated |= flat.isin(seen)
+    repeated = repeated.to_numpy()
+    return repeated.reshape(keys.shape).any(axis=1)
+
+
+def bursts(times, cells, size, window):
+    """(N,) True for every response preceded by `size` - 1 or more of its cell within `window` seconds."""
+    n = len(times)
+    result = np.zeros(n, dtype=bool)
+    if n < size or size < 1:
+        return result
+    order = np.lexsort((times, cells))
+    t = np.asarray(times, dtype=np.float64)[order]
+    t -= t.min()
+    # one sorted key over (cell, time); cells are spaced further apart than any window
+    key = cells[order].astype(np.float64) * (t.max() + window + 1) + t
+    start = np.searchsorted(key, key - window, side="left")
+    # the trailing window of each response; only the ones that fill it to size are flagged
+    result[order] = np.arange(n) - start + 1 >= size
+    return result
+
+
+def score(allocations, times, cells, thresholds=Thresholds(), seen_keys=()):
+    """uint8 flags for (N, elements, 4) allocations in survey order with their submit times and cell codes.
+
+    Rows must be in submission order: a near-duplicate is the later of two responses.
+    """
+    flags = np.zeros(len(allocations), dtype=np.uint8)
+    if not len(allocations):
+        return flags
+    flags[straight_lined(allocations)] |= STRAIGHT_LINE
+    flags[low_variance(allocations, thresholds.low_variance)] |= LOW_VARIANCE
+    flags[_repeated(near_duplicate_keys(allocations, cells), seen_keys)] |= NEAR_DUPLICATE
+    flags[bursts(times, cells, thresholds.burst_size, thresholds.burst_window)] |= BURST
+    return flags
+
+
+def score_archive(path, thresholds=Thresholds()):
+    """Flags of every response of a Parquet archive (response_store.py), in file order."""
+    import pyarrow.parquet as pq
+
+    from response_store import load_allocations
+
+    allocations, demographics, _ = load_allocations(path)
+    times = pq.read_table(path, columns=["timestamp"]).column("timestamp")
+    times = times.cast("int64").to_numpy(zero_copy_only=False) / 1000.0
+    cells = cell_codes([(codes, len(categories)) for codes, categories in demographics.values()])
+    order = np.argsort(times, kind="stable")
+    flags = np.empty(len(allocations), dtype=np.uint8)
+    flags[order] = score(allocations[order], times[order], cells[order], thresholds)
+    return flags
+
+
+# ——————————————————
+# Incremental scans of a journal
+# ——————————————————
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quality_flags (
+    version TEXT NOT NULL,
+    id      INTEGER NOT NULL,
+    flags   INTEGER NOT NULL,
+    PRIMARY KEY (version, id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS quality_keys (
+    version TEXT NOT NULL,
+    key     INTEGER NOT NULL,
+    PRIMARY KEY (version, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS quality_state (
+    version TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL,
+    exclude INTEGER NOT NULL
+);
+"""
+# quality_flags: flagged responses only; quality_keys: every near-duplicate key scanned so far
+
+
+class QualityIndex:
+    """Incremental quality scan of one survey's journal rows; pass the journal's ResponseAggregates to exclude.
+
+    Rows of other survey versions are skipped; untagged rows are taken to be
+    of legacy_version (default: the aggregates', else survey's own).
+    """
+
+    def __init__(self, survey, aggregates=None, thresholds=Thresholds(), legacy_version=None):
+        self.survey = survey
+        self.version = survey.version
+        self.legacy_version = legacy_version or getattr(aggregates, "legacy_version", None) or survey.version
+        self.aggregates = aggregates
+        self.thresholds = thresholds
+        self._demo_index = [survey.columns.index(d.column) for d in survey.demographics]
+        self._first_slot = len(survey.columns) - len(survey.slider_keys)
+
+    def attach(self, conn):
+        conn.executescript(SCHEMA)
+
+    def _state(self, conn):
+        row = conn.execute("SELECT last_id, exclude FROM quality_state WHERE version = ?", (self.version,)).fetchone()
+        return row if row else (0, DEFAULT_EXCLUDE)
+
+    def _parse(self, rows):
+        """Arrays of journal rows (id, created_at, survey_version, payload) of this survey: ids, times, allocations, cells, values."""
+        ids, times, values = [], [], []
+        for row_id, created_at, row_version, payload in rows:
+            if not of_version(row_version, self.version, self.legacy_version):
+                continue  # rows of other survey definitions are not scored
+            row = json.loads(payload)
+            if len(row) == len(self.survey.columns):
+                ids.append(row_id)
+                times.append(created_at)
+                values.append(row)
+        n_elements = len(self.survey.elements)
+        allocations = np.array(
+            [[int(float(v or 0)) for v in row[self._first_slot:]] for row in values], dtype=np.uint8
+        ).reshape(len(values), n_elements, len(self.survey.option_keys))
+        demographics = []
+        for d, i in zip(self.survey.demographics, self._demo_index):
+            lookup = {option: code for code, option in enumerate(d.options)}
+            demographics.append((np.array([lookup.get(row[i], -1) for row in values], dtype=np.int64), len(d.options)))
+        cells = cell_codes(demographics) if values else np.zeros(0, dtype=np.int64)
+        return np.array(ids, dtype=np.int64), np.array(times, dtype=np.float64), allocations, cells, values
+
+    def _seen(self, conn, keys):
+        seen = []
+        flat = keys.view(np.int64).ravel().tolist()
+        for start in range(0, len(flat), 900):
+            part = flat[start:start + 900]
+            seen += [k for (k,) in conn.execute(
+                f"SELECT key FROM quality_keys WHERE version = ? AND key IN ({','.join('?' * len(part))})",
+                (self.version, *part),
+            )]
+        return seen
+
+    def scan(self, conn, exclude=None, chunk_size=50_000):
+        """Score the journal rows added since the last scan; returns (rows scored, rows newly excluded)."""
+        conn.executescript(SCHEMA)
+        scored = excluded = 0
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                last_id, stored_exclude = self._state(conn)
+                if exclude is None:
+                    exclude = stored_exclude
+                elif exclude != stored_exclude:
+                    excluded += self._apply(conn, exclude)
+                chunk = conn.execute(
+                    "SELECT id, created_at, survey_version, payload FROM responses WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, chunk_size),
+                ).fetchall()
+                if not chunk:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO quality_state (version, last_id, exclude) VALUES (?, ?, ?)",
+                        (self.version, last_id, exclude),
+                    )
+                    conn.commit()
+                    return scored, excluded
+                n_new, n_excluded = self._scan_chunk(conn, chunk, last_id, exclude)
+                conn.execute(
+                    "INSERT OR REPLACE INTO quality_state (version, last_id, exclude) VALUES (?, ?, ?)",
+                    (self.version, chunk[-1][0], exclude),
+                )
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            scored += n_new
+            excluded += n_excluded
+
+    def _scan_chunk(self, conn, chunk, last_id, exclude):
+        ids, times, allocations, cells, values = self._parse(chunk)
+        if not len(ids):
+            return 0, 0
+        flags = np.zeros(len(ids), dtype=np.uint8)
+        flags[straight_lined(allocations)] |= STRAIGHT_LINE
+        flags[low_variance(allocations, self.thresholds.low_variance)] |= LOW_VARIANCE
+        keys = near_duplicate_keys(allocations, cells)
+        flags[_repeated(keys, self._seen(conn, keys))] |= NEAR_DUPLICATE
+        conn.executemany(
+            "INSERT OR IGNORE INTO quality_keys (version, key) VALUES (?, ?)",
+            [(self.version, k) for k in keys.view(np.int64).ravel().tolist()],
+        )
+
+        # earlier rows within one window of this chunk count toward its bursts; their own flags stay
+        context = conn.execute(
+            """SELECT id, created_at, survey_version, payload FROM responses
+               WHERE id <= ? AND created_at >= ? ORDER BY id""",
+            (last_id, float(times.min()) - self.thresholds.burst_window),
+        ).fetchall()
+        c_ids, c_times, _, c_cells, _ = self._parse(context)
+        in_burst = bursts(np.concatenate([c_times, times]), np.concatenate([c_cells, cells]),
+                          self.thresholds.burst_size, self.thresholds.burst_window)
+        flags[in_burst[len(c_ids):]] |= BURST
+
+        updates = [(row_id, int(f)) for row_id, f in zip(ids.tolist(), flags.tolist()) if f]
+        conn.executemany(
+            """INSERT INTO quality_flags (version, id, flags) VALUES (?, ?, ?)
+               ON CONFLICT (version, id) DO UPDATE SET flags = flags | excluded.flags""",
+            [(self.version, row_id, f) for row_id, f in updates],
+        )
+        newly = 0
+        if self.aggregates is not None:
+            by_id = dict(zip(ids.tolist(), values))
+            rows = [(row_id, by_id[row_id]) for row_id, f in updates if f & exclude]
+            newly = self.aggregates.exclude(conn, rows)
+        return len(ids), newly
+
+    def _apply(self, conn, exclude):
+        """Bring the aggregates' exclusions in line with a new exclusion mask; returns the change in excluded rows."""
+        if self.aggregates is None:
+            return 0
+        flagged = dict(conn.execute("SELECT id, flags FROM quality_flags WHERE version = ?", (self.version,)))
+        wanted = {row_id for row_id, f in flagged.items() if f & exclude}
+        current = self.aggregates.excluded_ids(conn) & set(flagged)
+        payloads = lambda ids: [
+            (row_id, json.loads(payload)) for row_id, payload in conn.execute(
+                f"SELECT id, payload FROM responses WHERE id IN ({','.join('?' * len(ids))})", list(ids)
+            )
+        ] if ids else []
+        removed = self.aggregates.exclude(conn, payloads(sorted(wanted - current)))
+        restored = self.aggregates.include(conn, payloads(sorted(current - wanted)))
+        return removed - restored
+
+    def counts(self, conn):
+        """Responses per flag, and how many are excluded from the aggregates."""
+        result = {name: 0 for name in FLAGS}
+        for flags, n in conn.execute(
+            "SELECT flags, COUNT(*) FROM quality_flags WHERE version = ? GROUP BY flags", (self.version,)
+        ):
+            for name in flag_names(flags):
+                result[name] += n
+        if self.aggregates is not None:
+            result["excluded"] = len(self.aggregates.excluded_ids(conn))
+        return result
+
+
+def start_scanner(journal_path, survey, interval, legacy_version=None):
+    """Scan journal_path every interval seconds on a daemon thread (one connection of its own)."""
+    from aggregates import ResponseAggregates
+
+    def run():
+        conn = sqlite3.connect(journal_path, timeout=30, isolation_level=None)
+        aggregates = ResponseAggregates(survey, legacy_version)
+        index = QualityIndex(survey, aggregates)
+        while True:
+            try:
+                scored, excluded = index.scan(conn)
+                if scored:
+                    log.info("quality scan: %d responses scored, %d excluded", scored, excluded)
+            except Exception:
+                log.warning("quality scan of %s failed", journal_path, exc_info=True)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="cvf-quality-scan", daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--survey", default=survey_path("cvf_v2.yaml"), help="survey definition of the responses")
+    parser.add_argument("--low-variance", type=float, default=Thresholds.low_variance)
+    parser.add_argument("--burst-size", type=int, default=Thresholds.burst_size)
+    parser.add_argument("--burst-window", type=float, default=Thresholds.burst_window)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("score", help="flag every response of a Parquet archive")
+    p.add_argument("archive")
+    p.add_argument("--output", help="write the flags, one uint8 per archive row, to this Parquet file")
+    p = sub.add_parser("scan", help="flag new journal rows and exclude flagged ones from the aggregates")
+    p.add_argument("journal")
+    p.add_argument("--exclude", nargs="*", choices=list(FLAGS),
+                   help="flags that exclude a response from the aggregates (default: the last scan's, "
+                        "initially straight_line and near_duplicate)")
+    args = parser.parse_args()
+    thresholds = Thresholds(args.low_variance, args.burst_size, args.burst_window)
+
+    if args.command == "score":
+        t0 = time.perf_counter()
+        flags = score_archive(args.archive, thresholds)
+        elapsed = time.perf_counter() - t0
+        print(f"{len(flags)} responses scored in {elapsed:.2f} s")
+        for name, bit in FLAGS.items():
+            print(f"  {name:<15} {int(np.count_nonzero(flags & bit)):>9,}")
+        print(f"  {'excluded':<15} {int(np.count_nonzero(flags & DEFAULT_EXCLUDE)):>9,}")
+        if args.output:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            pq.write_table(pa.table({"flags": flags}), args.output)
+        return
+
+    from aggregates import ResponseAggregates
+
+    if not os.path.exists(args.journal):
+        parser.error(f"no journal at {args.journal}")
+    survey = load_survey(args.survey)
+    ResponseJournal(args.journal)  # adds the survey_version column to journals written before it
+    conn = sqlite3.connect(args.journal, timeout=30, isolation_level=None)
+    aggregates = ResponseAggregates(survey)
+    aggregates.attach(conn)
+    index = QualityIndex(survey, aggregates, thresholds)
+    t0 = time.perf_counter()
+    scored, excluded = index.scan(conn, None if args.exclude is None else parse_flags(args.exclude))
+    print(f"scanned {scored} new responses in {time.perf_counter() - t0:.2f} s, {excluded:+d} excluded")
+    for name, n in index.counts(conn).items():
+        print(f"  {name:<15} {n:>9,}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Process-wide, adaptive rate limiting of writes to a quota-limited backend.
+
+Google Sheets allows a fixed number of write requests per minute per service
+account (60 by default), shared by every session and every submission queue of
+the process. RateLimiter is a token bucket refilled at that rate. Writers take
+a token before each append and wait in a priority queue while the bucket is
+empty, the one holding the oldest rows first, so pending rows drain in
+submission order as capacity returns.
+
+The rate adapts: a 429 halves it and pauses the bucket (for the server's
+Retry-After, or the caller's jittered backoff), and every successful write
+wins back a twentieth of the configured rate.
+
+    limiter = shared_limiter("sheets", 60)
+    limiter.acquire(priority=oldest_created_at)
+    ... append ... then limiter.reward() or limiter.penalize(pause)
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+
+
+SHEETS_WRITES_PER_MINUTE = int(os.getenv("CVF_SHEETS_WRITES_PER_MINUTE", "60"))
+
+
+class RateLimiter:
+    def __init__(self, per_minute, burst=None, min_per_minute=None, decrease=0.5, increase=0.05):
+        self.max_rate = per_minute / 60.0  # tokens per second
+        self.min_rate = (min_per_minute or max(1.0, per_minute / 10)) / 60.0
+        self.burst = burst or max(1, int(per_minute) // 4)
+        self.decrease = decrease
+        self.increase = increase
+
+        self._cond = threading.Condition()
+        self._rate = self.max_rate
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+        self.stats = {"granted": 0, "throttled": 0, "timeouts": 0, "wait_seconds": 0.0}
+
+    def acquire(self, priority=0.0, timeout=None):
+        """Wait for a token; lower priority values go first. Returns the seconds waited, or None on timeout."""
+        t0 = time.monotonic()
+        deadline = None if timeout is None else t0 + timeout
+        with self._cond:
+            me = (priority, next(self._seq))
+            heapq.heappush(self._waiters, me)
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self._waiters[0] == me and self._tokens >= 1 and now >= self._paused_until:
+                    heapq.heappop(self._waiters)
+                    self._tokens -= 1
+                    waited = now - t0
+                    self.stats["granted"] += 1
+                    self.stats["wait_seconds"] += waited
+                    self._cond.notify_all()  # the next in line recomputes its wait
+                    return waited
+                if deadline is not None and now >= deadline:
+                    self._waiters.remove(me)
+                    heapq.heapify(self._waiters)
+                    self.stats["timeouts"] += 1
+                    self._cond.notify_all()
+                    return None
+                if self._waiters[0] == me:
+                    delay = max(self._paused_until - now, (1 - self._tokens) / self._rate, 0.001)
+                else:
+                    delay = None  # woken when the writer ahead gets its token
+                if deadline is not None:
+                    delay = deadline - now if delay is None else min(delay, deadline - now)
+                self._cond.wait(delay)
+
+    def penalize(self, pause=0.0):
+        """The backend answered 429: slow down and hold every writer for pause seconds."""
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            self._rate = max(self.min_rate, self._rate * self.decrease)
+            self._tokens = 0.0
+            self._paused_until = max(self._paused_until, now + pause)
+            self.stats["throttled"] += 1
+            self._cond.notify_all()
+
+    def reward(self):
+        """A write went through: recover part of the configured rate."""
+        with self._cond:
+            self._refill(time.monotonic())
+            self._rate = min(self.max_rate, self._rate + self.max_rate * self.increase)
+
+    def metrics(self):
+        with self._cond:
+            self._refill(time.monotonic())
+            return {
+                **self.stats,
+                "per_minute": self._rate * 60,
+                "tokens": self._tokens,
+                "waiting": len(self._waiters),
+                "paused_for": max(0.0, self._paused_until - time.monotonic()),
+            }
+
+    def _refill(self, now):
+        start = max(self._updated, self._paused_until)  # no refill while paused
+        if now > start:
+            self._tokens = min(self.burst, self._tokens + (now - start) * self._rate)
+        self._updated = max(now, self._updated)
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_limiter(name, per_minute, **kwargs):
+    """The process's limiter for one quota, created on first use."""
+    with _shared_lock:
+        if name not in _shared:
+            _shared[name] = RateLimiter(per_minute, **kwargs)
+        return _shared[name]
+
+
+def limiter_for(backend):
+    """Shared limiter for backends that declare a write quota (writes_per_minute), else None."""
+    per_minute = getattr(backend, "writes_per_minute", None)
+    return shared_limiter(type(backend).__name__, per_minute) if per_minute else None
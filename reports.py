@@ -0,0 +1,279 @@
+"""
+One PDF culture report per Division and per Level (or any demographic column).
+
+The responses are aggregated once, up front: overall, per group and per
+group x other column. Those statistics are a few kilobytes, so they are
+handed to a process pool and every report is drawn from them without
+touching the responses again. Each report has:
+
+    page 1   group size, dominant culture, profile radar against all
+             responses, profile table
+    page 2   element x quadrant means and standard deviations, one radar
+             per element
+    page 3+  the group's profile broken down by each other column
+
+    python reports.py responses.parquet reports/
+    python reports.py .cvf_data/app_responses.sqlite3 reports/ --by Division Level --workers 4
+"""
+import argparse
+import os
+import re
+import sqlite3
+import textwrap
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+
+import numpy as np
+
+from charts import draw_radar
+from cvf_analysis import group_stats, load_responses
+from survey_schema import QUADRANTS, load_survey, survey_path
+
+
+A4 = (8.27, 11.69)
+
+
+@dataclass
+class ReportData:
+    version: str
+    elements: list
+    overall: object         # GroupStats of all responses
+    groups: dict            # column -> GroupStats by that column
+    crosses: dict           # (column, other) -> GroupStats by both
+
+
+def load_report_data(source, columns, survey=None):
+    """Aggregate an archive (.parquet) or a journal's aggregates once for all reports."""
+    if source.endswith(".parquet"):
+        responses = load_responses(source)
+        stats_of = lambda *by: group_stats(responses, *by)
+        version, elements = responses.version, responses.elements
+    else:
+        from aggregates import load_snapshot
+
+        snapshot = load_snapshot(source, survey)
+        stats_of = snapshot.group_stats
+        version, elements = survey.version, [e.name for e in survey.elements]
+    return ReportData(
+        version=version,
+        elements=list(elements),
+        overall=stats_of(),
+        groups={column: stats_of(column) for column in columns},
+        crosses={(column, other): stats_of(column, other)
+                 for column in columns for other in columns if other != column},
+    )
+
+
+def report_groups(data, min_count=1):
+    """(column, label) of every group with at least min_count responses."""
+    return [
+        (column, label)
+        for column, stats in data.groups.items()
+        for label, n in zip(stats.labels, stats.counts) if n >= min_count
+    ]
+
+
+def report_filename(column, label):
+    slug = re.sub(r"[^\w.-]+", "_", str(label)).strip("_")
+    return f"{column}_{slug}.pdf"
+
+
+# ——————————————————
+# Pages
+# ——————————————————
+def _page():
+    from matplotlib.figure import Figure
+
+    return Figure(figsize=A4, dpi=100)
+
+
+def _table(ax, rows, columns, row_labels, fontsize=8):
+    ax.axis("off")
+    table = ax.table(cellText=rows, colLabels=columns, rowLabels=row_labels, loc="upper center", cellLoc="center")
+    table.auto_set_font_size(False)
+    table.set_fontsize(fontsize)
+    table.scale(1, 1.3)
+    return table
+
+
+def _header(fig, column, label, subtitle=None):
+    """Column as a caption, the (possibly long) group label wrapped below it; returns the y below the header."""
+    fig.text(0.08, 0.96, column if subtitle is None else f"{column} · {subtitle}", fontsize=10, color="#444444")
+    lines = textwrap.wrap(str(label), 48)
+    fig.text(0.08, 0.945, "\n".join(lines), fontsize=16, weight="bold", va="top")
+    return 0.945 - 0.028 * len(lines)
+
+
+def _fmt(value, digits=1):
+    return "–" if np.isnan(value) else f"{value:.{digits}f}"
+
+
+def _summary_page(data, column, label):
+    stats = data.groups[column]
+    g = stats.labels.index(label)
+    n, total = int(stats.counts[g]), int(data.overall.counts[0])
+    profile, reference = stats.profile[g], data.overall.profile[0]
+    dominant = int(stats.dominant[g])
+
+    fig = _page()
+    y = _header(fig, column, label)
+    fig.text(0.08, y - 0.005, f"{n:,} responses ({n / max(total, 1):.0%} of {total:,}) · survey {data.version}",
+             fontsize=10, color="#444444")
+    fig.text(0.08, y - 0.04, f"Dominant culture: {QUADRANTS[dominant]} ({profile[dominant]:.1f} points)",
+             fontsize=13, color="#004d99", weight="bold")
+    shares = " · ".join(f"{q} {share:.0%}" for q, share in zip(QUADRANTS, stats.dominant_share[g]))
+    fig.text(0.08, y - 0.06, f"Respondents by their own dominant culture: {shares}", fontsize=9)
+
+    series = [("All responses", reference), (textwrap.shorten(str(label), 60), profile)]
+    draw_radar(fig.add_axes([0.2, 0.4, 0.6, 0.36], projection="polar"), "Culture profile", series, fontsize=9)
+
+    rows = [
+        [_fmt(profile[k]), _fmt(reference[k]), f"{profile[k] - reference[k]:+.1f}", f"{stats.dominant_share[g, k]:.0%}"]
+        for k in range(len(QUADRANTS))
+    ]
+    _table(fig.add_axes([0.2, 0.06, 0.7, 0.22]), rows,
+           ["Group", "All responses", "Difference", "Dominant for"], list(QUADRANTS), fontsize=9)
+    return fig
+
+
+def _elements_page(data, column, label):
+    stats = data.groups[column]
+    g = stats.labels.index(label)
+    means, std, reference = stats.means[g], stats.std[g], data.overall.means[0]
+
+    fig = _page()
+    y = _header(fig, column, label, "elements (mean ± standard deviation)")
+    rows = [[f"{_fmt(means[e, k])} ± {_fmt(std[e, k])}" for k in range(len(QUADRANTS))]
+            for e in range(len(data.elements))]
+    _table(fig.add_axes([0.3, y - 0.22, 0.62, 0.2]), rows, list(QUADRANTS), data.elements)
+
+    cols = 3
+    for e, element in enumerate(data.elements):
+        row, col = divmod(e, cols)
+        ax = fig.add_axes([0.09 + col * 0.31, 0.4 - row * 0.3, 0.2, 0.2], projection="polar")
+        draw_radar(ax, element, [("All responses", reference[e]), (str(label), means[e])], legend=False, fontsize=6)
+        ax.set_yticklabels([])
+    fig.legend(handles=ax.lines, labels=["All responses", textwrap.shorten(str(label), 60)],
+               loc="lower center", fontsize=8)
+    return fig
+
+
+def _breakdown_page(data, column, label, other):
+    stats = data.crosses[(column, other)]
+    rows, row_labels = [], []
+    for g, (first, second) in enumerate(stats.labels):
+        if first != label or not stats.counts[g]:
+            continue
+        dominant = int(stats.dominant[g])
+        rows.append([f"{stats.counts[g]:,}", *(_fmt(v) for v in stats.profile[g]), QUADRANTS[dominant]])
+        row_labels.append(str(second)[:40])
+    if not rows:
+        return None
+
+    fig = _page()
+    y = _header(fig, column, label, f"by {other}")
+    _table(fig.add_axes([0.38, 0.05, 0.58, y - 0.07]), rows, ["n", *QUADRANTS, "Dominant"], row_labels)
+    return fig
+
+
+def write_report(data, column, label, path):
+    """Write the PDF report of one group to path (atomically)."""
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    partial = f"{path}.{os.getpid()}-{threading.get_ident()}.partial"
+    # no creation date, so the same data gives the same file
+    metadata = {"Title": f"CVF report – {column}: {label}", "CreationDate": None}
+    try:
+        with PdfPages(partial, metadata=metadata) as pdf:
+            pdf.savefig(_summary_page(data, column, label))
+            pdf.savefig(_elements_page(data, column, label))
+            for other in data.groups:
+                page = _breakdown_page(data, column, label, other) if other != column else None
+                if page is not None:
+                    pdf.savefig(page)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    os.replace(partial, path)
+    return path
+
+
+# ——————————————————
+# Batch
+# ——————————————————
+_DATA = None
+
+
+def _init_worker(data):
+    global _DATA
+    _DATA = data
+
+
+def _report_task(column, label, path):
+    t0 = time.perf_counter()
+    write_report(_DATA, column, label, path)
+    return column, label, path, time.perf_counter() - t0
+
+
+def write_reports(data, output_dir, groups, workers=None, on_report=None):
+    """Write a report per (column, label) into output_dir; the statistics are sent to each worker once.
+
+    on_report(done, total, column, label, path, seconds) is called as reports finish.
+    Returns the per-report seconds.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = [(column, label, os.path.join(output_dir, report_filename(column, label))) for column, label in groups]
+    workers = min(workers or os.cpu_count(), len(tasks))
+    seconds = []
+
+    def finished(result):
+        seconds.append(result[3])
+        if on_report is not None:
+            on_report(len(seconds), len(tasks), *result)
+
+    if workers <= 1:
+        _init_worker(data)
+        for task in tasks:
+            finished(_report_task(*task))
+        return seconds
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data,)) as pool:
+        for future in as_completed([pool.submit(_report_task, *task) for task in tasks]):
+            finished(future.result())
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="response_store.py archive (.parquet) or response journal (.sqlite3)")
+    parser.add_argument("output_dir")
+    parser.add_argument("--by", nargs="+", default=["Division", "Level"], help="one report per group of each column")
+    parser.add_argument("--min-count", type=int, default=1, help="skip groups with fewer responses")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--survey", default=survey_path("cvf_v2.yaml"), help="survey definition of a journal")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    survey = None if args.source.endswith(".parquet") else load_survey(args.survey)
+    try:
+        data = load_report_data(args.source, args.by, survey)
+    except sqlite3.OperationalError as e:
+        parser.error(f"cannot read the aggregates of {args.source} ({e}); run: python aggregates.py rebuild {args.source}")
+    groups = report_groups(data, args.min_count)
+    loaded = time.perf_counter() - started
+    print(f"aggregated {int(data.overall.counts[0]):,} responses in {loaded:.1f} s, {len(groups)} reports")
+
+    def progress(done, total, column, label, path, seconds):
+        print(f"[{done:>{len(str(total))}}/{total}] {seconds:5.1f} s  {os.path.basename(path)}")
+
+    seconds = write_reports(data, args.output_dir, groups, args.workers, progress)
+    elapsed = time.perf_counter() - started
+    if seconds:
+        print(f"{len(seconds)} reports in {args.output_dir} in {elapsed:.1f} s "
+              f"(load {loaded:.1f} s, per report mean {np.mean(seconds):.1f} s, max {max(seconds):.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
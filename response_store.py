@@ -0,0 +1,250 @@
+"""
+Columnar archive of survey responses (Parquet).
+
+Layout of one archive file:
+
+    timestamp     timestamp[ms, UTC]
+    Division ...  dictionary<int16, string>, one column per demographic, the
+                  dictionary seeded with the survey's own options so codes are
+                  stable across files
+    allocations   fixed_size_list<uint8>[elements x 4], the points in survey
+                  element order with the four options of each element adjacent
+    Submission ID string, the submission's idempotency key (journal.py); null for
+                  rows that never had one (older sheets, CSV exports)
+
+The file metadata records the survey version, element names, option keys and
+quadrants, so ``load_allocations`` can hand back an (N, elements, 4) uint8 array
+without knowing which survey produced it. An archive may also be a directory of
+such files, as the parquet storage backend writes them (storage.py); its part
+files are read in name order.
+
+    python response_store.py from-journal .cvf_data/app_responses.sqlite3 responses.parquet
+    python response_store.py from-csv "CVF Survey - Sheet1.csv" responses.parquet
+    python response_store.py from-sheet --credentials service_account.json responses.parquet
+    python response_store.py info responses.parquet
+"""
+import argparse
+import csv
+import json
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from survey_schema import SUBMISSION_ID_COLUMN, load_survey, survey_path
+
+
+METADATA_KEY = b"cvf"
+SPREADSHEET_ID = "1MxlsC3f3pvBhdkYYQj5B7Q-ShqPK7ZLOFtE1d2VNKJ0"
+# int16 codes: room for 32767 answers per demographic (free text, a longer division list); int8 stopped at 127
+DICTIONARY_INDEX = pa.int16()
+
+
+def arrow_schema(survey):
+    fields = [pa.field("timestamp", pa.timestamp("ms", tz="UTC"))]
+    fields += [pa.field(d.column, pa.dictionary(DICTIONARY_INDEX, pa.string())) for d in survey.demographics]
+    fields.append(pa.field("allocations", pa.list_(pa.uint8(), len(survey.slider_keys))))
+    fields.append(pa.field(SUBMISSION_ID_COLUMN, pa.string()))
+    meta = {
+        "version": survey.version,
+        "elements": [e.name for e in survey.elements],
+        "option_keys": list(survey.option_keys),
+        "quadrants": list(survey.quadrants),
+    }
+    return pa.schema(fields, metadata={METADATA_KEY: json.dumps(meta, ensure_ascii=False).encode("utf-8")})
+
+
+def _parse_timestamp(value):
+    if isinstance(value, datetime):
+        ts = value
+    elif value in (None, ""):
+        return None
+    else:
+        ts = datetime.fromisoformat(str(value))
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts
+
+
+def _dictionary_column(values, categories):
+    lookup = {c: i for i, c in enumerate(categories)}
+    extra = []
+    codes = np.empty(len(values), dtype=np.int16)
+    mask = np.zeros(len(values), dtype=bool)
+    for i, v in enumerate(values):
+        if v is None or v == "":
+            mask[i] = True
+            codes[i] = 0
+            continue
+        code = lookup.get(v)
+        if code is None:
+            # a label the current survey no longer offers; keep it rather than drop the response
+            code = lookup[v] = len(categories) + len(extra)
+            if code > np.iinfo(np.int16).max:
+                raise ValueError(f"more than {np.iinfo(np.int16).max + 1} distinct answers in one demographic column")
+            extra.append(v)
+        codes[i] = code
+    indices = pa.array(codes, mask=mask, type=DICTIONARY_INDEX)
+    return pa.DictionaryArray.from_arrays(indices, pa.array(list(categories) + extra, type=pa.string()))
+
+
+def rows_to_table(survey, rows):
+    """Encode rows (build_row() dicts, or lists in survey.storage_columns order) as an Arrow table.
+
+    Lists may stop after the survey columns; their submission id is then null.
+    """
+    rows = [r if isinstance(r, dict) else dict(zip(survey.storage_columns, r)) for r in rows]
+    n_values = len(survey.slider_keys)
+
+    alloc = np.empty((len(rows), n_values), dtype=np.int16)
+    for i, r in enumerate(rows):
+        alloc[i] = [int(float(r.get(k) or 0)) for k in survey.slider_keys]
+    if alloc.size and (alloc.min() < 0 or alloc.max() > 100):
+        raise ValueError("allocation values must be between 0 and 100")
+    flat = pa.array(alloc.astype(np.uint8).ravel(), type=pa.uint8())
+
+    arrays = [pa.array([_parse_timestamp(r.get("Timestamp")) for r in rows], type=pa.timestamp("ms", tz="UTC"))]
+    for d in survey.demographics:
+        arrays.append(_dictionary_column([r.get(d.column) for r in rows], d.options))
+    arrays.append(pa.FixedSizeListArray.from_arrays(flat, n_values))
+    arrays.append(pa.array([r.get(SUBMISSION_ID_COLUMN) or None for r in rows], type=pa.string()))
+    return pa.Table.from_arrays(arrays, schema=arrow_schema(survey))
+
+
+class ArchiveWriter:
+    """Append batches of rows to one Parquet file, one row group per batch."""
+
+    def __init__(self, path, survey, compression="zstd"):
+        self.survey = survey
+        self.path = path
+        self._writer = pq.ParquetWriter(path, arrow_schema(survey), compression=compression)
+
+    def write_rows(self, rows):
+        if rows:
+            self._writer.write_table(rows_to_table(self.survey, rows))
+
+    def close(self):
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_archive(path, survey, rows, chunk_size=50_000):
+    with ArchiveWriter(path, survey) as writer:
+        for start in range(0, len(rows), chunk_size):
+            writer.write_rows(rows[start:start + chunk_size])
+
+
+def archive_files(path):
+    """The Parquet files of an archive: the file itself, or a directory's part files in name order."""
+    if not os.path.isdir(path):
+        return [path]
+    files = sorted(name for name in os.listdir(path) if name.endswith(".parquet") and not name.startswith((".", "_")))
+    if not files:
+        raise FileNotFoundError(f"no parquet files in {path}")
+    return [os.path.join(path, name) for name in files]
+
+
+def archive_schema(path):
+    return pq.read_schema(archive_files(path)[0])
+
+
+def archive_metadata(path_or_table):
+    schema = path_or_table.schema if isinstance(path_or_table, pa.Table) else archive_schema(path_or_table)
+    return json.loads(schema.metadata[METADATA_KEY])
+
+
+def allocations_array(table):
+    """(N, elements, 4) uint8 view of the allocations column."""
+    meta = archive_metadata(table)
+    col = table.column("allocations").combine_chunks()
+    values = col.flatten().to_numpy(zero_copy_only=False)
+    return values.reshape(len(table), len(meta["elements"]), len(meta["option_keys"]))
+
+
+def load_allocations(path, demographics=None):
+    """Read an archive: returns (allocations N x elements x 4, {column: (codes, categories)}, metadata)."""
+    meta = archive_metadata(path)
+    if demographics is None:
+        skip = ("timestamp", "allocations", SUBMISSION_ID_COLUMN)
+        demographics = [name for name in archive_schema(path).names if name not in skip]
+    table = pq.read_table(path, columns=["allocations", *demographics])
+    # row groups written from different batches may carry differently grown dictionaries
+    table = table.unify_dictionaries()
+    demo = {}
+    for name in table.column_names:
+        if name == "allocations":
+            continue
+        col = table.column(name).combine_chunks()
+        # codes are int16 (int8 in older archives) with -1 for a missing answer
+        demo[name] = (col.indices.fill_null(-1).to_numpy(), col.dictionary.to_pylist())
+    return allocations_array(table), demo, meta
+
+
+# ——————————————————
+# Importers
+# ——————————————————
+def rows_from_journal(journal_path):
+    from journal import ResponseJournal
+
+    return [row for _, row in ResponseJournal(journal_path).iter_stored()]
+
+
+def rows_from_csv(csv_path):
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        return [dict(r) for r in csv.DictReader(f)]
+
+
+def rows_from_sheet(credentials_path, spreadsheet_id=SPREADSHEET_ID):
+    import gspread
+
+    client = gspread.service_account(filename=credentials_path)
+    return client.open_by_key(spreadsheet_id).sheet1.get_all_records()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--survey", default=survey_path("cvf_v2.yaml"), help="survey definition of the rows")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("from-journal", help="archive every row of a local response journal")
+    p.add_argument("journal")
+    p.add_argument("output")
+    p = sub.add_parser("from-csv", help="archive a CSV export of the sheet (header row required)")
+    p.add_argument("csv")
+    p.add_argument("output")
+    p = sub.add_parser("from-sheet", help="pull the Google Sheet with a service account key and archive it")
+    p.add_argument("--credentials", required=True)
+    p.add_argument("--spreadsheet-id", default=SPREADSHEET_ID)
+    p.add_argument("output")
+    p = sub.add_parser("info", help="print the size and layout of an archive")
+    p.add_argument("archive")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        meta = archive_metadata(args.archive)
+        files = archive_files(args.archive)
+        num_rows = sum(pq.ParquetFile(f).metadata.num_rows for f in files)
+        print(f"{args.archive}: {num_rows} responses in {len(files)} file(s), survey {meta['version']}, "
+              f"{sum(os.path.getsize(f) for f in files) / 1024:.1f} KiB")
+        print(archive_schema(args.archive))
+        return
+
+    survey = load_survey(args.survey)
+    if args.command == "from-journal":
+        rows = rows_from_journal(args.journal)
+    elif args.command == "from-csv":
+        rows = rows_from_csv(args.csv)
+    else:
+        rows = rows_from_sheet(args.credentials, args.spreadsheet_id)
+    write_archive(args.output, survey, rows)
+    print(f"wrote {len(rows)} responses to {args.output} ({os.path.getsize(args.output) / 1024:.1f} KiB)")
+
+
+if __name__ == "__main__":
+    main()
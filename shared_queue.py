@@ -0,0 +1,241 @@
+"""
+Submission queue shared by several replicas of a survey app, drained by one writer.
+
+With CVF_SHARED_QUEUE unset every process writes its own journal to storage,
+which is right for a single instance. Behind a load balancer, set it on every
+replica:
+
+    sqlite:////srv/cvf/queue.sqlite3  a SQLite file on a volume all replicas mount
+                                      (one host or a filesystem with working locks, not NFS)
+    redis://cache:6379/0              a Redis server (needs the redis package)
+
+Each replica still commits submissions to its local journal first. Its
+SubmissionQueue then forwards them to the shared queue, which keeps one entry
+per submission id (journal.py), so a row replayed after a crash or sent by two
+replicas is stored once. Every replica also runs a writer queue that drains the
+shared queue into the storage backend, but only while it holds the queue's
+lease; the lease expires when its holder stops renewing it, and another
+replica takes over. A single writer also keeps the whole deployment inside one
+Sheets write quota (ratelimit.py), however many replicas take submissions.
+
+The one window for a duplicate in the sheet is a writer that loses its lease
+in the middle of an append (paused for longer than lease_seconds); the
+Submission ID column identifies such rows.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from journal import new_submission_id
+from submission_queue import SubmissionQueue
+
+
+LEASE_SECONDS = 60
+
+
+def default_owner():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Lease:
+    """Exclusive, expiring right to drain a shared queue; SubmissionQueue renews it before every batch."""
+
+    def __init__(self, queue, owner=None, seconds=LEASE_SECONDS):
+        self.queue = queue
+        self.owner = owner or default_owner()
+        self.seconds = seconds
+
+    def hold(self):
+        """Take or renew the lease; False while another replica holds it."""
+        return self.queue.acquire_lease(self.owner, self.seconds)
+
+    def release(self):
+        self.queue.release_lease(self.owner)
+
+
+# ——————————————————
+# SQLite
+# ——————————————————
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue (
+    seq           INTEGER PRIMARY KEY AUTOINCREMENT,
+    submission_id TEXT NOT NULL UNIQUE,
+    queued_at     REAL NOT NULL,
+    payload       TEXT NOT NULL,
+    sent_at       REAL
+);
+CREATE INDEX IF NOT EXISTS queue_unsent ON queue(seq) WHERE sent_at IS NULL;
+CREATE TABLE IF NOT EXISTS lease (
+    name       TEXT PRIMARY KEY,
+    owner      TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class SQLiteSharedQueue:
+    """Shared queue in one SQLite file. Sent entries are kept, so their ids keep deduplicating."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(SQLITE_SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    # storage backend side: the replicas' SubmissionQueues append here
+    def append_rows(self, rows):
+        now = time.time()
+        with self._conn() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO queue (submission_id, queued_at, payload) VALUES (?, ?, ?)",
+                [(row[-1] or new_submission_id(), now, json.dumps(list(row), ensure_ascii=False)) for row in rows],
+            )
+
+    # journal side: the writer's SubmissionQueue drains from here
+    def unsent(self, limit):
+        cur = self._conn().execute(
+            "SELECT seq, payload FROM queue WHERE sent_at IS NULL ORDER BY seq LIMIT ?", (limit,)
+        )
+        return [(seq, json.loads(payload)) for seq, payload in cur.fetchall()]
+
+    def oldest_unsent_at(self):
+        row = self._conn().execute(
+            "SELECT queued_at FROM queue WHERE sent_at IS NULL ORDER BY seq LIMIT 1"
+        ).fetchone()
+        return row[0] if row else None
+
+    def count_unsent(self):
+        return self._conn().execute("SELECT COUNT(*) FROM queue WHERE sent_at IS NULL").fetchone()[0]
+
+    def mark_sent(self, seqs):
+        with self._conn() as conn:
+            conn.executemany("UPDATE queue SET sent_at = ? WHERE seq = ?", [(time.time(), s) for s in seqs])
+
+    def acquire_lease(self, owner, seconds):
+        conn = self._conn()
+        now = time.time()
+        # IMMEDIATE: the read and the takeover are one write transaction
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT owner, expires_at FROM lease WHERE name = 'writer'").fetchone()
+            if row is not None and row[0] != owner and row[1] > now:
+                conn.rollback()
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO lease (name, owner, expires_at) VALUES ('writer', ?, ?)", (owner, now + seconds)
+            )
+            conn.commit()
+            return True
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def release_lease(self, owner):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM lease WHERE name = 'writer' AND owner = ?", (owner,))
+
+
+# ——————————————————
+# Redis
+# ——————————————————
+_PUSH = """
+for i = 1, #ARGV, 2 do
+    if redis.call('HSETNX', KEYS[1], ARGV[i], 1) == 1 then
+        redis.call('RPUSH', KEYS[2], ARGV[i + 1])
+    end
+end
+"""
+_ACQUIRE = """
+local owner = redis.call('GET', KEYS[1])
+if not owner or owner == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+return 0
+"""
+_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisSharedQueue:
+    """Shared queue in Redis: a list of pending entries, a hash of every submission id seen, a lease key.
+
+    Only the lease holder removes entries, always from the head, so a drained
+    batch is acknowledged by trimming that many entries.
+    """
+
+    def __init__(self, url, prefix="cvf"):
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self._seen, self._pending, self._lease = f"{prefix}:seen", f"{prefix}:pending", f"{prefix}:lease"
+        self._push = self._redis.register_script(_PUSH)
+        self._acquire = self._redis.register_script(_ACQUIRE)
+        self._release = self._redis.register_script(_RELEASE)
+
+    def append_rows(self, rows):
+        now = time.time()
+        args = []
+        for row in rows:
+            args += [row[-1] or new_submission_id(), json.dumps({"queued_at": now, "row": list(row)}, ensure_ascii=False)]
+        if args:
+            self._push(keys=[self._seen, self._pending], args=args)
+
+    def unsent(self, limit):
+        entries = self._redis.lrange(self._pending, 0, limit - 1)
+        return [(i, json.loads(entry)["row"]) for i, entry in enumerate(entries)]
+
+    def oldest_unsent_at(self):
+        entry = self._redis.lindex(self._pending, 0)
+        return json.loads(entry)["queued_at"] if entry is not None else None
+
+    def count_unsent(self):
+        return self._redis.llen(self._pending)
+
+    def mark_sent(self, positions):
+        # positions are the head of the list, as returned by unsent()
+        self._redis.ltrim(self._pending, len(positions), -1)
+
+    def acquire_lease(self, owner, seconds):
+        return bool(self._acquire(keys=[self._lease], args=[owner, int(seconds * 1000)]))
+
+    def release_lease(self, owner):
+        self._release(keys=[self._lease], args=[owner])
+
+
+def shared_queue_from_env():
+    """The shared queue named by CVF_SHARED_QUEUE, None when unset (single instance)."""
+    url = os.getenv("CVF_SHARED_QUEUE", "").strip()
+    if not url:
+        return None
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSharedQueue(url, prefix=os.getenv("CVF_SHARED_QUEUE_PREFIX", "cvf"))
+    if url.startswith("sqlite:///"):
+        return SQLiteSharedQueue(url[len("sqlite:///"):])
+    raise RuntimeError(f"Unknown CVF_SHARED_QUEUE {url!r} (expected sqlite:///<path> or redis://...)")
+
+
+def submission_queue(backend, journal, **kwargs):
+    """This process's SubmissionQueue: straight to backend, or through CVF_SHARED_QUEUE and its single writer."""
+    shared = shared_queue_from_env()
+    if shared is None:
+        return SubmissionQueue(backend, journal, **kwargs)
+    queue = SubmissionQueue(shared, journal, **kwargs)
+    queue.writer = SubmissionQueue(backend, shared, lease=Lease(shared), **kwargs)
+    return queue
@@ -0,0 +1,234 @@
+"""
+Pooled Google Sheets clients for the Sheets storage backend.
+
+SheetsClientPool keeps a few authorized gspread clients for one service
+account. They share a single google-auth credentials object, so there is one
+access token, and maintain() refreshes it ahead of expiry from a background
+thread (startup.py) instead of inside a write. Each client has its own
+keep-alive HTTP session. A client whose request fails with anything but a
+quota or server error (a rejected token, a dropped or stale connection) is
+closed and replaced by a fresh one, and maintain() also probes clients that
+sat idle, so one stale connection costs at most one failed flush, which the
+submission queue retries, instead of failing every submit until a restart.
+
+gspread and google-auth are imported by the first connection, not when a
+Streamlit process renders its first page.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from metrics import timed
+
+
+SCOPES = [
+    "https://spreadsheets.google.com/feeds",
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive.file",
+    "https://www.googleapis.com/auth/drive",
+]
+SPREADSHEET_ID = "1MxlsC3f3pvBhdkYYQj5B7Q-ShqPK7ZLOFtE1d2VNKJ0"
+SHEETS_API = "https://sheets.googleapis.com"
+DEFAULT_POOL_SIZE = int(os.getenv("CVF_SHEETS_POOL_SIZE", "2"))
+
+
+def status_code(exc):
+    """HTTP status of a failed gspread call, None when no response came back."""
+    return getattr(getattr(exc, "response", None), "status_code", None)
+
+
+def breaks_client(exc):
+    # quota and server errors say nothing about the client; anything else (401/403,
+    # connection reset, timeout on a stale keep-alive connection) is not worth reusing
+    status = status_code(exc)
+    return not (status == 429 or (status is not None and status >= 500))
+
+
+@dataclass
+class _Client:
+    worksheet: object
+    last_ok: float  # time.monotonic() of the last successful request
+
+
+class SheetsClientPool:
+    def __init__(self, service_account_info, spreadsheet_id=SPREADSHEET_ID, size=DEFAULT_POOL_SIZE,
+                 refresh_margin=300, probe_after=120, base_url=None):
+        self._info = dict(service_account_info)
+        self.spreadsheet_id = spreadsheet_id
+        self.size = size
+        self.refresh_margin = refresh_margin  # refresh the token when it expires within this many seconds
+        self.probe_after = probe_after        # probe clients idle for longer than this before reuse
+        self.base_url = base_url              # a Sheets-compatible server instead of Google (fake_sheets.py)
+
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._idle = []   # most recently used last
+        self._open = 0    # clients created and not yet discarded
+        self._token_lock = threading.Lock()
+        self._credentials = None
+        self.stats = {"created": 0, "discarded": 0, "token_refreshes": 0, "probes": 0, "probe_failures": 0}
+
+    # ——————————————————
+    # Borrowing
+    # ——————————————————
+    @contextmanager
+    def worksheet(self):
+        """Borrow a worksheet for one or more requests; a client that fails in a way that breaks it is replaced."""
+        client = self._acquire()
+        try:
+            yield client.worksheet
+        except Exception as e:
+            if status_code(e) == 401:
+                self._refresh_quietly()
+            self._release(client, broken=breaks_client(e))
+            raise
+        client.last_ok = time.monotonic()
+        self._release(client)
+
+    def _acquire(self):
+        with self._available:
+            while not self._idle and self._open >= self.size:
+                self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._open += 1
+        try:
+            return self._connect()
+        except BaseException:
+            with self._available:
+                self._open -= 1
+                self._available.notify()
+            raise
+
+    def _release(self, client, broken=False):
+        if broken:
+            self._close(client)
+        with self._available:
+            if broken:
+                self._open -= 1
+                self.stats["discarded"] += 1
+            else:
+                self._idle.append(client)
+            self._available.notify()
+
+    # ——————————————————
+    # Connections and token
+    # ——————————————————
+    def credentials(self):
+        with self._token_lock:
+            if self._credentials is None:
+                from google.oauth2.service_account import Credentials
+
+                self._credentials = Credentials.from_service_account_info(self._info, scopes=SCOPES)
+            return self._credentials
+
+    def _session(self):
+        from google.auth.transport.requests import AuthorizedSession
+
+        base_url = self.base_url
+
+        class Session(AuthorizedSession):
+            def request(self, method, url, *args, **kwargs):
+                if base_url and url.startswith(SHEETS_API):
+                    url = base_url.rstrip("/") + url[len(SHEETS_API):]
+                return super().request(method, url, *args, **kwargs)
+
+        # a requests session: keeps its connections alive between appends
+        return Session(self.credentials())
+
+    def _connect(self):
+        import gspread
+
+        with timed("connect_gsheets"):
+            self.refresh_token()
+            client = gspread.authorize(None, session=self._session())
+            worksheet = client.open_by_key(self.spreadsheet_id).sheet1
+        with self._lock:
+            self.stats["created"] += 1
+        return _Client(worksheet, time.monotonic())
+
+    def _close(self, client):
+        try:
+            client.worksheet.client.session.close()
+        except Exception:
+            pass
+
+    def refresh_token(self, force=False):
+        """Fetch a new access token if there is none or it expires within refresh_margin. Returns True if fetched."""
+        creds = self.credentials()
+        with self._token_lock:
+            expiry = creds.expiry  # naive UTC, None before the first token
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            if not force and creds.token and expiry is not None and expiry - now > timedelta(seconds=self.refresh_margin):
+                return False
+            from google.auth.transport.requests import Request
+
+            creds.refresh(Request())
+            self.stats["token_refreshes"] += 1
+            return True
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh_token(force=True)
+        except Exception:
+            pass  # the next write or maintain() tries again
+
+    # ——————————————————
+    # Maintenance (startup.py calls maintain() periodically)
+    # ——————————————————
+    def warm_up(self):
+        """Open the pool's clients ahead of the first write."""
+        self._top_up()
+
+    def maintain(self):
+        """Refresh the token ahead of expiry, probe idle clients and replace the ones that were dropped."""
+        self.refresh_token()
+        self.probe()
+        self._top_up()
+
+    def probe(self):
+        """Check clients idle for probe_after seconds with a metadata read; broken ones are replaced. Returns failures."""
+        now = time.monotonic()
+        with self._lock:
+            stale = [c for c in self._idle if now - c.last_ok >= self.probe_after]
+            self._idle = [c for c in self._idle if c not in stale]
+        failures = 0
+        for client in stale:
+            try:
+                client.worksheet.spreadsheet.fetch_sheet_metadata({"fields": "spreadsheetId"})
+            except Exception as e:
+                failures += 1
+                self._release(client, broken=True)
+                if status_code(e) == 401:
+                    self._refresh_quietly()
+                continue
+            client.last_ok = time.monotonic()
+            self._release(client)
+        with self._lock:
+            self.stats["probes"] += len(stale)
+            self.stats["probe_failures"] += failures
+        return failures
+
+    def _top_up(self):
+        with self._lock:
+            missing = self.size - self._open
+            self._open += missing
+        for n in range(missing):
+            try:
+                client = self._connect()
+            except BaseException:
+                with self._available:
+                    self._open -= missing - n
+                    self._available.notify_all()
+                raise
+            self._release(client)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for client in idle:
+            self._close(client)
@@ -0,0 +1,69 @@
+"""
+Once-per-process startup work of the survey apps, moved off the request path.
+
+The apps call warm_up() at the end of their first script run (through
+st.cache_resource, so once per process). A background thread then builds the
+submission queue, which imports NumPy for the aggregates, opens the journal
+and replays any rows the aggregates missed, and connects the storage backend
+(Google Sheets: imports, OAuth token, spreadsheet lookup). None of that runs
+before the first page is on screen or inside the first participant's submit.
+Afterwards the thread calls the backend's maintain() every maintain_interval
+seconds: token refresh ahead of expiry and client health checks (sheets.py).
+The metrics endpoint and log (metrics.py), when configured, start here too,
+and so does the periodic quality scan of the journal (quality.py) when
+CVF_QUALITY_INTERVAL is set.
+"""
+import logging
+import os
+import threading
+import time
+
+import metrics
+
+
+log = logging.getLogger(__name__)
+
+
+def warm_up(queue_factory, maintain_interval=60.0):
+    """Start the background warm-up of queue_factory() (e.g. get_submission_queue) and return its thread."""
+    metrics.start_exporters()
+    thread = threading.Thread(target=_run, args=(queue_factory, maintain_interval), name="cvf-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def _run(queue_factory, maintain_interval):
+    t0 = time.perf_counter()
+    try:
+        queue = queue_factory()
+        metrics.watch_queue(queue)
+        _start_quality_scan(queue.journal)
+        # behind a shared queue (shared_queue.py) the storage backend is the writer's
+        backend = (queue.writer or queue).backend
+    except Exception:
+        log.warning("background warm-up failed", exc_info=True)
+        return
+    try:
+        if hasattr(backend, "warm_up"):
+            backend.warm_up()
+        log.info("warm-up done in %.2f s", time.perf_counter() - t0)
+    except Exception:
+        # nothing lost: the flusher connects and retries on its own, and maintain() tries again
+        log.warning("background warm-up of the storage backend failed", exc_info=True)
+
+    maintain = getattr(backend, "maintain", None)
+    while maintain is not None:
+        time.sleep(maintain_interval)
+        try:
+            maintain()
+        except Exception:
+            log.warning("background backend maintenance failed", exc_info=True)
+
+
+def _start_quality_scan(journal):
+    interval = os.getenv("CVF_QUALITY_INTERVAL")
+    if not interval or getattr(journal, "aggregates", None) is None:
+        return
+    from quality import start_scanner
+
+    start_scanner(journal.path, journal.aggregates.survey, float(interval), journal.aggregates.legacy_version)
@@ -0,0 +1,188 @@
+"""
+Storage backends for survey responses.
+
+Every backend exposes ``append_rows(rows)`` taking a list of rows (lists of
+cell values in ``build_row()`` order followed by the submission id, i.e.
+``Survey.storage_columns``), which is all SubmissionQueue needs.
+Pick one with the CVF_STORAGE_BACKEND environment variable:
+
+    gsheets  (default) Google Sheets through the client pool of connect_gsheets() (sheets.py)
+    sqlite   a local SQLite table, CVF_STORAGE_PATH (default <data dir>/responses_store.sqlite3)
+    parquet  one typed Parquet part file per batch (see response_store.py) under
+             CVF_STORAGE_PATH (default <data dir>/parquet)
+    http     any server speaking the Sheets values:append API, e.g. fake_sheets.py,
+             at CVF_SHEETS_URL (default http://127.0.0.1:8765)
+"""
+import http.client
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from urllib.parse import quote, urlsplit
+
+from ratelimit import SHEETS_WRITES_PER_MINUTE
+from survey_schema import SUBMISSION_ID_COLUMN
+
+log = logging.getLogger(__name__)
+
+
+class QuotaExceeded(Exception):
+    """The backend rejected a write with HTTP 429 (per-minute write quota)."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after  # seconds, from the Retry-After header when the server sent one
+
+
+def _retry_after(value):
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None  # an HTTP date; the queue's backoff applies instead
+
+
+class GoogleSheetsBackend:
+    # write requests per minute per service account; SubmissionQueue paces itself through ratelimit.py
+    writes_per_minute = SHEETS_WRITES_PER_MINUTE
+
+    def __init__(self, pool_factory, survey=None):
+        # pool_factory is connect_gsheets, returning a sheets.SheetsClientPool; called on first use, not at startup
+        self._pool_factory = pool_factory
+        self._header = survey.storage_columns if survey is not None else None
+
+    def _check_header(self, worksheet):
+        # the submission id is written after the survey columns; give that column its header once,
+        # and only on a sheet whose first row is exactly the survey's header (else row 1 may be data)
+        header = worksheet.row_values(1)
+        if not header:
+            worksheet.append_row(list(self._header))
+        elif header == list(self._header[:-1]):
+            worksheet.update_cell(1, len(self._header), SUBMISSION_ID_COLUMN)
+        elif header != list(self._header):
+            log.warning("row 1 of the sheet is not the survey header; not adding the %r column", SUBMISSION_ID_COLUMN)
+        self._header = None
+
+    def append_rows(self, rows):
+        from sheets import status_code
+
+        try:
+            with self._pool_factory().worksheet() as worksheet:
+                if self._header is not None:
+                    self._check_header(worksheet)
+                worksheet.append_rows(rows)
+        except Exception as e:
+            if status_code(e) == 429:
+                raise QuotaExceeded(str(e), _retry_after(e.response.headers.get("Retry-After"))) from e
+            raise
+
+    def warm_up(self):
+        """Connect ahead of the first write (see startup.py)."""
+        self._pool_factory().warm_up()
+
+    def maintain(self):
+        """Token refresh and client health checks, called periodically by startup.py."""
+        self._pool_factory().maintain()
+
+
+class SQLiteBackend:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rows (id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL)"
+        )
+
+    def append_rows(self, rows):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO rows (payload) VALUES (?)",
+                [(json.dumps(list(r), ensure_ascii=False),) for r in rows],
+            )
+
+    def read_rows(self):
+        with self._lock:
+            cur = self._conn.execute("SELECT payload FROM rows ORDER BY id")
+            return [json.loads(p) for (p,) in cur.fetchall()]
+
+
+class ParquetBackend:
+    def __init__(self, directory, survey):
+        self.directory = directory
+        self.survey = survey
+        os.makedirs(directory, exist_ok=True)
+
+    def append_rows(self, rows):
+        import pyarrow.parquet as pq
+        from response_store import rows_to_table
+
+        if not rows:
+            return
+        table = rows_to_table(self.survey, rows)
+        # part files are named so that lexical order is write order
+        name = f"part-{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.parquet"
+        tmp = os.path.join(self.directory, "." + name)
+        pq.write_table(table, tmp, compression="zstd")
+        os.replace(tmp, os.path.join(self.directory, name))
+
+
+class HttpSheetsBackend:
+    """Client for the Sheets ``values:append`` REST call against a configurable base URL."""
+
+    writes_per_minute = SHEETS_WRITES_PER_MINUTE
+
+    def __init__(self, base_url, spreadsheet_id="local", sheet_range="Sheet1", timeout=30):
+        parts = urlsplit(base_url)
+        self._host = parts.hostname
+        self._port = parts.port or (443 if parts.scheme == "https" else 80)
+        self._https = parts.scheme == "https"
+        self._path = (
+            f"{parts.path.rstrip('/')}/v4/spreadsheets/{quote(spreadsheet_id)}"
+            f"/values/{quote(sheet_range)}:append?valueInputOption=RAW&insertDataOption=INSERT_ROWS"
+        )
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _conn(self):
+        # keep one persistent connection per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+            conn = cls(self._host, self._port, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def append_rows(self, rows):
+        body = json.dumps({"values": [list(r) for r in rows]}, ensure_ascii=False).encode("utf-8")
+        conn = self._conn()
+        try:
+            conn.request("POST", self._path, body=body, headers={"Content-Type": "application/json"})
+            resp = conn.getresponse()
+            payload = resp.read()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            self._local.conn = None
+            raise
+        if resp.status == 429:
+            raise QuotaExceeded(payload.decode("utf-8", "replace"), _retry_after(resp.getheader("Retry-After")))
+        if resp.status >= 400:
+            raise RuntimeError(f"Sheets append failed with HTTP {resp.status}: {payload[:200]!r}")
+
+
+def backend_from_env(pool_factory, survey, data_dir=".cvf_data"):
+    kind = os.getenv("CVF_STORAGE_BACKEND", "gsheets").lower()
+    path = os.getenv("CVF_STORAGE_PATH")
+    if kind == "gsheets":
+        return GoogleSheetsBackend(pool_factory, survey)
+    if kind == "sqlite":
+        return SQLiteBackend(path or os.path.join(data_dir, "responses_store.sqlite3"))
+    if kind == "parquet":
+        return ParquetBackend(path or os.path.join(data_dir, "parquet"), survey)
+    if kind == "http":
+        return HttpSheetsBackend(os.getenv("CVF_SHEETS_URL", "http://127.0.0.1:8765"))
+    raise RuntimeError(f"Unknown CVF_STORAGE_BACKEND {kind!r} (expected gsheets, sqlite, parquet or http)")
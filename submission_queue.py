@@ -0,0 +1,187 @@
+"""
+Process-wide buffered writer for survey submissions.
+
+Rows are committed to the local ResponseJournal and acknowledged immediately.
+A background worker replays unsent rows to the storage backend in bulk with a single
+``append_rows`` call once ``batch_size`` rows are waiting or ``flush_interval``
+seconds have passed. Failed flushes are retried with jittered exponential
+backoff, and anything unsent is picked up again from the journal after a restart.
+
+Backends with a write quota (Google Sheets) are paced by the process-wide
+rate limiter of ratelimit.py: each append waits for a token, the queue with
+the oldest unsent row first, and a 429 slows the limiter down and pauses it
+for the backoff (or the server's Retry-After) instead of failing the flush
+again and again. A backlog drains in batches of up to ``max_batch_size`` rows,
+including whatever arrived while waiting for the token, so the rows pending
+when capacity returns go out in as few requests as possible.
+
+The same class drains a shared queue (shared_queue.py) in multi-replica
+deployments: given a ``lease``, it writes only while it holds it and reads the
+queue depth from the shared queue instead of counting its own puts.
+"""
+import atexit
+import random
+import threading
+import time
+
+from journal import DuplicateSubmission
+from metrics import timed
+from ratelimit import limiter_for
+from storage import QuotaExceeded
+
+MAX_BATCH_SIZE = 500  # rows per append while draining a backlog
+
+
+class SubmissionQueue:
+    def __init__(self, backend, journal, batch_size=20, flush_interval=5.0,
+                 base_backoff=1.0, max_backoff=60.0, max_batch_size=None, rate_limiter=None, lease=None):
+        # any object with append_rows(rows), see storage.py
+        self.backend = backend
+        # a ResponseJournal, or a shared queue with the same unsent/mark_sent interface
+        self.journal = journal
+        self.lease = lease
+        self.writer = None  # the queue draining the shared queue this one feeds (shared_queue.py)
+        self.batch_size = batch_size
+        self.max_batch_size = max(batch_size, max_batch_size or MAX_BATCH_SIZE)
+        self.flush_interval = flush_interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        # shared by every queue of the process writing to the same quota; None for local backends
+        self.rate_limiter = rate_limiter if rate_limiter is not None else limiter_for(backend)
+        self.stats = {"batches": 0, "rows": 0, "retries": 0, "quota_errors": 0, "duplicates": 0}
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._pending = journal.count_unsent()
+        self._failures = 0
+        self._closed = False
+        self._leading = True
+
+        self._thread = threading.Thread(target=self._run, name="cvf-submission-flusher", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ——————————————————
+    # Public API
+    # ——————————————————
+    def put(self, values, submission_id=None):
+        """Journal one row (list of cell values) and return without touching the network.
+
+        A submission_id that was already put is not journaled again; its first row id is returned.
+        """
+        try:
+            row_id = self.journal.append(values, submission_id)
+        except DuplicateSubmission as e:
+            with self._lock:
+                self.stats["duplicates"] += 1
+            return e.row_id
+        with self._lock:
+            self._pending += 1
+            if self._pending >= self.batch_size:
+                self._wakeup.notify()
+        return row_id
+
+    def pending(self):
+        with self._lock:
+            return self._pending
+
+    def metrics(self):
+        """Queue depth, write and retry counters, and the rate limiter's state (None without one)."""
+        with self._lock:
+            metrics = {**self.stats, "pending": self._pending, "consecutive_failures": self._failures}
+        metrics["rate_limiter"] = self.rate_limiter.metrics() if self.rate_limiter is not None else None
+        if self.writer is not None:
+            metrics["writer"] = self.writer.metrics()
+        return metrics
+
+    def flush(self):
+        """Replay unsent rows right now. Returns the number of rows written."""
+        written = 0
+        while True:
+            oldest = self.journal.oldest_unsent_at()
+            if oldest is None:
+                return written
+            if self.rate_limiter is not None:
+                # rows submitted while waiting go out in the same request
+                self.rate_limiter.acquire(priority=oldest)
+            with self._lock:
+                limit = min(self.max_batch_size, max(self.batch_size, self._pending))
+            batch = self.journal.unsent(limit)
+            if not batch:
+                return written
+            if self.lease is not None:
+                self._leading = self.lease.hold()
+                if not self._leading:
+                    return written  # another replica writes; try again after flush_interval
+            with timed("append_rows"):
+                self.backend.append_rows([values for _, values in batch])
+            if self.rate_limiter is not None:
+                self.rate_limiter.reward()
+            self.journal.mark_sent([row_id for row_id, _ in batch])
+            with self._lock:
+                self._pending = max(0, self._pending - len(batch))
+                self.stats["batches"] += 1
+                self.stats["rows"] += len(batch)
+            written += len(batch)
+
+    def close(self, timeout=10.0):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify()
+        self._thread.join(timeout)
+        if self.writer is not None:
+            self.writer.close(timeout)
+        if self.lease is not None:
+            try:
+                self.lease.release()
+            except Exception:
+                pass  # it expires on its own
+
+    # ——————————————————
+    # Internals
+    # ——————————————————
+    def _sync_pending(self):
+        # rows of a shared queue come from other processes; count them where they are
+        try:
+            pending = self.journal.count_unsent()
+        except Exception:
+            return
+        with self._lock:
+            self._pending = pending
+
+    def _backoff_delay(self):
+        delay = min(self.max_backoff, self.base_backoff * (2 ** (self._failures - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _run(self):
+        while True:
+            if self.lease is not None:
+                self._sync_pending()
+            with self._lock:
+                if not self._closed and (self._pending < self.batch_size or not self._leading):
+                    self._wakeup.wait(self.flush_interval)
+                closing = self._closed
+            try:
+                self.flush()
+                self._failures = 0
+            except Exception as e:
+                with self._lock:
+                    self._failures += 1
+                    self.stats["retries"] += 1
+                    self.stats["quota_errors"] += isinstance(e, QuotaExceeded)
+                if closing:
+                    # rows stay in the journal and are replayed on the next start
+                    return
+                delay = self._backoff_delay()
+                if isinstance(e, QuotaExceeded):
+                    delay = max(delay, e.retry_after or 0)
+                    if self.rate_limiter is not None:
+                        # every writer of the process waits; the next flush blocks in acquire() until capacity returns
+                        self.rate_limiter.penalize(delay)
+                        continue
+                time.sleep(delay)
+                continue
+            if closing:
+                return
@@ -0,0 +1,213 @@
+"""
+Survey definitions: YAML files in surveys/ compiled into immutable schema objects.
+
+A definition lists the CVF elements with their four statements, the example
+text/allocation shown in each expander and the demographic questions. Loading
+validates it once and precomputes everything the app otherwise rebuilt on each
+rerun: session-state keys, default state and the sheet column order.
+
+The file is re-read only when its modification time changes, so a new survey
+version can be dropped in place (or selected with CVF_SURVEY) without a redeploy.
+"""
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+import yaml
+
+
+SURVEY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "surveys")
+QUADRANTS = ("Clan", "Adhocracy", "Market", "Hierarchy")
+# written after the survey columns of every stored row: the idempotency key of the submission (journal.py)
+SUBMISSION_ID_COLUMN = "Submission ID"
+
+
+class SurveyDefinitionError(ValueError):
+    """The survey definition file is malformed or inconsistent."""
+
+
+@dataclass(frozen=True, slots=True)
+class Option:
+    key: str
+    text: str
+    quadrant: str
+    state_key: str
+
+
+@dataclass(frozen=True, slots=True)
+class Element:
+    name: str
+    options: tuple
+    example_text: str
+    example_allocation: tuple
+
+    @property
+    def state_keys(self):
+        return tuple(o.state_key for o in self.options)
+
+
+@dataclass(frozen=True, slots=True)
+class Demographic:
+    key: str
+    column: str
+    label: str
+    placeholder: str
+    help: str
+    options: tuple
+
+
+@dataclass(frozen=True, slots=True)
+class Survey:
+    version: str
+    title: str
+    option_keys: tuple
+    quadrants: tuple
+    elements: tuple
+    demographics: tuple
+    columns: tuple
+    slider_keys: tuple
+    demographic_keys: tuple
+    default_state: tuple
+    row_sources: tuple
+
+    def element(self, name):
+        for e in self.elements:
+            if e.name == name:
+                return e
+        raise KeyError(name)
+
+    @property
+    def storage_columns(self):
+        """Header of the sheet and of stored rows: the survey columns, then the submission id."""
+        return self.columns + (SUBMISSION_ID_COLUMN,)
+
+    def build_row(self, state, timestamp):
+        """Sheet row as a dict in column order, read from session_state (or any mapping)."""
+        row = {"Timestamp": timestamp}
+        for column, state_key, default in self.row_sources:
+            row[column] = state.get(state_key, default)
+        return row
+
+    def is_complete(self, state, total=100):
+        """True when every element's points add up to total and every demographic is answered."""
+        return (all(sum(state.get(key, 0) for key in element.state_keys) == total for element in self.elements)
+                and all(state.get(key) is not None for key in self.demographic_keys))
+
+
+def _require(data, key, where, kind=None):
+    if key not in data:
+        raise SurveyDefinitionError(f"{where}: missing '{key}'")
+    value = data[key]
+    if kind is not None and not isinstance(value, kind):
+        raise SurveyDefinitionError(f"{where}: '{key}' must be a {kind.__name__}")
+    return value
+
+
+def compile_survey(data, source="<survey>"):
+    """Validate a parsed definition and build the Survey object."""
+    if not isinstance(data, dict):
+        raise SurveyDefinitionError(f"{source}: expected a mapping at the top level")
+    version = str(_require(data, "version", source))
+    title = str(data.get("title", ""))
+    option_keys = tuple(_require(data, "option_keys", source, list))
+    quadrants = tuple(_require(data, "quadrants", source, list))
+    if len(option_keys) != 4 or len(set(option_keys)) != 4:
+        raise SurveyDefinitionError(f"{source}: 'option_keys' must list four distinct keys")
+    if sorted(quadrants) != sorted(QUADRANTS):
+        raise SurveyDefinitionError(f"{source}: 'quadrants' must be a permutation of {', '.join(QUADRANTS)}")
+
+    elements = []
+    for i, raw in enumerate(_require(data, "elements", source, list)):
+        where = f"{source}: elements[{i}]"
+        name = str(_require(raw, "name", where))
+        texts = _require(raw, "options", where, dict)
+        if list(texts) != list(option_keys):
+            raise SurveyDefinitionError(f"{where} ({name}): options must be {', '.join(option_keys)} in that order")
+        alloc = raw.get("example_allocation")
+        if alloc is not None:
+            alloc = tuple(int(v) for v in alloc)
+            if len(alloc) != 4 or sum(alloc) != 100 or any(v % 5 or v < 0 for v in alloc):
+                raise SurveyDefinitionError(
+                    f"{where} ({name}): example_allocation must be four multiples of 5 adding up to 100"
+                )
+        options = tuple(
+            Option(key=k, text=str(texts[k]), quadrant=q, state_key=f"{name}_{k}")
+            for k, q in zip(option_keys, quadrants)
+        )
+        elements.append(Element(name, options, str(raw.get("example_text", "")), alloc))
+    if len({e.name for e in elements}) != len(elements):
+        raise SurveyDefinitionError(f"{source}: element names must be unique")
+
+    demographics = []
+    for i, raw in enumerate(_require(data, "demographics", source, list)):
+        where = f"{source}: demographics[{i}]"
+        demographics.append(Demographic(
+            key=str(_require(raw, "key", where)),
+            column=str(_require(raw, "column", where)),
+            label=str(_require(raw, "label", where)),
+            placeholder=str(raw.get("placeholder", "")),
+            help=raw.get("help"),
+            options=tuple(str(o) for o in _require(raw, "options", where, list)),
+        ))
+    by_column = {d.column: d for d in demographics}
+    if len(by_column) != len(demographics) or len({d.key for d in demographics}) != len(demographics):
+        raise SurveyDefinitionError(f"{source}: demographic keys and columns must be unique")
+
+    columns = tuple(_require(data, "columns", source, list))
+    if columns[:1] != ("Timestamp",) or sorted(columns[1:]) != sorted(by_column):
+        raise SurveyDefinitionError(
+            f"{source}: 'columns' must be Timestamp followed by every demographic column exactly once"
+        )
+
+    slider_keys = tuple(o.state_key for e in elements for o in e.options)
+    row_sources = tuple((c, by_column[c].key, None) for c in columns[1:])
+    row_sources += tuple((k, k, 0) for k in slider_keys)
+    return Survey(
+        version=version,
+        title=title,
+        option_keys=option_keys,
+        quadrants=quadrants,
+        elements=tuple(elements),
+        demographics=tuple(demographics),
+        columns=columns + slider_keys,
+        slider_keys=slider_keys,
+        demographic_keys=tuple(d.key for d in demographics),
+        default_state=tuple((k, 0) for k in slider_keys),
+        row_sources=row_sources,
+    )
+
+
+@lru_cache(maxsize=8)
+def _load(path, mtime_ns):
+    with open(path, encoding="utf-8") as f:
+        return compile_survey(yaml.safe_load(f), source=os.path.basename(path))
+
+
+def load_survey(path):
+    """Compiled survey for a definition file; recompiled only when the file changes."""
+    path = os.path.abspath(path)
+    return _load(path, os.stat(path).st_mtime_ns)
+
+
+def survey_path(default_name):
+    """Definition selected with CVF_SURVEY, else surveys/<default_name>."""
+    return os.getenv("CVF_SURVEY") or os.path.join(SURVEY_DIR, default_name)
+
+
+def bundled_version(default_name):
+    """Version of surveys/<default_name> itself, whatever CVF_SURVEY selects: the survey of an app journal's untagged rows."""
+    return load_survey(os.path.join(SURVEY_DIR, default_name)).version
+
+
+def surveys_by_version(directory=SURVEY_DIR):
+    """Every survey definition in directory, keyed by its version."""
+    surveys = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith((".yaml", ".yml")):
+            data_path = os.path.join(directory, name)
+            with open(data_path, encoding="utf-8") as f:
+                data = yaml.safe_load(f)
+            if isinstance(data, dict) and "version" in data:
+                survey = load_survey(data_path)
+                surveys[survey.version] = survey
+    return surveys
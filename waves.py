@@ -0,0 +1,513 @@
+"""
+Survey waves: the yearly runs of the survey, aligned on canonical elements and quadrants.
+
+The survey changes between runs: cvf-v2 (app.py) renamed "Δομικά
+Χαρακτηριστικά" to "Κύρια Χαρακτηριστικά" and keys its options opt1..opt4
+where cvf-v1 (app3.py) used the quadrant names, and the demographic answers
+drifted too (Level labels, Generation as birth years, Tenure's first year
+split in two). surveys/waves.yaml maps every version onto one canonical
+layout: canonical element ids, the QUADRANTS order and the demographic
+categories of the current definition.
+
+Journaled rows carry their wave and survey version (journal.py). ``add``
+folds a journal, or a Parquet archive of an earlier run, into the wave index:
+per wave and demographic cell the respondent count, dominant-quadrant counts
+and the sums and sums of squares of the points in canonical order, the same
+cells aggregates.py keeps for one survey. Comparing two waves for any slice
+or breakdown then rolls up a few thousand cells of each wave instead of
+rescanning both datasets. Rows quality.py excluded are left out.
+
+    python waves.py add .cvf_data/app_responses.sqlite3
+    python waves.py add responses_2024.parquet --wave 2024
+    python waves.py list
+    python waves.py compare 2024 2025 --by Division --where Level="Corporate Directors"
+"""
+import argparse
+import dataclasses
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import yaml
+
+from aggregates import AggregateSnapshot
+from cvf_analysis import _reduce_by_group, dominant_culture
+from survey_schema import QUADRANTS, SURVEY_DIR, load_survey, survey_path, surveys_by_version
+
+
+LAYOUT_PATH = os.path.join(SURVEY_DIR, "waves.yaml")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS wave_sources (
+    wave      TEXT NOT NULL,
+    source    TEXT NOT NULL,
+    versions  TEXT NOT NULL,
+    responses INTEGER NOT NULL,
+    built_at  REAL NOT NULL,
+    PRIMARY KEY (wave, source)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS wave_cells (
+    wave     TEXT NOT NULL,
+    source   TEXT NOT NULL,
+    cell     TEXT NOT NULL,
+    n        INTEGER NOT NULL,
+    dominant BLOB NOT NULL,
+    sums     BLOB NOT NULL,
+    sumsq    BLOB NOT NULL,
+    PRIMARY KEY (wave, source, cell)
+) WITHOUT ROWID;
+"""
+# cell: JSON list of the canonical demographic answers in layout column order (null = unanswered)
+# dominant: 4 int64 in QUADRANTS order; sums, sumsq: elements x 4 int64 in canonical element and quadrant order
+
+
+class WaveLayoutError(ValueError):
+    """A survey or archive does not fit the canonical wave layout."""
+
+
+@dataclass(frozen=True)
+class WaveLayout:
+    """Canonical layout of the waves; shaped like a Survey where AggregateSnapshot reads one."""
+
+    elements: tuple         # canonical element ids
+    demographics: tuple     # the reference survey's Demographics with the canonical categories as options
+    element_ids: dict       # element name in any survey version -> canonical id
+    aliases: dict           # column -> {answer: canonical answer}
+
+    @property
+    def columns(self):
+        return tuple(d.column for d in self.demographics)
+
+    def canonical_answer(self, column, answer):
+        if answer in (None, ""):
+            return None
+        return self.aliases.get(column, {}).get(answer, answer)
+
+    def slot_order(self, element_names, quadrants):
+        """Index into a survey's flattened allocations of every canonical (element, quadrant) slot."""
+        positions = {}
+        for i, name in enumerate(element_names):
+            if name not in self.element_ids:
+                raise WaveLayoutError(f"element '{name}' is not mapped to a canonical element in waves.yaml")
+            positions[self.element_ids[name]] = i
+        missing = [e for e in self.elements if e not in positions]
+        if missing:
+            raise WaveLayoutError(f"no element maps to {', '.join(missing)}")
+        option = [list(quadrants).index(q) for q in QUADRANTS]
+        return np.array([positions[e] * 4 + o for e in self.elements for o in option], dtype=np.intp)
+
+
+def load_layout(reference, path=LAYOUT_PATH):
+    """Canonical layout from waves.yaml, with the demographic categories of the reference survey."""
+    with open(path, encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+    source = os.path.basename(path)
+    elements, element_ids = [], {}
+    for i, raw in enumerate(data.get("elements") or ()):
+        if not isinstance(raw, dict) or "id" not in raw or not raw.get("names"):
+            raise WaveLayoutError(f"{source}: elements[{i}] needs an 'id' and a list of 'names'")
+        elements.append(str(raw["id"]))
+        for name in raw["names"]:
+            if element_ids.setdefault(str(name), elements[-1]) != elements[-1]:
+                raise WaveLayoutError(f"{source}: element '{name}' is mapped twice")
+    if len(set(elements)) != len(elements):
+        raise WaveLayoutError(f"{source}: element ids must be unique")
+    aliases = {str(col): {str(k): str(v) for k, v in (mapping or {}).items()}
+               for col, mapping in (data.get("aliases") or {}).items()}
+
+    demographics = []
+    for demo in reference.demographics:
+        mapping = aliases.get(demo.column, {})
+        categories = list(dict.fromkeys(mapping.get(o, o) for o in demo.options))
+        demographics.append(dataclasses.replace(demo, options=tuple(categories)))
+    layout = WaveLayout(tuple(elements), tuple(demographics), element_ids, aliases)
+    layout.slot_order([e.name for e in reference.elements], reference.quadrants)  # the reference must fit
+    return layout
+
+
+class _CellCoder:
+    """Codes canonical answers per layout column; answers outside the categories are kept as extra codes."""
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.categories = [list(d.options) for d in layout.demographics]
+        self._lookup = [{c: i for i, c in enumerate(cats)} for cats in self.categories]
+
+    def code(self, position, answer):
+        answer = self.layout.canonical_answer(self.layout.columns[position], answer)
+        if answer is None:
+            return -1
+        lookup = self._lookup[position]
+        if answer not in lookup:
+            lookup[answer] = len(self.categories[position])
+            self.categories[position].append(answer)
+        return lookup[answer]
+
+    def cell(self, codes):
+        return json.dumps([self.categories[i][c] if c >= 0 else None for i, c in enumerate(codes)],
+                          ensure_ascii=False)
+
+
+def _cell_rows(coder, codes, points):
+    """wave_cells values of (N, columns) answer codes and (N, elements * 4) uint8 canonical points."""
+    if not len(codes):
+        return []
+    keys, inverse = np.unique(codes, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    counts, sums, sumsq = _reduce_by_group(points, inverse, len(keys))
+    dom = dominant_culture(points.reshape(len(points), -1, 4))
+    dominant = np.bincount(inverse * 4 + dom, minlength=len(keys) * 4).reshape(len(keys), 4).astype(np.int64)
+    return [
+        (coder.cell(key.tolist()), int(n), dominant[k].tobytes(), sums[k].tobytes(), sumsq[k].tobytes())
+        for k, (key, n) in enumerate(zip(keys, counts))
+    ]
+
+
+class WaveIndex:
+    """Per-wave cell aggregates in canonical layout, in their own SQLite file."""
+
+    def __init__(self, path, layout):
+        self.path = path
+        self.layout = layout
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.executescript(SCHEMA)
+        self._cache = {}  # wave -> (state of its sources, AggregateSnapshot)
+
+    # ——————————————————
+    # Building
+    # ——————————————————
+    def add_journal(self, journal_path, default_survey, wave=None, surveys=None):
+        """Fold a response journal into the index, replacing what it added before; returns {wave: responses}.
+
+        Rows are read with the survey definition of their version (surveys, by
+        default every file in surveys/); untagged rows are taken to be of
+        default_survey and of the year they were submitted in. wave overrides
+        the rows' own wave.
+        """
+        from journal import ResponseJournal
+
+        surveys = dict(surveys or surveys_by_version())
+        surveys.setdefault(default_survey.version, default_survey)
+        excluded = self._excluded_ids(journal_path)
+        coder = _CellCoder(self.layout)
+        layouts = {}  # survey version -> (demographic positions, slot order) or None if it does not fit
+        rows = {}     # wave -> (codes, points, versions)
+        for row_id, created_at, row_wave, version, values in ResponseJournal(journal_path).iter_tagged(5000):
+            version = version or default_survey.version
+            if (version, row_id) in excluded:
+                continue
+            if version not in layouts:
+                layouts[version] = self._survey_layout(surveys.get(version))
+            if layouts[version] is None or len(values) != len(surveys[version].columns):
+                continue
+            demo_index, order = layouts[version]
+            row_wave = wave or row_wave or time.strftime("%Y", time.localtime(created_at))
+            codes, points, versions = rows.setdefault(row_wave, ([], [], set()))
+            codes.append([coder.code(i, values[j]) for i, j in enumerate(demo_index)])
+            points.append([int(float(values[j] or 0)) for j in order])
+            versions.add(version)
+
+        source = os.path.abspath(journal_path)
+        added = {}
+        for row_wave, (codes, points, versions) in rows.items():
+            codes = np.array(codes, dtype=np.int64).reshape(len(codes), len(self.layout.columns))
+            points = np.array(points, dtype=np.uint8).reshape(len(points), -1)
+            self._store(row_wave, source, versions, len(points), _cell_rows(coder, codes, points))
+            added[row_wave] = len(points)
+        return added
+
+    def add_archive(self, archive_path, wave):
+        """Fold a Parquet archive (response_store.py) into wave, replacing what it added before."""
+        from response_store import load_allocations
+
+        alloc, demo, meta = load_allocations(archive_path)
+        points = alloc.reshape(len(alloc), -1)[:, self.layout.slot_order(meta["elements"], meta["quadrants"])]
+        coder = _CellCoder(self.layout)
+        codes = np.full((len(alloc), len(self.layout.columns)), -1, dtype=np.int64)
+        for i, column in enumerate(self.layout.columns):
+            if column not in demo:
+                continue
+            archive_codes, categories = demo[column]
+            # archive category code -> canonical code; the extra last entry keeps -1 (unanswered) as -1
+            remap = np.array([coder.code(i, c) for c in categories] + [-1], dtype=np.int64)
+            codes[:, i] = remap[archive_codes]
+        self._store(wave, os.path.abspath(archive_path), {meta["version"]}, len(alloc), _cell_rows(coder, codes, points))
+        return len(alloc)
+
+    def _survey_layout(self, survey):
+        if survey is None:
+            return None
+        try:
+            order = self.layout.slot_order([e.name for e in survey.elements], survey.quadrants)
+        except WaveLayoutError:
+            return None
+        first_slot = len(survey.columns) - len(survey.slider_keys)
+        demo_index = [survey.columns.index(c) if c in survey.columns else None for c in self.layout.columns]
+        if None in demo_index:
+            return None
+        return demo_index, order + first_slot
+
+    @staticmethod
+    def _excluded_ids(journal_path):
+        """(survey version, row id) of the rows each version's aggregates exclude (quality.py)."""
+        conn = sqlite3.connect(f"file:{journal_path}?mode=ro", uri=True)
+        try:
+            return set(conn.execute("SELECT version, id FROM aggregate_excluded"))
+        except sqlite3.OperationalError:
+            return set()  # no aggregates in this journal, nothing excluded
+        finally:
+            conn.close()
+
+    def _store(self, wave, source, versions, responses, cells):
+        with self.conn:
+            self.conn.execute("DELETE FROM wave_cells WHERE wave = ? AND source = ?", (wave, source))
+            self.conn.executemany(
+                "INSERT INTO wave_cells (wave, source, cell, n, dominant, sums, sumsq) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(wave, source, *cell) for cell in cells],
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO wave_sources (wave, source, versions, responses, built_at) VALUES (?, ?, ?, ?, ?)",
+                (wave, source, json.dumps(sorted(versions)), responses, time.time()),
+            )
+
+    def drop(self, wave, source=None):
+        """Remove a wave, or one source of it, from the index."""
+        where, params = ("wave = ?", (wave,)) if source is None else ("wave = ? AND source = ?", (wave, source))
+        with self.conn:
+            self.conn.execute(f"DELETE FROM wave_cells WHERE {where}", params)
+            return self.conn.execute(f"DELETE FROM wave_sources WHERE {where}", params).rowcount
+
+    # ——————————————————
+    # Reading
+    # ——————————————————
+    def waves(self):
+        """[(wave, responses, survey versions, sources)] oldest wave first."""
+        out = {}
+        for wave, source, versions, responses in self.conn.execute(
+            "SELECT wave, source, versions, responses FROM wave_sources ORDER BY wave, source"
+        ):
+            entry = out.setdefault(wave, [wave, 0, set(), []])
+            entry[1] += responses
+            entry[2].update(json.loads(versions))
+            entry[3].append(source)
+        return [(wave, n, sorted(versions), sources) for wave, n, versions, sources in out.values()]
+
+    def snapshot(self, wave):
+        """AggregateSnapshot of a wave in canonical layout (group_stats works as for one survey)."""
+        state = self.conn.execute(
+            "SELECT COUNT(*), MAX(built_at) FROM wave_sources WHERE wave = ?", (wave,)
+        ).fetchone()
+        if not state[0]:
+            raise KeyError(f"wave {wave} is not in the index")
+        cached = self._cache.get(wave)
+        if cached is not None and cached[0] == state:
+            return cached[1]
+        rows = self.conn.execute(
+            "SELECT cell, n, dominant, sums, sumsq FROM wave_cells WHERE wave = ? ORDER BY cell", (wave,)
+        ).fetchall()
+        width = len(self.layout.elements) * 4
+        cells, inverse = np.unique(np.array([row[0] for row in rows], dtype=object), return_inverse=True)
+
+        def combine(values, k):
+            # a cell answered in several sources (app.py and app3.py journals of one wave) is summed
+            out = np.zeros((len(cells), k), dtype=np.int64)
+            np.add.at(out, inverse, np.array(values, dtype=np.int64).reshape(len(rows), k))
+            return out
+
+        snapshot = AggregateSnapshot(
+            survey=self.layout,
+            cells=[tuple(json.loads(cell)) for cell in cells],
+            counts=combine([row[1] for row in rows], 1)[:, 0],
+            dominant=combine([np.frombuffer(row[2], dtype=np.int64) for row in rows], 4),
+            sums=combine([np.frombuffer(row[3], dtype=np.int64) for row in rows], width),
+            sumsq=combine([np.frombuffer(row[4], dtype=np.int64) for row in rows], width),
+            last_id=0,
+        )
+        self._cache[wave] = (state, snapshot)
+        return snapshot
+
+    def compare(self, before, after, *columns, where=None):
+        """WaveDiff of two waves broken down by demographic columns, within the slice where ({column: answer})."""
+        snapshots = [self.snapshot(before), self.snapshot(after)]
+        if where:
+            snapshots = [self._slice(s, where) for s in snapshots]
+        return WaveDiff(before, after, self.layout.elements, *(s.group_stats(*columns) for s in snapshots))
+
+    def _slice(self, snapshot, where):
+        positions = {c: i for i, c in enumerate(self.layout.columns)}
+        keep = np.ones(len(snapshot.cells), dtype=bool)
+        for column, answer in where.items():
+            if column not in positions:
+                raise KeyError(f"unknown demographic column {column}")
+            answer = self.layout.canonical_answer(column, answer)
+            keep &= np.array([cell[positions[column]] == answer for cell in snapshot.cells], dtype=bool)
+        return dataclasses.replace(
+            snapshot,
+            cells=[cell for cell, k in zip(snapshot.cells, keep) if k],
+            counts=snapshot.counts[keep],
+            dominant=snapshot.dominant[keep],
+            sums=snapshot.sums[keep],
+            sumsq=snapshot.sumsq[keep],
+        )
+
+    def close(self):
+        self.conn.close()
+
+
+@dataclass
+class WaveDiff:
+    before: str
+    after: str
+    elements: tuple       # canonical element ids
+    old: object           # GroupStats of the earlier wave
+    new: object           # GroupStats of the later wave
+
+    def __post_init__(self):
+        # a group only one wave has an answer for (a category added or dropped) is empty in the other
+        labels = list(dict.fromkeys([*self.old.labels, *self.new.labels]))
+        self.old, self.new = (_align(s, labels) for s in (self.old, self.new))
+
+    @property
+    def labels(self):
+        return self.new.labels
+
+    def change(self):
+        """(G, 4) change of the CVF profile, later minus earlier wave."""
+        return self.new.profile - self.old.profile
+
+    def z(self):
+        """(G, elements, 4) Welch z-score of the change in every element x quadrant mean."""
+        n_old = self.old.counts[:, None, None].astype(np.float64)
+        n_new = self.new.counts[:, None, None].astype(np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            se = np.sqrt(self.old.std ** 2 / n_old + self.new.std ** 2 / n_new)
+            return (self.new.means - self.old.means) / se
+
+    def to_frame(self):
+        import pandas as pd
+
+        by = self.new.by
+        if len(by) > 1:
+            index = pd.MultiIndex.from_tuples(self.labels, names=by)
+        else:
+            index = pd.Index(self.labels, name=by[0] if by else None)
+        frame = pd.DataFrame(self.change(), index=index, columns=[f"Δ {q}" for q in QUADRANTS])
+        frame.insert(0, f"n {self.before}", self.old.counts)
+        frame.insert(1, f"n {self.after}", self.new.counts)
+        names = lambda stats: [QUADRANTS[d] if d >= 0 else None for d in stats.dominant]
+        frame["dominant"] = [f"{a} → {b}" if a and b else None for a, b in zip(names(self.old), names(self.new))]
+        z = np.nan_to_num(np.abs(self.z()), nan=-1).reshape(len(self.labels), -1).max(axis=1)
+        frame["max |z|"] = np.where(z < 0, np.nan, z)
+        return frame
+
+    def element_frame(self, label=None):
+        """Element x quadrant means of both waves, their change and z-score for one group (default the first)."""
+        import pandas as pd
+
+        g = 0 if label is None else self.labels.index(label)
+        z = self.z()[g]
+        rows = []
+        for e, element in enumerate(self.elements):
+            for q, quadrant in enumerate(QUADRANTS):
+                before, after = self.old.means[g, e, q], self.new.means[g, e, q]
+                rows.append((element, quadrant, before, after, after - before, z[e, q]))
+        frame = pd.DataFrame(rows, columns=["element", "quadrant", self.before, self.after, "Δ", "z"])
+        return frame.set_index(["element", "quadrant"])
+
+
+def _align(stats, labels):
+    """GroupStats reindexed to labels; groups it lacks are empty."""
+    if list(stats.labels) == labels:
+        return stats
+    position = {label: i for i, label in enumerate(stats.labels)}
+    index = np.array([position.get(label, -1) for label in labels], dtype=np.intp)
+    present = index >= 0
+
+    def take(values, fill):
+        out = np.full((len(labels), *values.shape[1:]), fill, dtype=np.result_type(values, type(fill)))
+        out[present] = values[index[present]]
+        return out
+
+    return dataclasses.replace(
+        stats,
+        labels=labels,
+        counts=take(stats.counts, 0),
+        means=take(stats.means, np.nan),
+        std=take(stats.std, np.nan),
+        profile=take(stats.profile, np.nan),
+        dominant=take(stats.dominant, -1),
+        dominant_share=take(stats.dominant_share, np.nan),
+    )
+
+
+def default_index_path():
+    return os.path.join(os.getenv("CVF_DATA_DIR", ".cvf_data"), "waves.sqlite3")
+
+
+def _parse_where(items, parser):
+    where = {}
+    for item in items:
+        column, sep, answer = item.partition("=")
+        if not sep:
+            parser.error(f"--where expects Column=answer, got {item!r}")
+        where[column] = answer
+    return where
+
+
+def main():
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", default=default_index_path(), help="wave index database")
+    parser.add_argument("--survey", default=survey_path("cvf_v2.yaml"),
+                        help="current survey definition: demographic categories, and the version of untagged rows")
+    parser.add_argument("--layout", default=LAYOUT_PATH, help="canonical layout and aliases (surveys/waves.yaml)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("add", help="fold a journal (.sqlite3) or an archive (.parquet, or a parquet backend directory) into the index")
+    p.add_argument("source")
+    p.add_argument("--wave", help="wave of every row (required for archives; journals default to their tags)")
+    sub.add_parser("list", help="print the waves in the index")
+    p = sub.add_parser("drop", help="remove a wave from the index")
+    p.add_argument("wave")
+    p = sub.add_parser("compare", help="print the change between two waves")
+    p.add_argument("before")
+    p.add_argument("after")
+    p.add_argument("--by", nargs="*", default=[], help="demographic columns to break down by")
+    p.add_argument("--where", nargs="*", default=[], metavar="COLUMN=ANSWER", help="slice to compare")
+    p.add_argument("--elements", action="store_true", help="also print element x quadrant changes of the first group")
+    args = parser.parse_args()
+
+    survey = load_survey(args.survey)
+    index = WaveIndex(args.index, load_layout(survey, args.layout))
+    if args.command == "add":
+        if not os.path.exists(args.source):
+            parser.error(f"no journal or archive at {args.source}")
+        if args.source.endswith(".parquet") or os.path.isdir(args.source):
+            if not args.wave:
+                parser.error("archives carry no wave tags; pass --wave")
+            added = {args.wave: index.add_archive(args.source, args.wave)}
+        else:
+            added = index.add_journal(args.source, survey, wave=args.wave)
+        for wave, n in sorted(added.items()):
+            print(f"wave {wave}: {n} responses from {args.source}")
+    elif args.command == "list":
+        for wave, n, versions, sources in index.waves():
+            print(f"{wave}: {n} responses, survey {', '.join(versions)}, {len(sources)} source(s)")
+    elif args.command == "drop":
+        print(f"dropped {index.drop(args.wave)} source(s) of wave {args.wave}")
+    else:
+        diff = index.compare(args.before, args.after, *args.by, where=_parse_where(args.where, parser))
+        pd.set_option("display.width", 160)
+        print(diff.to_frame().round(2).to_string())
+        if args.elements:
+            print()
+            print(diff.element_frame().round(2).to_string())
+    index.close()
+
+
+if __name__ == "__main__":
+    main()